@@ -0,0 +1,29 @@
+"""add scans.scan_uid
+
+Revision ID: 3c8e1f6a9b2d
+Revises: 
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f6a9b2d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Tables created by create_all since scan_uid was added to Scan already have it
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('scans')}
+    if 'scan_uid' not in columns:
+        op.add_column('scans', sa.Column('scan_uid', sa.String(), nullable=True))
+        op.create_index(op.f('ix_scans_scan_uid'), 'scans', ['scan_uid'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scans_scan_uid'), table_name='scans')
+    op.drop_column('scans', 'scan_uid')
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
+from app.api.v1 import models
 from app.api.v1.scanners import web
 
 api_router = APIRouter()
 api_router.include_router(web.router, prefix="/scanners/web", tags=["web"])
+api_router.include_router(models.router, prefix="/ai/models", tags=["ai"])
@@ -0,0 +1,46 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
+
+router = APIRouter()
+
+class ActivateModelRequest(BaseModel):
+    version: str
+
+def _scanner_type(scanner_type: str) -> str:
+    if scanner_type not in get_vulnerability_detector().vulnerability_types:
+        raise HTTPException(status_code=404, detail=f"Unknown scanner type {scanner_type}")
+    return scanner_type
+
+@router.get("/stats")
+async def get_inference_stats():
+    detector = get_vulnerability_detector()
+    return {
+        "batching": detector.get_batch_stats(),
+        "prediction_cache": detector.prediction_cache.get_stats()
+    }
+
+@router.get("/{scanner_type}")
+async def list_model_versions(scanner_type: str):
+    detector = get_vulnerability_detector()
+    store = detector.store
+    scanner_type = _scanner_type(scanner_type)
+    return {
+        "versions": store.list_versions(scanner_type),
+        "active": store.active_version(scanner_type),
+        "serving": detector.runtime_versions.get(scanner_type)
+    }
+
+@router.post("/{scanner_type}/activate")
+async def activate_model_version(scanner_type: str, request: ActivateModelRequest):
+    scanner_type = _scanner_type(scanner_type)
+    try:
+        # Loading the version can mean a TFLite conversion, which takes seconds
+        await asyncio.get_running_loop().run_in_executor(
+            None, get_vulnerability_detector().activate_model, scanner_type, request.version
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scanner_type": scanner_type, "active": request.version}
@@ -27,6 +27,10 @@ async def start_web_scan(request: WebScanRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stats")
+async def get_scan_store_stats():
+    return scanner.get_store_stats()
+
 @router.get("/{scan_id}")
 async def get_scan_status(scan_id: str):
     try:
@@ -1,3 +1,3 @@
-from .vulnerability_detector import VulnerabilityDetector
+from .vulnerability_detector import VulnerabilityDetector, get_vulnerability_detector
 
-__all__ = ['VulnerabilityDetector']
+__all__ = ['VulnerabilityDetector', 'get_vulnerability_detector']
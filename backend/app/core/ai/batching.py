@@ -0,0 +1,95 @@
+"""Coalescing concurrent single-sample predictions into batches"""
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+
+
+class MicroBatcher:
+    """Queues single-sample requests for one model and runs them as batches.
+
+    The first request of a batch opens a window of max_wait seconds; every
+    request arriving in that window joins it, and a full batch is sent
+    without waiting. Batches run one at a time in the executor, so requests
+    arriving while the model is busy simply make the next batch bigger.
+    Each caller gets its own row of the output.
+    """
+
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], executor: Optional[Executor] = None,
+                 max_batch_size: Optional[int] = None, max_wait: Optional[float] = None):
+        self.predict_batch = predict
+        self.executor = executor
+        self.max_batch_size = max_batch_size or settings.AI_BATCH_MAX_SIZE
+        self.max_wait = settings.AI_BATCH_MAX_WAIT if max_wait is None else max_wait
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._runner: Optional[asyncio.Task] = None
+        self._batch_full: Optional[asyncio.Future] = None
+        self.stats = {'requests': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+
+    async def predict(self, features: Any) -> np.ndarray:
+        """Model output for one sample, given as a vector or a 1-row (possibly sparse) matrix"""
+        loop = asyncio.get_running_loop()
+        if self._runner is None or self._runner.done():
+            # Whatever is left belongs to an event loop that has since been closed
+            self._pending = [entry for entry in self._pending if entry[1].get_loop() is loop]
+        future = loop.create_future()
+        if not sparse.issparse(features):
+            features = np.asarray(features).reshape(-1)
+        self._pending.append((features, future))
+        self.stats['requests'] += 1
+        if self._runner is None or self._runner.done():
+            self._runner = loop.create_task(self._run())
+        elif len(self._pending) >= self.max_batch_size and self._batch_full and not self._batch_full.done():
+            self._batch_full.set_result(None)
+        return await future
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'mean_batch': round(self.stats['requests'] / batches, 2) if batches else 0.0,
+            'queued': len(self._pending),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if len(self._pending) < self.max_batch_size and self.max_wait > 0:
+                self._batch_full = loop.create_future()
+                try:
+                    await asyncio.wait_for(self._batch_full, timeout=self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            # Callers that gave up while waiting are left out
+            batch = [(features, future) for features, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+            try:
+                outputs = await loop.run_in_executor(
+                    self.executor, self.predict_batch, _stack([features for features, _ in batch])
+                )
+            except Exception as e:
+                self.stats['errors'] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), row in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(row)
+
+
+def _stack(rows: List[Any]) -> Any:
+    if sparse.issparse(rows[0]):
+        return sparse.vstack(rows, format='csr')
+    return np.stack(rows)
@@ -0,0 +1,57 @@
+"""Stateless text featurization for the detector models"""
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+N_FEATURES = 1000
+
+
+class HashingFeaturizer:
+    """Maps texts to fixed-size sparse vectors by hashing their word n-grams.
+
+    Nothing is fitted: a text always maps to the same vector, whatever was
+    seen before and in whichever process, so one instance can be shared by
+    every thread and survives fork. Vectors are L2-normalized float32 CSR
+    rows with N_FEATURES columns, the input width of the detector models.
+    Texts are cut at AI_FEATURIZER_MAX_CHARS characters.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES, ngram_range: tuple = (1, 3),
+                 max_chars: Optional[int] = None):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.max_chars = max_chars or settings.AI_FEATURIZER_MAX_CHARS
+        self._vectorizer = None
+
+    def transform(self, texts: Iterable[str]) -> Any:
+        """Featurize many texts at once into a (len(texts), n_features) CSR matrix"""
+        return self._hashing_vectorizer().transform(text[:self.max_chars] for text in texts)
+
+    def transform_one(self, text: str) -> Any:
+        return self.transform([text])
+
+    def get_config(self) -> Dict[str, Any]:
+        """Everything needed to rebuild an identical featurizer"""
+        return {'type': 'hashing', 'n_features': self.n_features, 'ngram_range': list(self.ngram_range),
+                'max_chars': self.max_chars}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'HashingFeaturizer':
+        return cls(config['n_features'], tuple(config['ngram_range']), config['max_chars'])
+
+    def _hashing_vectorizer(self):
+        if self._vectorizer is None:
+            # scikit-learn is only imported once something is featurized
+            from sklearn.feature_extraction.text import HashingVectorizer
+
+            self._vectorizer = HashingVectorizer(
+                n_features=self.n_features,
+                ngram_range=self.ngram_range,
+                stop_words='english',
+                alternate_sign=False,
+                norm='l2',
+                dtype=np.float32
+            )
+        return self._vectorizer
@@ -0,0 +1,372 @@
+"""Pre-forked inference workers sharing one copy of the detector models.
+
+A server process loads and warms every scanner type's model, then forks
+AI_INFERENCE_POOL_WORKERS workers. They inherit the runtimes, the
+featurizer and the imported libraries as copy-on-write pages, so N
+workers cost about one process's memory rather than N. Scanners in any
+number of API or scanner processes send feature batches to the workers
+over a Unix socket: a length-prefixed JSON header followed by the raw
+bytes of the CSR arrays, with no pickling on either side.
+
+Run it alongside the API with:
+    python -m app.core.ai.inference_pool [--socket PATH] [--workers N]
+"""
+import argparse
+import fcntl
+import gc
+import json
+import logging
+import math
+import os
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+
+logger = logging.getLogger("vapt.ai.inference_pool")
+
+_HEADER = struct.Struct('!I')
+# The JSON part of a message only describes the arrays
+_MAX_META_BYTES = 64 * 1024
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Inference pool connection closed")
+        received += count
+    return buffer
+
+
+def _send_message(sock: socket.socket, header: Dict[str, Any], arrays: List[np.ndarray]) -> None:
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    meta = json.dumps(dict(header, arrays=[[array.dtype.str, list(array.shape)] for array in arrays])).encode()
+    # One write per message: the peer is woken once, not once per array
+    sock.sendall(b''.join([_HEADER.pack(len(meta)), meta] + [array.tobytes() for array in arrays]))
+
+
+def _recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    """Read one message; ValueError if it is malformed, after which the stream cannot be trusted"""
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > _MAX_META_BYTES:
+        raise ValueError(f"Inference pool message header of {size} bytes is too large")
+    header = json.loads(bytes(_recv_exact(sock, size)))
+    try:
+        layout = [(np.dtype(dtype), [int(n) for n in shape]) for dtype, shape in header.pop('arrays')]
+    except (AttributeError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed inference pool message: {e!r}") from e
+    # Checked before anything is allocated: the sizes come from the peer
+    sizes = [math.prod(shape) * dtype.itemsize for dtype, shape in layout]
+    if any(n < 0 for _, shape in layout for n in shape) or sum(sizes) > settings.AI_INFERENCE_POOL_MAX_MESSAGE:
+        raise ValueError(f"Inference pool message of {sum(sizes)} bytes is too large or malformed")
+    arrays = []
+    for (dtype, shape), nbytes in zip(layout, sizes):
+        arrays.append(np.frombuffer(_recv_exact(sock, nbytes), dtype).reshape(shape))
+    return header, arrays
+
+
+class InferencePoolClient:
+    """Sends feature batches to the inference pool.
+
+    Connections are kept open and reused; each thread takes an idle one,
+    or opens another, for the duration of a request.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        """Initialize the client.
+
+        Args:
+            socket_path: Socket the pool listens on, AI_INFERENCE_POOL_SOCKET by default
+            timeout: Seconds to wait for a reply, AI_INFERENCE_POOL_TIMEOUT by default
+        """
+        self.socket_path = socket_path or settings.AI_INFERENCE_POOL_SOCKET
+        self.timeout = timeout or settings.AI_INFERENCE_POOL_TIMEOUT
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def predict(self, scanner_type: str, batch: Any) -> Tuple[np.ndarray, Optional[str]]:
+        """Scores of a feature batch and the model version that produced them.
+
+        Raises:
+            OSError: The pool cannot be reached or did not answer in time
+            RuntimeError: The pool failed to score the batch
+        """
+        batch = sparse.csr_matrix(batch, dtype=np.float32)
+        sock = self._acquire()
+        try:
+            _send_message(sock, {'scanner_type': scanner_type, 'shape': list(batch.shape)},
+                          [batch.data, batch.indices, batch.indptr])
+            header, arrays = _recv_message(sock)
+        except BaseException:
+            sock.close()
+            raise
+        with self._lock:
+            self._idle.append(sock)
+        if 'error' in header:
+            raise RuntimeError(f"Inference pool failed on {scanner_type}: {header['error']}")
+        return arrays[0], header.get('version')
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+    def _acquire(self) -> socket.socket:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+def _score(detector: Any, header: Dict[str, Any], arrays: List[np.ndarray]) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    try:
+        scanner_type = header['scanner_type']
+        if scanner_type not in detector.vulnerability_types:
+            raise ValueError(f"Unknown scanner type: {scanner_type}")
+        batch = sparse.csr_matrix(tuple(arrays), shape=tuple(header['shape']))
+        scores = np.asarray(detector._predict_batch(scanner_type, batch), dtype=np.float32)
+        return {'version': detector.runtime_versions.get(scanner_type)}, [scores]
+    except Exception as e:
+        logger.exception("Inference pool request failed")
+        return {'error': f"{type(e).__name__}: {e}"}, []
+
+
+def _run_worker(listener: socket.socket, detector: Any, parent: int) -> None:
+    """Serve requests on every accepted connection until the server goes away"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl-C reaches the whole process group; the server stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    while os.getppid() == parent:
+        for key, _ in selector.select(timeout=1.0):
+            if key.fileobj is listener:
+                try:
+                    conn, _ = listener.accept()
+                except BlockingIOError:
+                    # Another worker took the connection
+                    continue
+                conn.settimeout(settings.AI_INFERENCE_POOL_TIMEOUT)
+                selector.register(conn, selectors.EVENT_READ)
+                continue
+            conn = key.fileobj
+            try:
+                _send_message(conn, *_score(detector, *_recv_message(conn)))
+            except (OSError, ValueError):
+                # A closed, timed out or malformed connection; the worker goes on serving the others
+                selector.unregister(conn)
+                conn.close()
+
+
+def serve(socket_path: Optional[str] = None, workers: Optional[int] = None) -> int:
+    """Load and warm the models, fork the workers and keep them running until terminated.
+
+    Only one server runs per socket: the others find its lock taken and
+    return at once, so every API process may try to start one.
+
+    Args:
+        socket_path: Socket to listen on, AI_INFERENCE_POOL_SOCKET by default
+        workers: Worker processes, AI_INFERENCE_POOL_WORKERS by default
+
+    Returns:
+        Process exit code
+    """
+    socket_path = socket_path or settings.AI_INFERENCE_POOL_SOCKET
+    workers = workers or settings.AI_INFERENCE_POOL_WORKERS or 1
+    if settings.AI_RUNTIME == 'keras':
+        raise ValueError("The inference pool serves stored models: set AI_RUNTIME to numpy or tflite")
+    lock = open(socket_path + '.lock', 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info("An inference pool already serves %s", socket_path)
+        lock.close()
+        return 0
+
+    from app.core.ai.vulnerability_detector import VulnerabilityDetector
+
+    detector = VulnerabilityDetector()
+    detector.pool_client = None
+    # Loading and one batch per model fault in the weights, and let the
+    # interpreter pack them, before the fork rather than once per worker
+    warmup = sparse.csr_matrix((settings.AI_BATCH_MAX_SIZE, detector.featurizer.n_features), dtype=np.float32)
+    for scanner_type in detector.vulnerability_types:
+        detector._predict_batch(scanner_type, warmup)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+    listener.setblocking(False)
+    # Objects the garbage collector never visits keep their pages shared
+    gc.collect()
+    gc.freeze()
+
+    parent = os.getpid()
+    children: Dict[int, float] = {}
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(listener, detector, parent)
+            except BaseException:
+                logger.exception("Inference worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def terminate(signum: int, frame: Any) -> None:
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        for _ in range(workers):
+            spawn()
+        logger.info("Inference pool serving %s with %d workers", socket_path, workers)
+        while True:
+            pid, status = os.wait()
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            logger.warning("Inference worker %d exited with status %d, restarting it", pid, status)
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0)
+            spawn()
+    except (SystemExit, KeyboardInterrupt):
+        return 0
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        lock.close()
+
+
+def _memory_kb(pid: int) -> Dict[str, int]:
+    """Resident and proportional set size of a process; shared pages count once in the PSS of all sharers"""
+    usage = {'rss': 0, 'pss': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field.lower() in usage:
+                    usage[field.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+class InferencePool:
+    """Starts and stops an inference pool server as a child process.
+
+    The server is a fresh interpreter rather than a fork of the caller:
+    forking a process with an event loop and threads running is unsafe.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, workers: Optional[int] = None):
+        self.socket_path = socket_path or settings.AI_INFERENCE_POOL_SOCKET
+        self.workers = workers or settings.AI_INFERENCE_POOL_WORKERS or 1
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 120.0) -> None:
+        """Start the server, or find one already running, and wait until it accepts connections"""
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'app.core.ai.inference_pool',
+             '--socket', self.socket_path, '--workers', str(self.workers)],
+            cwd=_BACKEND_DIR
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return
+            code = self.process.poll()
+            if code:
+                raise RuntimeError(f"Inference pool exited with status {code}")
+            time.sleep(0.1)
+        self.stop()
+        raise TimeoutError(f"Inference pool did not start within {timeout:.0f}s")
+
+    def is_ready(self) -> bool:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                return False
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def worker_pids(self) -> List[int]:
+        """Process IDs of the running workers"""
+        if self.process is None or self.process.poll() is not None:
+            return []
+        try:
+            with open(f'/proc/{self.process.pid}/task/{self.process.pid}/children') as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Memory of the server and its workers, in MB"""
+        if self.process is None or self.process.poll() is not None:
+            return {}
+        usage = [_memory_kb(pid) for pid in [self.process.pid] + self.worker_pids()]
+        return {
+            'processes': len(usage),
+            'rss_mb': round(sum(item['rss'] for item in usage) / 1024, 1),
+            'pss_mb': round(sum(item['pss'] for item in usage) / 1024, 1),
+            'server_rss_mb': round(usage[0]['rss'] / 1024, 1),
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', help='socket to listen on, AI_INFERENCE_POOL_SOCKET by default')
+    parser.add_argument('--workers', type=int, help='worker processes, AI_INFERENCE_POOL_WORKERS by default')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    return serve(args.socket, args.workers)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
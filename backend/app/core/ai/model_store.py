@@ -0,0 +1,236 @@
+"""Versioned on-disk store of exported detector models"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.core.ai.numpy_runtime import MANIFEST, NumpyModel
+from app.core.config import settings
+
+ACTIVE = 'ACTIVE'
+METADATA = 'metadata.json'
+QUANTIZED = 'model.{precision}.tflite'
+# Unfolded Keras weights, what training resumes from; the same file name as a training checkpoint
+TRAINING_WEIGHTS = 'weights.npz'
+
+
+class StoredModel(NamedTuple):
+    version: str
+    model: NumpyModel
+    featurizer: Dict[str, Any]
+    labels: List[str]
+    metadata: Dict[str, Any]
+
+
+class ModelStore:
+    """Model versions per scanner type, with one of them active.
+
+    A version is a directory holding the exported weights as .npy files,
+    the featurizer configuration and the label order the outputs follow,
+    and optionally the Keras weights it was exported from, so a restarted
+    process can train on from it.
+    Its name ends in a hash of that content, so saving an identical model
+    twice reuses the existing version. Versions are written to a temporary
+    directory and renamed into place, and the ACTIVE pointer is replaced
+    with an atomic rename, so readers never see a partial version or
+    pointer. Weights are loaded memory-mapped, which lets every worker
+    process share the same pages. Quantized variants of a version are
+    added to its directory later, each with an atomic rename.
+
+    Layout: <root>/<scanner_type>/ACTIVE and <root>/<scanner_type>/versions/<version>/
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """Initialize the store.
+
+        Args:
+            root: Directory holding the models, AI_MODEL_DIR by default
+        """
+        self.root = root or settings.AI_MODEL_DIR
+
+    def save(self, scanner_type: str, model: NumpyModel, featurizer: Dict[str, Any], labels: List[str],
+             metadata: Optional[Dict[str, Any]] = None, activate: bool = True,
+             training_weights: Optional[List[np.ndarray]] = None) -> str:
+        """Store a model as a new version.
+
+        Args:
+            scanner_type: Scanner type the model serves
+            model: Exported model
+            featurizer: Featurizer configuration the model was trained with
+            labels: Vulnerability type of each output, in order
+            metadata: Anything else worth keeping, such as training metrics
+            activate: Make this version the active one
+            training_weights: Weights of the Keras model the export was made from, in get_weights() order
+
+        Returns:
+            Name of the version, new or identical existing one
+        """
+        versions_dir = self._versions_dir(scanner_type)
+        os.makedirs(versions_dir, exist_ok=True)
+        content_hash = self._content_hash(model, featurizer, labels)
+
+        version = next((v for v in self.list_versions(scanner_type) if v.endswith(content_hash)), None)
+        if version is None:
+            version = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{content_hash}"
+            staging = tempfile.mkdtemp(prefix='.staging-', dir=versions_dir)
+            try:
+                model.save(staging)
+                if training_weights is not None:
+                    with open(os.path.join(staging, TRAINING_WEIGHTS), 'wb') as f:
+                        np.savez(f, *training_weights)
+                with open(os.path.join(staging, METADATA), 'w') as f:
+                    json.dump({
+                        'featurizer': featurizer,
+                        'labels': labels,
+                        'content_hash': content_hash,
+                        'created_at': time.time(),
+                        **(metadata or {})
+                    }, f)
+                os.rename(staging, os.path.join(versions_dir, version))
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+                # Another process stored the same content in the same second
+                if not os.path.isdir(os.path.join(versions_dir, version)):
+                    raise
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        elif training_weights is not None and self.training_weights(scanner_type, version) is None:
+            # The same export, stored before its Keras weights were kept
+            directory = os.path.join(versions_dir, version)
+            fd, temporary = tempfile.mkstemp(prefix='.write-', suffix='.npz', dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, *training_weights)
+            os.replace(temporary, os.path.join(directory, TRAINING_WEIGHTS))
+
+        if activate:
+            self.activate(scanner_type, version)
+        return version
+
+    def load(self, scanner_type: str, version: Optional[str] = None, mmap: bool = True) -> Optional[StoredModel]:
+        """Load a version, the active one by default.
+
+        Args:
+            scanner_type: Scanner type of the model
+            version: Version name, or None for the active version
+            mmap: Memory-map the weight arrays instead of reading them
+
+        Returns:
+            The stored model, or None if there is no such version
+        """
+        version = version or self.active_version(scanner_type)
+        if version is None:
+            return None
+        directory = os.path.join(self._versions_dir(scanner_type), version)
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            return None
+        with open(os.path.join(directory, METADATA)) as f:
+            metadata = json.load(f)
+        return StoredModel(
+            version=version,
+            model=NumpyModel.load(directory, mmap=mmap),
+            featurizer=metadata.pop('featurizer'),
+            labels=metadata.pop('labels'),
+            metadata=metadata
+        )
+
+    def training_weights(self, scanner_type: str, version: Optional[str] = None) -> Optional[List[np.ndarray]]:
+        """The Keras weights a version was exported from, the active version's by default.
+
+        Returns:
+            The arrays in get_weights() order, or None if the version has none
+        """
+        version = version or self.active_version(scanner_type)
+        if version is None:
+            return None
+        try:
+            with np.load(os.path.join(self._versions_dir(scanner_type), version, TRAINING_WEIGHTS)) as weights:
+                return [weights[f'arr_{i}'] for i in range(len(weights.files))]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def save_quantized(self, scanner_type: str, version: str, precision: str, content: bytes,
+                       report: Optional[Dict[str, Any]] = None) -> str:
+        """Add a quantized variant to a stored version, replacing any earlier one.
+
+        Args:
+            scanner_type: Scanner type of the model
+            version: Version the variant was quantized from
+            precision: Precision of the variant, such as 'int8'
+            content: The .tflite model
+            report: Size and accuracy figures, kept in the version's metadata under quantized.<precision>
+
+        Returns:
+            Path of the variant
+        """
+        directory = os.path.join(self._versions_dir(scanner_type), version)
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            raise ValueError(f"Unknown {scanner_type} model version: {version}")
+        path = os.path.join(directory, QUANTIZED.format(precision=precision))
+        self._write_atomic(directory, path, content)
+
+        with open(os.path.join(directory, METADATA)) as f:
+            metadata = json.load(f)
+        metadata.setdefault('quantized', {})[precision] = report or {}
+        self._write_atomic(directory, os.path.join(directory, METADATA), json.dumps(metadata).encode())
+        return path
+
+    def quantized_path(self, scanner_type: str, version: str, precision: str) -> Optional[str]:
+        """Path of a version's quantized variant, or None if it was never exported"""
+        path = os.path.join(self._versions_dir(scanner_type), version, QUANTIZED.format(precision=precision))
+        return path if os.path.exists(path) else None
+
+    def activate(self, scanner_type: str, version: str) -> None:
+        """Point ACTIVE at a version; processes serving the old one switch on their next check"""
+        if version not in self.list_versions(scanner_type):
+            raise ValueError(f"Unknown {scanner_type} model version: {version}")
+        directory = os.path.join(self.root, scanner_type)
+        fd, temporary = tempfile.mkstemp(prefix='.active-', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+        os.replace(temporary, os.path.join(directory, ACTIVE))
+
+    def active_version(self, scanner_type: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, scanner_type, ACTIVE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def list_versions(self, scanner_type: str) -> List[str]:
+        """Version names, oldest first"""
+        try:
+            return sorted(name for name in os.listdir(self._versions_dir(scanner_type))
+                          if not name.startswith('.'))
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _write_atomic(directory: str, path: str, content: bytes) -> None:
+        fd, temporary = tempfile.mkstemp(prefix='.write-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def _versions_dir(self, scanner_type: str) -> str:
+        return os.path.join(self.root, scanner_type, 'versions')
+
+    @staticmethod
+    def _content_hash(model: NumpyModel, featurizer: Dict[str, Any], labels: List[str]) -> str:
+        digest = hashlib.sha256(json.dumps({'featurizer': featurizer, 'labels': labels}, sort_keys=True).encode())
+        for kernel, bias, activation in model.layers:
+            for array in (kernel, bias):
+                digest.update(str(array.shape).encode())
+                digest.update(array.tobytes())
+            digest.update(activation.encode())
+        return digest.hexdigest()[:16]
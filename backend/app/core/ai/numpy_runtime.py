@@ -0,0 +1,156 @@
+"""TensorFlow-free inference for the dense detector models"""
+import json
+import os
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+MANIFEST = 'manifest.json'
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'sigmoid': lambda x: np.exp(-np.logaddexp(0, -x)),
+    'tanh': np.tanh,
+    'softmax': _softmax,
+}
+
+
+class NumpyModel:
+    """A stack of dense layers evaluated with NumPy matmuls.
+
+    Built by export_dense_model from a Keras Sequential model of Dense,
+    BatchNormalization and Dropout layers: dropout is dropped and every
+    batch normalization is folded into the weights of a neighbouring Dense
+    layer, so inference is one matmul and one activation per Dense layer.
+    The arrays are never written to after loading, which makes predict()
+    safe to call from any number of threads.
+    """
+
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray, str]]):
+        for _, _, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+        self.layers = layers
+
+    @property
+    def input_dim(self) -> int:
+        return self.layers[0][0].shape[0]
+
+    def predict(self, inputs: Any) -> np.ndarray:
+        """Outputs for a batch of inputs, dense or scipy sparse"""
+        # A sparse batch stays sparse through the first matmul, which is where the input width is
+        x = inputs if sparse.issparse(inputs) else np.asarray(inputs, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = ACTIVATIONS[activation](x @ kernel + bias)
+        return x
+
+    # Same call as a Keras model, so either can serve a MicroBatcher
+    predict_on_batch = predict
+
+    def save(self, directory: str) -> None:
+        """Write one .npy file per array plus a manifest describing the layers"""
+        os.makedirs(directory, exist_ok=True)
+        manifest = {'layers': []}
+        for index, (kernel, bias, activation) in enumerate(self.layers):
+            np.save(os.path.join(directory, f'dense_{index}_kernel.npy'), kernel)
+            np.save(os.path.join(directory, f'dense_{index}_bias.npy'), bias)
+            manifest['layers'].append({
+                'kernel': f'dense_{index}_kernel.npy',
+                'bias': f'dense_{index}_bias.npy',
+                'activation': activation,
+            })
+        with open(os.path.join(directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> 'NumpyModel':
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        mode = 'r' if mmap else None
+        return cls([
+            (np.load(os.path.join(directory, layer['kernel']), mmap_mode=mode),
+             np.load(os.path.join(directory, layer['bias']), mmap_mode=mode),
+             layer['activation'])
+            for layer in manifest['layers']
+        ])
+
+
+def export_dense_model(model: Any) -> NumpyModel:
+    """Convert a Keras Dense/BatchNormalization/Dropout stack into a NumpyModel.
+
+    A batch normalization directly after a linear Dense layer is folded into
+    that layer. One after an activation is an affine map of the activations,
+    which is folded into the next Dense layer instead.
+
+    Args:
+        model: Keras Sequential model
+
+    Returns:
+        Equivalent NumpyModel with float32 weights
+    """
+    layers: List[List[Any]] = []
+    # Per-feature (scale, shift) waiting for the next Dense layer
+    pending: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ('Dropout', 'InputLayer'):
+            continue
+        if kind == 'Dense':
+            kernel, bias = _dense_weights(layer)
+            if pending is not None:
+                scale, shift = pending
+                bias = shift @ kernel + bias
+                kernel = scale[:, None] * kernel
+                pending = None
+            layers.append([kernel, bias, layer.get_config()['activation']])
+        elif kind == 'BatchNormalization':
+            scale, shift = _batch_norm_affine(layer)
+            if pending is not None:
+                pending = (pending[0] * scale, pending[1] * scale + shift)
+            elif layers and layers[-1][2] == 'linear':
+                layers[-1][0] = layers[-1][0] * scale
+                layers[-1][1] = layers[-1][1] * scale + shift
+            else:
+                pending = (scale, shift)
+        else:
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind}")
+
+    if pending is not None:
+        # Trailing normalization after an activation: keep it as a diagonal layer
+        scale, shift = pending
+        layers.append([np.diag(scale), shift, 'linear'])
+    if not layers:
+        raise ValueError("Model has no Dense layers")
+    return NumpyModel([(k.astype(np.float32), b.astype(np.float32), a) for k, b, a in layers])
+
+
+def _dense_weights(layer: Any) -> Tuple[np.ndarray, np.ndarray]:
+    weights = layer.get_weights()
+    kernel = weights[0].astype(np.float64)
+    bias = weights[1].astype(np.float64) if len(weights) > 1 else np.zeros(kernel.shape[1])
+    return kernel, bias
+
+
+def _batch_norm_affine(layer: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Inference-time batch normalization as x * scale + shift"""
+    config = layer.get_config()
+    weights = [w.astype(np.float64) for w in layer.get_weights()]
+    gamma = weights.pop(0) if config.get('scale', True) else None
+    beta = weights.pop(0) if config.get('center', True) else None
+    mean, variance = weights
+    scale = 1.0 / np.sqrt(variance + config['epsilon'])
+    if gamma is not None:
+        scale = scale * gamma
+    shift = -mean * scale
+    if beta is not None:
+        shift = shift + beta
+    return scale, shift
@@ -0,0 +1,248 @@
+"""Content-addressed cache of detector features and predictions"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.core.databases.database import Database
+
+# Writes between prunes of the oldest entries
+PRUNE_EVERY = 1000
+# Seconds to wait for another process's write; the read or write is skipped after that
+BUSY_TIMEOUT = 0.25
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=16).digest()
+
+
+class CachedPrediction(NamedTuple):
+    features: Any  # 1-row CSR matrix
+    scores: Optional[np.ndarray]  # None when they came from another model version
+
+
+class _Entry(NamedTuple):
+    indices: np.ndarray
+    data: np.ndarray
+    n_features: int
+    version: str
+    scores: np.ndarray
+
+
+class PredictionStore(Database):
+    """SQLite tier of the prediction cache, shared by processes and kept across restarts.
+
+    Every write is its own short transaction, so other processes sharing
+    the file are never locked out for long. The store is not thread-safe:
+    PredictionCache uses it from a single thread.
+    """
+
+    def __init__(self, db_path: str, max_entries: Optional[int] = None):
+        """Initialize the store.
+
+        Args:
+            db_path: Path to the SQLite file
+            max_entries: Entries kept before the oldest are pruned
+        """
+        super().__init__(db_path)
+        self.max_entries = max_entries or settings.AI_PREDICTION_CACHE_DISK_ENTRIES
+        self._writes = 0
+
+    def connect(self) -> None:
+        """Open the database and create the cache table."""
+        self.connection = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        self.cursor = self.connection.cursor()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # A cache can lose its last writes on power loss; commits then need no fsync
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_table('ai_predictions', {
+            'domain': 'TEXT NOT NULL',
+            'digest': 'BLOB NOT NULL',
+            'n_features': 'INTEGER NOT NULL',
+            'indices': 'BLOB NOT NULL',
+            'data': 'BLOB NOT NULL',
+            'version': 'TEXT NOT NULL',
+            'scores': 'BLOB NOT NULL',
+            'stored_at': 'REAL NOT NULL',
+            'PRIMARY KEY': '(domain, digest)'
+        })
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_ai_predictions_stored_at ON ai_predictions (stored_at)")
+        self.commit()
+
+    def get(self, domain: str, digest: bytes) -> Optional[_Entry]:
+        rows = self.execute_query(
+            "SELECT indices, data, n_features, version, scores FROM ai_predictions WHERE domain = ? AND digest = ?",
+            (domain, digest)
+        )
+        if not rows:
+            return None
+        indices, data, n_features, version, scores = rows[0]
+        return _Entry(np.frombuffer(indices, dtype=np.int32), np.frombuffer(data, dtype=np.float32),
+                      n_features, version, np.frombuffer(scores, dtype=np.float32))
+
+    def put(self, domain: str, digest: bytes, entry: _Entry) -> None:
+        self.execute_query(
+            "INSERT OR REPLACE INTO ai_predictions "
+            "(domain, digest, n_features, indices, data, version, scores, stored_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (domain, digest, entry.n_features, entry.indices.tobytes(), entry.data.tobytes(), entry.version,
+             entry.scores.astype(np.float32).tobytes(), time.time())
+        )
+        self.commit()
+        self._writes += 1
+        if self._writes >= PRUNE_EVERY:
+            self.flush()
+
+    def delete_domain(self, domain: str) -> None:
+        self.execute_query("DELETE FROM ai_predictions WHERE domain = ?", (domain,))
+        self.commit()
+
+    def flush(self) -> None:
+        """Prune the oldest entries."""
+        if not self.connection:
+            return
+        self.execute_query(
+            "DELETE FROM ai_predictions WHERE rowid IN "
+            "(SELECT rowid FROM ai_predictions ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.commit()
+        self._writes = 0
+
+
+class PredictionCache:
+    """Features and model scores of analyzed texts, by domain and content hash.
+
+    A bounded in-memory LRU sits in front of an optional SQLite store
+    (AI_PREDICTION_CACHE_PATH); disk hits are promoted to memory. Each
+    entry remembers the model version its scores came from. Looking it up
+    under another version still returns the features, which depend only on
+    the featurizer, but not the scores, so a newly activated model never
+    serves predictions of the one before it.
+
+    The SQLite store is only touched by one disk thread: writes are queued
+    to it without waiting, and on the event loop lookup_async awaits disk
+    reads instead of blocking on them.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, path: Optional[str] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Entries kept in memory, AI_PREDICTION_CACHE_SIZE by default
+            path: SQLite file of the disk tier, AI_PREDICTION_CACHE_PATH by default; empty disables it
+        """
+        self.max_entries = max_entries or settings.AI_PREDICTION_CACHE_SIZE
+        path = settings.AI_PREDICTION_CACHE_PATH if path is None else path
+        self.disk = PredictionStore(path) if path else None
+        self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-prediction-cache') \
+            if self.disk is not None else None
+        self._entries: 'OrderedDict[Tuple[str, bytes], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'feature_hits': 0, 'misses': 0,
+                      'stored': 0}
+
+    def lookup(self, domain: str, digest: bytes, version: str) -> Optional[CachedPrediction]:
+        """Cached features and, if they came from this model version, scores.
+
+        Blocks while the disk tier is read; on the event loop use lookup_async.
+
+        Args:
+            domain: Scanner type the text was analyzed for
+            digest: content_hash of the analyzed text
+            version: Model version predictions are currently served by
+
+        Returns:
+            The cached prediction, with scores None if only the features are usable, or None on a miss
+        """
+        entry = self._memory_entry(domain, digest)
+        if entry is not None:
+            return self._result(entry, 'memory_hits', version)
+        if self.disk is not None:
+            entry = self._disk_executor.submit(self._disk_entry, domain, digest).result()
+        return self._result(entry, 'disk_hits', version)
+
+    async def lookup_async(self, domain: str, digest: bytes, version: str) -> Optional[CachedPrediction]:
+        """lookup() for the event loop: a disk read runs on the disk thread while the loop goes on"""
+        entry = self._memory_entry(domain, digest)
+        if entry is not None:
+            return self._result(entry, 'memory_hits', version)
+        if self.disk is not None:
+            entry = await asyncio.wrap_future(self._disk_executor.submit(self._disk_entry, domain, digest))
+        return self._result(entry, 'disk_hits', version)
+
+    def store(self, domain: str, digest: bytes, features: Any, version: str, scores: np.ndarray) -> None:
+        """Remember the features of a text and the scores the given model version gave them"""
+        features = sparse.csr_matrix(features)
+        entry = _Entry(features.indices.astype(np.int32), features.data.astype(np.float32),
+                       features.shape[1], version, np.asarray(scores, dtype=np.float32))
+        with self._lock:
+            self._remember((domain, digest), entry)
+            self.stats['stored'] += 1
+        if self.disk is not None:
+            self._disk_executor.submit(self.disk.put, domain, digest, entry)
+
+    def invalidate(self, domain: str) -> None:
+        """Forget everything cached for a domain, in memory and on disk"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == domain]:
+                del self._entries[key]
+        if self.disk is not None:
+            self._disk_executor.submit(self.disk.delete_domain, domain).result()
+
+    def flush(self) -> None:
+        """Wait for queued disk writes and prune the disk tier; blocks, so not for the event loop"""
+        if self.disk is not None:
+            self._disk_executor.submit(self.disk.flush).result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = self.stats['lookups']
+        return {
+            **self.stats,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+        }
+
+    def _memory_entry(self, domain: str, digest: bytes) -> Optional[_Entry]:
+        with self._lock:
+            self.stats['lookups'] += 1
+            entry = self._entries.get((domain, digest))
+            if entry is not None:
+                self._entries.move_to_end((domain, digest))
+            return entry
+
+    def _disk_entry(self, domain: str, digest: bytes) -> Optional[_Entry]:
+        """Runs on the disk thread; a hit is promoted to memory"""
+        entry = self.disk.get(domain, digest)
+        if entry is not None:
+            with self._lock:
+                self._remember((domain, digest), entry)
+        return entry
+
+    def _result(self, entry: Optional[_Entry], tier: str, version: str) -> Optional[CachedPrediction]:
+        with self._lock:
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            features = sparse.csr_matrix((entry.data, entry.indices, [0, len(entry.indices)]),
+                                         shape=(1, entry.n_features))
+            if entry.version != version:
+                self.stats['feature_hits'] += 1
+                return CachedPrediction(features, None)
+            self.stats[tier] += 1
+            return CachedPrediction(features, entry.scores)
+
+    def _remember(self, key: Tuple[str, bytes], entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
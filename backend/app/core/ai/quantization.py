@@ -0,0 +1,187 @@
+"""Quantized TFLite export and inference for the detector models"""
+import threading
+import warnings
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from app.core.ai.featurizer import HashingFeaturizer
+from app.core.ai.numpy_runtime import NumpyModel
+from app.core.ai.training import featurize_batch
+from app.core.config import settings
+
+PRECISIONS = ('int8', 'float16')
+
+
+def quantize_model(model: NumpyModel, precision: str) -> bytes:
+    """Convert an exported model into a quantized TFLite flatbuffer.
+
+    int8 is dynamic-range quantization: weights are stored as int8 with a
+    scale per output channel and activations are quantized on the fly, so
+    matmuls run on int8 kernels while inputs and outputs stay float32.
+    float16 only halves the file: on CPU the weights are expanded back to
+    float32 when loaded.
+    The conversion needs TensorFlow; running the result does not.
+
+    Args:
+        model: Float model, with batch normalization already folded
+        precision: 'int8' or 'float16'
+
+    Returns:
+        The .tflite model
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision: {precision}")
+    import tensorflow as tf
+
+    activations = {'linear': tf.identity, 'relu': tf.nn.relu, 'sigmoid': tf.sigmoid, 'tanh': tf.tanh,
+                   'softmax': tf.nn.softmax}
+    layers = [(tf.constant(np.asarray(kernel)), tf.constant(np.asarray(bias)), activations[activation])
+              for kernel, bias, activation in model.layers]
+
+    @tf.function(input_signature=[tf.TensorSpec([None, model.input_dim], tf.float32)])
+    def forward(x):
+        for kernel, bias, activation in layers:
+            x = activation(tf.matmul(x, kernel) + bias)
+        return x
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([forward.get_concrete_function()])
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def _interpreter_class() -> Any:
+    """The lightest TFLite interpreter installed: LiteRT, tflite-runtime, then TensorFlow's"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """A quantized detector model run by the TFLite interpreter.
+
+    The interpreter memory-maps the file and keeps its tensors allocated
+    for the last batch size it saw. It is not thread-safe and each one
+    holds its own packed copy of the weights, so a model has a single
+    interpreter and calls take turns; batches of one model already run one
+    at a time behind its MicroBatcher.
+
+    Resizing the input reallocates every tensor, so batches are padded to
+    a power of two and larger ones split at max_batch_size: the
+    interpreter only ever sees a handful of shapes.
+    """
+
+    def __init__(self, path: str, max_batch_size: Optional[int] = None):
+        self.path = path
+        self.max_batch_size = max_batch_size or settings.AI_BATCH_MAX_SIZE
+        self._lock = threading.Lock()
+        with warnings.catch_warnings():
+            # tf.lite.Interpreter warns that it is deprecated in favour of LiteRT
+            warnings.simplefilter('ignore')
+            self._interpreter = _interpreter_class()(model_path=path, num_threads=1)
+        self._interpreter.allocate_tensors()
+        input_details = self._interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
+        output_details = self._interpreter.get_output_details()[0]
+        self._output_index = output_details['index']
+        self._batch_size = int(input_details['shape'][0])
+        self.input_dim = int(input_details['shape'][-1])
+        self.output_dim = int(output_details['shape'][-1])
+
+    def predict(self, inputs: Any) -> np.ndarray:
+        """Outputs for a batch of inputs, dense or scipy sparse"""
+        x = inputs.toarray() if sparse.issparse(inputs) else np.asarray(inputs)
+        x = np.ascontiguousarray(x, dtype=np.float32).reshape(-1, self.input_dim)
+        outputs = [np.empty((0, self.output_dim), np.float32)]
+        with self._lock:
+            for start in range(0, len(x), self.max_batch_size):
+                outputs.append(self._invoke(x[start:start + self.max_batch_size]))
+        return np.concatenate(outputs) if len(outputs) > 2 else outputs[-1]
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        rows = len(x)
+        size = min(1 << (rows - 1).bit_length(), self.max_batch_size)
+        if size != rows:
+            padded = np.zeros((size, self.input_dim), np.float32)
+            padded[:rows] = x
+            x = padded
+        if self._batch_size != size:
+            self._interpreter.resize_tensor_input(self._input_index, x.shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = size
+        self._interpreter.set_tensor(self._input_index, x)
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index)[:rows]
+
+    predict_on_batch = predict
+
+
+def evaluate_quantization(reference: Any, quantized: Any, samples: Iterable[Dict[str, Any]],
+                          featurizer: HashingFeaturizer, labels: List[str], threshold: float = 0.5,
+                          batch_size: int = 256) -> Dict[str, Any]:
+    """Compare a quantized model with the float model it came from on labelled samples.
+
+    Accuracy is per label, as Keras' binary accuracy: the share of
+    (sample, label) decisions at the threshold that match the labels.
+
+    Args:
+        reference: Float model
+        quantized: Quantized model
+        samples: Held-out {"text": ..., "labels": [...]} samples
+        featurizer: Featurizer the models were trained with
+        labels: Vulnerability type of each output, in order
+        threshold: Score above which a label counts as predicted
+        batch_size: Samples featurized and scored at a time
+
+    Returns:
+        Sample count, both accuracies, their delta, decision agreement and score drift
+    """
+    totals = {'samples': 0, 'float_correct': 0, 'quantized_correct': 0, 'agree': 0,
+              'abs_diff': 0.0, 'max_abs_diff': 0.0}
+
+    def score(batch: List[Dict[str, Any]]) -> None:
+        features, targets = featurize_batch(featurizer, labels, batch)
+        expected = targets > 0.5
+        float_scores = np.asarray(reference.predict(features))
+        quantized_scores = np.asarray(quantized.predict(features))
+        diff = np.abs(float_scores - quantized_scores)
+        totals['samples'] += len(batch)
+        totals['float_correct'] += int(((float_scores > threshold) == expected).sum())
+        totals['quantized_correct'] += int(((quantized_scores > threshold) == expected).sum())
+        totals['agree'] += int(((float_scores > threshold) == (quantized_scores > threshold)).sum())
+        totals['abs_diff'] += float(diff.sum())
+        totals['max_abs_diff'] = max(totals['max_abs_diff'], float(diff.max()))
+
+    batch: List[Dict[str, Any]] = []
+    for sample in samples:
+        batch.append({'text': sample.get('text', ''), 'labels': sample.get('labels', [])})
+        if len(batch) == batch_size:
+            score(batch)
+            batch = []
+    if batch:
+        score(batch)
+
+    decisions = totals['samples'] * len(labels)
+    if not decisions:
+        return {'samples': 0}
+    float_accuracy = totals['float_correct'] / decisions
+    quantized_accuracy = totals['quantized_correct'] / decisions
+    return {
+        'samples': totals['samples'],
+        'float_accuracy': round(float_accuracy, 6),
+        'quantized_accuracy': round(quantized_accuracy, 6),
+        'accuracy_delta': round(quantized_accuracy - float_accuracy, 6),
+        'decision_agreement': round(totals['agree'] / decisions, 6),
+        'mean_abs_diff': round(totals['abs_diff'] / decisions, 8),
+        'max_abs_diff': round(totals['max_abs_diff'], 8),
+    }
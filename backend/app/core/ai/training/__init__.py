@@ -0,0 +1,5 @@
+from .pipeline import TrainingPipeline, create_training_executor, featurize_batch
+from .sources import ShardSource, iter_jsonl, iter_sqlite
+
+__all__ = ['TrainingPipeline', 'create_training_executor', 'featurize_batch', 'ShardSource', 'iter_jsonl',
+           'iter_sqlite']
@@ -0,0 +1,242 @@
+"""Out-of-core training of the detector models"""
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.ai.featurizer import HashingFeaturizer
+from app.core.config import settings
+
+logger = logging.getLogger("vapt.ai.training")
+
+CHECKPOINT_WEIGHTS = 'weights.npz'
+CHECKPOINT_STATE = 'state.json'
+
+
+def create_training_executor(workers: Optional[int] = None) -> Executor:
+    workers = workers or settings.AI_TRAINING_WORKERS
+    if settings.AI_TRAINING_EXECUTOR == 'process':
+        # Worth it for long texts. TensorFlow's threads are running by now, so workers are spawned, not forked
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-training')
+
+
+def featurize_batch(featurizer: HashingFeaturizer, labels: List[str], samples: List[Dict[str, Any]]) -> Tuple[Any, np.ndarray]:
+    """Sparse features and multi-hot label vectors of a batch of samples"""
+    X = featurizer.transform(sample['text'] for sample in samples)
+    y = np.zeros((len(samples), len(labels)), dtype=np.float32)
+    index = {label: i for i, label in enumerate(labels)}
+    for row, sample in enumerate(samples):
+        for label in sample['labels']:
+            if label in index:
+                y[row, index[label]] = 1.0
+    return X, y
+
+
+class TrainingPipeline:
+    """Trains a Keras detector model on a stream of labelled samples.
+
+    The source is read once per epoch and never held in memory: samples are
+    cut into batches, featurized by a pool of workers while the model trains
+    on earlier batches, and fed to Keras through a tf.data input. At most
+    `prefetch` featurized batches wait at any time. A fixed share of the
+    samples, chosen by a hash of their text, is held out for validation and
+    early stopping, so the split is the same on every pass.
+
+    Weights are checkpointed every `checkpoint_every` batches and at the end
+    of each epoch; a run that finds a checkpoint resumes from its epoch.
+    """
+
+    def __init__(self, model: Any, labels: List[str], featurizer: Optional[HashingFeaturizer] = None,
+                 batch_size: Optional[int] = None, workers: Optional[int] = None, prefetch: Optional[int] = None,
+                 holdout: Optional[float] = None, checkpoint_dir: Optional[str] = None,
+                 checkpoint_every: Optional[int] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.model = model
+        self.labels = list(labels)
+        self.featurizer = featurizer or HashingFeaturizer()
+        self.batch_size = batch_size or settings.AI_TRAINING_BATCH_SIZE
+        self.workers = workers or settings.AI_TRAINING_WORKERS
+        self.prefetch = prefetch or settings.AI_TRAINING_PREFETCH
+        self.holdout = settings.AI_TRAINING_HOLDOUT if holdout is None else holdout
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every or settings.AI_TRAINING_CHECKPOINT_EVERY
+        self.on_progress = on_progress
+        self._executor: Optional[Executor] = None
+        self.stats: Dict[str, Any] = {'samples': 0, 'validation_samples': 0, 'batches': 0, 'epochs': 0,
+                                      'checkpoints': 0, 'resumed_from_epoch': 0, 'samples_per_sec': 0.0}
+
+    def run(self, source: Iterable[Dict[str, Any]], epochs: int = 10, patience: int = 3) -> Dict[str, Any]:
+        """Train on a source of {"text": ..., "labels": [...]} samples.
+
+        Args:
+            source: Re-iterable samples, such as a ShardSource or a list
+            epochs: Passes over the source
+            patience: Epochs without improvement of the validation loss before stopping
+
+        Returns:
+            Training statistics, including throughput in samples/sec
+        """
+        if iter(source) is source:
+            raise ValueError("Training needs a source that can be iterated once per epoch, not an iterator")
+
+        import tensorflow as tf
+
+        initial_epoch = self._restore()
+        if initial_epoch >= epochs:
+            return self._finish()
+
+        signature = (tf.TensorSpec((None, self.featurizer.n_features), tf.float32),
+                     tf.TensorSpec((None, len(self.labels)), tf.float32))
+        training = tf.data.Dataset.from_generator(
+            lambda: self._batches(source, validation=False), output_signature=signature
+        ).prefetch(tf.data.AUTOTUNE)
+        callbacks = [_progress_callback(self)]
+        validation = None
+        if self.holdout > 0:
+            validation = tf.data.Dataset.from_generator(
+                lambda: self._batches(source, validation=True), output_signature=signature
+            ).prefetch(tf.data.AUTOTUNE)
+            callbacks.append(tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience,
+                                                              restore_best_weights=True))
+
+        with create_training_executor(self.workers) as executor:
+            self._executor = executor
+            try:
+                history = self.model.fit(training, validation_data=validation, epochs=epochs,
+                                         initial_epoch=initial_epoch, callbacks=callbacks, shuffle=False, verbose=0)
+            finally:
+                self._executor = None
+
+        self.stats['history'] = {key: [float(v) for v in values] for key, values in history.history.items()}
+        return self._finish()
+
+    def _batches(self, source: Iterable[Dict[str, Any]], validation: bool) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Featurized batches of one pass over the source, in order, with bounded read-ahead"""
+        in_flight: deque = deque()
+        for samples in self._chunks(source, validation):
+            in_flight.append(self._executor.submit(featurize_batch, self.featurizer, self.labels, samples))
+            if len(in_flight) > self.prefetch:
+                X, y = in_flight.popleft().result()
+                yield X.toarray(), y
+        while in_flight:
+            X, y = in_flight.popleft().result()
+            yield X.toarray(), y
+
+    def _chunks(self, source: Iterable[Dict[str, Any]], validation: bool) -> Iterator[List[Dict[str, Any]]]:
+        chunk: List[Dict[str, Any]] = []
+        counter = 'validation_samples' if validation else 'samples'
+        for sample in source:
+            if self._held_out(sample.get('text', '')) != validation:
+                continue
+            chunk.append({'text': sample.get('text', ''), 'labels': sample.get('labels', [])})
+            self.stats[counter] += 1
+            if len(chunk) == self.batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def holdout_samples(self, source: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """The samples of a source held out for validation, the same ones on every pass"""
+        return (sample for sample in source if self._held_out(sample.get('text', '')))
+
+    def _held_out(self, text: str) -> bool:
+        return self.holdout > 0 and zlib.crc32(text.encode('utf-8', 'replace')) % 10000 < self.holdout * 10000
+
+    def checkpoint(self, epoch: int) -> None:
+        """Atomically save the current weights and the number of completed epochs"""
+        if not self.checkpoint_dir:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(prefix='.weights-', suffix='.npz', dir=self.checkpoint_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, *self.model.get_weights())
+        os.replace(temporary, os.path.join(self.checkpoint_dir, CHECKPOINT_WEIGHTS))
+        fd, temporary = tempfile.mkstemp(prefix='.state-', dir=self.checkpoint_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'epoch': epoch, 'labels': self.labels, 'featurizer': self.featurizer.get_config(),
+                       'saved_at': time.time()}, f)
+        os.replace(temporary, os.path.join(self.checkpoint_dir, CHECKPOINT_STATE))
+        self.stats['checkpoints'] += 1
+
+    def _restore(self) -> int:
+        """Load a compatible checkpoint into the model and return the epoch to start from"""
+        if not self.checkpoint_dir:
+            return 0
+        try:
+            with open(os.path.join(self.checkpoint_dir, CHECKPOINT_STATE)) as f:
+                state = json.load(f)
+            with np.load(os.path.join(self.checkpoint_dir, CHECKPOINT_WEIGHTS)) as weights:
+                arrays = [weights[f'arr_{i}'] for i in range(len(weights.files))]
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+        if state.get('labels') != self.labels or state.get('featurizer') != self.featurizer.get_config():
+            logger.info("Ignoring checkpoint in %s from a different model configuration", self.checkpoint_dir)
+            return 0
+        try:
+            self.model.set_weights(arrays)
+        except ValueError:
+            logger.info("Ignoring checkpoint in %s with mismatched weights", self.checkpoint_dir)
+            return 0
+        self.stats['resumed_from_epoch'] = state['epoch']
+        logger.info("Resuming training from epoch %d", state['epoch'])
+        return state['epoch']
+
+    def _finish(self) -> Dict[str, Any]:
+        if self.checkpoint_dir:
+            # The finished model is saved by the caller; the checkpoint would only resume a completed run
+            for name in (CHECKPOINT_WEIGHTS, CHECKPOINT_STATE):
+                try:
+                    os.remove(os.path.join(self.checkpoint_dir, name))
+                except FileNotFoundError:
+                    pass
+        return dict(self.stats)
+
+
+def _progress_callback(pipeline: TrainingPipeline) -> Any:
+    """Keras callback checkpointing the pipeline and reporting its throughput"""
+    import tensorflow as tf
+
+    class Progress(tf.keras.callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.started = time.perf_counter()
+            self.samples_before = pipeline.stats['samples']
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch = epoch
+            self.epoch_started = time.perf_counter()
+            self.epoch_samples = pipeline.stats['samples']
+
+        def on_train_batch_end(self, batch, logs=None):
+            pipeline.stats['batches'] += 1
+            if pipeline.stats['batches'] % pipeline.checkpoint_every == 0:
+                # Mid-epoch progress is kept, but a resumed run repeats the epoch
+                pipeline.checkpoint(self.epoch)
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.epoch = epoch + 1
+            elapsed = time.perf_counter() - self.epoch_started
+            samples = pipeline.stats['samples'] - self.epoch_samples
+            pipeline.stats['epochs'] += 1
+            pipeline.stats['samples_per_sec'] = round(
+                (pipeline.stats['samples'] - self.samples_before) / max(time.perf_counter() - self.started, 1e-9), 1
+            )
+            pipeline.checkpoint(self.epoch)
+            report = {'epoch': self.epoch, 'samples': samples, 'seconds': round(elapsed, 3),
+                      'samples_per_sec': round(samples / max(elapsed, 1e-9), 1),
+                      **{key: float(value) for key, value in (logs or {}).items()}}
+            logger.info("Epoch %(epoch)d: %(samples)d samples in %(seconds).1fs (%(samples_per_sec).0f samples/sec)",
+                        report)
+            if pipeline.on_progress:
+                pipeline.on_progress(report)
+
+    return Progress()
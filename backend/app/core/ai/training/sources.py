@@ -0,0 +1,95 @@
+"""Streaming readers for labelled training samples"""
+import glob
+import gzip
+import json
+import os
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+JSONL_SUFFIXES = ('.jsonl', '.jsonl.gz', '.ndjson', '.ndjson.gz')
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Samples of a JSON Lines shard, one {"text": ..., "labels": [...]} object per line.
+
+    Gzipped shards are read as they are. Blank lines are skipped.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: {e}") from e
+            yield {'text': item.get('text', ''), 'labels': item.get('labels', [])}
+
+
+def iter_sqlite(path: str, table: str = 'samples', fetch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Samples of a SQLite shard with text and labels columns.
+
+    Labels are a JSON array or a comma-separated string. Rows are fetched
+    fetch_size at a time, so the table never has to fit in memory.
+    """
+    if not _IDENTIFIER.match(table):
+        raise ValueError(f"Invalid table name: {table}")
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        cursor = connection.execute(f'SELECT text, labels FROM {table}')
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for text, labels in rows:
+                yield {'text': text or '', 'labels': _parse_labels(labels)}
+    finally:
+        connection.close()
+
+
+def _parse_labels(labels: Any) -> List[str]:
+    if not labels:
+        return []
+    if labels.lstrip().startswith('['):
+        return json.loads(labels)
+    return [label.strip() for label in labels.split(',') if label.strip()]
+
+
+class ShardSource:
+    """Re-iterable stream of the samples in a set of shard files.
+
+    Each pass reads the shards again from disk in name order, so an epoch
+    costs one sequential read and memory stays flat however large they are.
+    Paths may be glob patterns. JSON Lines and SQLite shards can be mixed.
+    """
+
+    def __init__(self, paths: Union[str, Iterable[str]], table: str = 'samples'):
+        self.paths = self._expand([paths] if isinstance(paths, str) else list(paths))
+        self.table = table
+        for path in self.paths:
+            if not path.endswith(JSONL_SUFFIXES + SQLITE_SUFFIXES):
+                raise ValueError(f"Unsupported shard format: {path}")
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for path in self.paths:
+            if path.endswith(SQLITE_SUFFIXES):
+                yield from iter_sqlite(path, self.table)
+            else:
+                yield from iter_jsonl(path)
+
+    @staticmethod
+    def _expand(patterns: List[str]) -> List[str]:
+        paths = []
+        for pattern in patterns:
+            matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            paths.extend(matches)
+        missing = [path for path in paths if not os.path.isfile(path)]
+        if missing:
+            raise FileNotFoundError(f"Training shards not found: {', '.join(missing)}")
+        if not paths:
+            raise FileNotFoundError(f"No training shards match: {', '.join(patterns)}")
+        return paths
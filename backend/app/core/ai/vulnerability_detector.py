@@ -1,14 +1,48 @@
-import tensorflow as tf
+import asyncio
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
+from scipy import sparse
+from typing import TYPE_CHECKING, Callable, Iterable, List, Dict, Any, Optional, Tuple, Union
 import re
 import json
-from sklearn.feature_extraction.text import TfidfVectorizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-import joblib
+import logging
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.ai.batching import MicroBatcher
+from app.core.ai.featurizer import HashingFeaturizer
+from app.core.ai.model_store import ModelStore, StoredModel
+from app.core.ai.numpy_runtime import NumpyModel, export_dense_model
+from app.core.ai.training import TrainingPipeline
+from app.core.ai.prediction_cache import PredictionCache, content_hash
+from app.core.ai.quantization import TFLiteModel, evaluate_quantization, quantize_model
+from app.core.ai.windowing import iter_windows, merge_window_findings
+from app.core.config import settings
+
+logger = logging.getLogger("vapt.ai")
+
+if TYPE_CHECKING:
+    import tensorflow as tf
 
 class VulnerabilityDetector:
+    """AI analysis for every scanner type.
+
+    The model of a scanner type is built the first time that type is
+    analysed, and TensorFlow is only imported then, so creating a detector
+    is cheap. Texts are featurized by one stateless HashingFeaturizer into
+    sparse vectors. Scanners share one instance through
+    get_vulnerability_detector(). Predictions go through one MicroBatcher
+    per scanner type, which runs them in a small thread pool in batches of
+    concurrent requests instead of one blocking predict() per sample. With
+    AI_RUNTIME "numpy" they are served by the active version in the
+    ModelStore, memory-mapped and without TensorFlow; a version activated
+    by another process is picked up within AI_MODEL_CHECK_INTERVAL seconds.
+    With AI_INFERENCE_POOL_WORKERS set, batches are sent to the pre-forked
+    workers of app.core.ai.inference_pool instead.
+    """
+
     def __init__(self):
         self.vulnerability_types = {
             'web': [
@@ -38,115 +72,420 @@ class VulnerabilityDetector:
             ]
         }
 
-        self.models = self._load_or_create_models()
-        self.vectorizers = self._initialize_vectorizers()
-
-    def _load_or_create_models(self) -> Dict[str, tf.keras.Model]:
-        models = {}
-        for scanner_type, vulnerabilities in self.vulnerability_types.items():
-            model = tf.keras.Sequential([
-                tf.keras.layers.Input(shape=(1000,)),
-                tf.keras.layers.Dense(512, activation='relu'),
-                tf.keras.layers.BatchNormalization(),
-                tf.keras.layers.Dropout(0.3),
-                tf.keras.layers.Dense(256, activation='relu'),
-                tf.keras.layers.BatchNormalization(),
-                tf.keras.layers.Dropout(0.3),
-                tf.keras.layers.Dense(128, activation='relu'),
-                tf.keras.layers.BatchNormalization(),
-                tf.keras.layers.Dense(len(vulnerabilities), activation='sigmoid')
-            ])
-
-            model.compile(
-                optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-                loss='binary_crossentropy',
-                metrics=['accuracy', tf.keras.metrics.AUC()]
-            )
-            models[scanner_type] = model
+        # Filled on first use of each scanner type
+        self.models: Dict[str, 'tf.keras.Model'] = {}
+        self.featurizer = HashingFeaturizer()
+        # What predictions run on: the Keras model or its NumPy export
+        self.runtimes: Dict[str, Any] = {}
+        self.store = ModelStore()
+        # Model store version each runtime was loaded from, and ACTIVE as last read and when
+        self.runtime_versions: Dict[str, str] = {}
+        self._active_versions: Dict[str, str] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._batchers: Dict[str, MicroBatcher] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.prediction_cache = PredictionCache()
+        # With an inference pool, batches are scored by its workers and no model is loaded here
+        self.pool_client = None
+        if settings.AI_INFERENCE_POOL_WORKERS > 0:
+            from app.core.ai.inference_pool import InferencePoolClient
 
-        return models
+            self.pool_client = InferencePoolClient()
 
-    def _initialize_vectorizers(self) -> Dict[str, TfidfVectorizer]:
-        vectorizers = {}
-        for scanner_type in self.vulnerability_types.keys():
-            vectorizers[scanner_type] = TfidfVectorizer(
-                max_features=1000,
-                ngram_range=(1, 3),
-                stop_words='english'
-            )
-        return vectorizers
+    def get_model(self, scanner_type: str) -> 'tf.keras.Model':
+        """The model of a scanner type, built on first use"""
+        model = self.models.get(scanner_type)
+        if model is None:
+            with self._lock:
+                model = self.models.get(scanner_type)
+                if model is None:
+                    model = self._load_or_create_model(scanner_type)
+                    self.models[scanner_type] = model
+        return model
+
+    def get_runtime(self, scanner_type: str) -> Any:
+        """The model predictions of a scanner type run on, loaded on first use"""
+        runtime = self.runtimes.get(scanner_type)
+        if runtime is not None and settings.AI_RUNTIME != 'keras':
+            active = self._active_version(scanner_type)
+            if active and active != self.runtime_versions.get(scanner_type):
+                try:
+                    self._use_version(scanner_type, active)
+                    runtime = self.runtimes[scanner_type]
+                except ValueError:
+                    # Keep serving the loaded version, and its cached scores, rather than failing predictions
+                    self._active_versions[scanner_type] = self.runtime_versions[scanner_type]
+        if runtime is None:
+            with self._lock:
+                runtime = self.runtimes.get(scanner_type)
+                if runtime is None:
+                    runtime = self._load_runtime(scanner_type)
+                    self.runtimes[scanner_type] = runtime
+        return runtime
+
+    def _active_version(self, scanner_type: str) -> Optional[str]:
+        """The store's active version, read at most every AI_MODEL_CHECK_INTERVAL seconds.
+
+        Only the ACTIVE pointer is read: checking never loads a model.
+        """
+        if time.monotonic() - self._checked_at.get(scanner_type, 0.0) >= settings.AI_MODEL_CHECK_INTERVAL:
+            self._checked_at[scanner_type] = time.monotonic()
+            active = self.store.active_version(scanner_type)
+            if active:
+                self._active_versions[scanner_type] = active
+        return self._active_versions.get(scanner_type)
+
+    def activate_model(self, scanner_type: str, version: str) -> None:
+        """Make a stored version active here now and in other processes on their next check"""
+        self.store.activate(scanner_type, version)
+        self._use_version(scanner_type, version)
+
+    def _predict_batch(self, scanner_type: str, batch: Any) -> np.ndarray:
+        if self.pool_client is not None:
+            try:
+                scores, version = self.pool_client.predict(scanner_type, batch)
+            except (OSError, RuntimeError, ValueError) as e:
+                # Scans keep going on a local model while the pool is down, failing or answering garbage
+                logger.warning("Inference pool unavailable, predicting in-process: %s", e)
+            else:
+                if version:
+                    self.runtime_versions[scanner_type] = version
+                return scores
+        runtime = self.get_runtime(scanner_type)
+        if not isinstance(runtime, (NumpyModel, TFLiteModel)):
+            batch = batch.toarray()
+        return runtime.predict_on_batch(batch)
+
+    def _load_runtime(self, scanner_type: str) -> Any:
+        if settings.AI_RUNTIME == 'keras':
+            return self.get_model(scanner_type)
+        stored = self.store.load(scanner_type)
+        if stored is None or not self._compatible(scanner_type, stored):
+            # Nothing usable stored yet: start from the freshly built model
+            model = self.get_model(scanner_type)
+            version = self.store.save(scanner_type, export_dense_model(model),
+                                      self.featurizer.get_config(), self.vulnerability_types[scanner_type],
+                                      {'source': 'initial'}, training_weights=model.get_weights())
+            stored = self.store.load(scanner_type, version)
+        runtime = self._stored_runtime(scanner_type, stored)
+        self.runtime_versions[scanner_type] = stored.version
+        self._active_versions[scanner_type] = stored.version
+        self._checked_at[scanner_type] = time.monotonic()
+        return runtime
+
+    def _use_version(self, scanner_type: str, version: str) -> None:
+        stored = self.store.load(scanner_type, version)
+        if stored is None or not self._compatible(scanner_type, stored):
+            raise ValueError(f"{scanner_type} model version {version} does not fit this detector")
+        runtime = self._stored_runtime(scanner_type, stored)
+        with self._lock:
+            self.runtimes[scanner_type] = runtime
+            self.runtime_versions[scanner_type] = stored.version
+            self._active_versions[scanner_type] = stored.version
+
+    def _stored_runtime(self, scanner_type: str, stored: StoredModel) -> Any:
+        """What serves a stored version: its float weights, or its quantized variant for the tflite runtime"""
+        if settings.AI_RUNTIME != 'tflite':
+            return stored.model
+        path = self.store.quantized_path(scanner_type, stored.version, settings.AI_QUANTIZATION)
+        if path is None:
+            # Versions saved before quantization was enabled are converted once, without an accuracy report
+            self.export_quantized(scanner_type, version=stored.version)
+            path = self.store.quantized_path(scanner_type, stored.version, settings.AI_QUANTIZATION)
+        return TFLiteModel(path)
+
+    def export_quantized(self, scanner_type: str, precision: Optional[str] = None, version: Optional[str] = None,
+                         holdout: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Store a quantized variant of a model version and report what it costs in accuracy.
+
+        Args:
+            scanner_type: Scanner type of the model
+            precision: 'int8', AI_QUANTIZATION by default, or 'float16', which is only exported, never served
+            version: Stored version to quantize, the active one by default
+            holdout: Labelled samples the model was not trained on, to compare both models on
+
+        Returns:
+            Sizes of both models and, with a holdout, their accuracies and the delta
+        """
+        precision = precision or settings.AI_QUANTIZATION
+        stored = self.store.load(scanner_type, version)
+        if stored is None:
+            raise ValueError(f"No stored {scanner_type} model version to quantize")
+        content = quantize_model(stored.model, precision)
+        report: Dict[str, Any] = {
+            'precision': precision,
+            'size_bytes': len(content),
+            'float_size_bytes': sum(kernel.nbytes + bias.nbytes for kernel, bias, _ in stored.model.layers),
+        }
+        if holdout is not None:
+            with tempfile.NamedTemporaryFile(suffix='.tflite') as f:
+                f.write(content)
+                f.flush()
+                report.update(evaluate_quantization(stored.model, TFLiteModel(f.name), holdout,
+                                                    HashingFeaturizer.from_config(stored.featurizer),
+                                                    stored.labels))
+        self.store.save_quantized(scanner_type, stored.version, precision, content, report)
+        return report
+
+    def _compatible(self, scanner_type: str, stored: StoredModel) -> bool:
+        """Whether a stored model reads this detector's features and yields its labels"""
+        featurizer = self.featurizer.get_config()
+        return stored.labels == self.vulnerability_types[scanner_type] and all(
+            stored.featurizer.get(key) == featurizer[key] for key in ('type', 'n_features', 'ngram_range')
+        )
+
+    def get_batch_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {scanner_type: batcher.get_stats() for scanner_type, batcher in self._batchers.items()}
+
+    def _inference_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=settings.AI_INFERENCE_THREADS,
+                                                        thread_name_prefix='ai-inference')
+        return self._executor
+
+    async def _predict(self, scanner_type: str, features: Any) -> np.ndarray:
+        """Scores of one sample, batched with concurrent requests for the same model"""
+        batcher = self._batchers.get(scanner_type)
+        if batcher is None:
+            # The model is loaded by the first batch, in the executor rather than on the event loop
+            batcher = MicroBatcher(lambda batch: self._predict_batch(scanner_type, batch),
+                                   executor=self._inference_executor())
+            self._batchers[scanner_type] = batcher
+        return await batcher.predict(features)
+
+    def _cache_version(self, scanner_type: str, active: bool = False) -> Optional[str]:
+        """Model version cached scores are tagged with, None when they cannot be cached.
+
+        Keras runtimes are not stored versions, and are trained in place, so
+        their scores are never cached. With active=True it is the version
+        active in the store, which lookups must match even before this
+        process, or the inference pool, has switched to it.
+        """
+        if settings.AI_RUNTIME == 'keras':
+            return None
+        version = self.runtime_versions.get(scanner_type)
+        if active:
+            version = self._active_version(scanner_type) or version
+        if version and settings.AI_RUNTIME == 'tflite':
+            # A quantized variant scores differently from the float model of the same version
+            return f"{version}:{settings.AI_QUANTIZATION}"
+        return version
+
+    async def _predict_text(self, scanner_type: str, extract: Callable[[], str]) -> np.ndarray:
+        """Scores of the text extract() builds, from the prediction cache when it was seen before.
+
+        Building, hashing and featurizing the text run in the inference
+        executor: for a large input each takes long enough to stall the loop.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._inference_executor()
+        text, digest = await loop.run_in_executor(executor, self._hashed_text, extract)
+        version = self._cache_version(scanner_type, active=True)
+        cached = await self.prediction_cache.lookup_async(scanner_type, digest, version) if version else None
+        if cached is not None and cached.scores is not None:
+            return cached.scores
+
+        if cached is not None:
+            features = cached.features
+        else:
+            features = await loop.run_in_executor(executor, self._vectorize_text, scanner_type, text)
+        predictions = await self._predict(scanner_type, features)
+        # The runtime may have been loaded, or switched to another version, by this prediction
+        current = self._cache_version(scanner_type)
+        if current and version in (None, current):
+            self.prediction_cache.store(scanner_type, digest, features, current, predictions)
+        return predictions
+
+    @staticmethod
+    def _hashed_text(extract: Callable[[], str]) -> Tuple[str, bytes]:
+        text = extract()
+        return text, content_hash(text)
+
+    def _score_windows(self, scanner_type: str, texts: List[str]) -> np.ndarray:
+        """Scores of many texts: cached ones are reused, the rest featurized and predicted as one batch"""
+        version = self._cache_version(scanner_type, active=True)
+        digests = [content_hash(text) for text in texts]
+        scores: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        # Identical windows, within this text or seen before, are scored once
+        missing: Dict[bytes, List[int]] = {}
+        cached_features: Dict[bytes, Any] = {}
+        for index, digest in enumerate(digests):
+            if digest in missing:
+                missing[digest].append(index)
+                continue
+            cached = self.prediction_cache.lookup(scanner_type, digest, version) if version else None
+            if cached is not None and cached.scores is not None:
+                scores[index] = cached.scores
+                continue
+            if cached is not None:
+                cached_features[digest] = cached.features
+            missing[digest] = [index]
+
+        if missing:
+            to_featurize = [digest for digest in missing if digest not in cached_features]
+            rows = dict(cached_features)
+            if to_featurize:
+                # After a version switch every window may be a feature hit, and nothing is left to featurize
+                featurized = self.featurizer.transform(texts[missing[digest][0]] for digest in to_featurize)
+                rows.update(zip(to_featurize, featurized))
+            features = sparse.vstack([rows[digest] for digest in missing], format='csr')
+            predictions = self._predict_batch(scanner_type, features)
+            # As for single texts, only scores of the version looked up with, or the first known one, are cached
+            current = self._cache_version(scanner_type)
+            for (digest, indexes), row, row_features in zip(missing.items(), predictions, features):
+                row = np.asarray(row)
+                if current and version in (None, current):
+                    self.prediction_cache.store(scanner_type, digest, row_features, current, row)
+                for index in indexes:
+                    scores[index] = row
+        return np.stack(scores)
+
+    async def _analyze_windows(self, scanner_type: str, text: str, threshold: float,
+                               normalize: Callable[[str], str] = lambda window: window) -> List[Dict]:
+        """Findings with line ranges from scoring a text window by window"""
+        windows, scores = await asyncio.get_running_loop().run_in_executor(
+            self._inference_executor(), self._score_text_windows, scanner_type, text, normalize
+        )
+        findings = []
+        for window, predictions in zip(windows, scores):
+            for finding in self._process_predictions(scanner_type, predictions, threshold):
+                finding.update(start_line=window.start_line, end_line=window.end_line)
+                findings.append(finding)
+        return merge_window_findings(findings)
+
+    def _score_text_windows(self, scanner_type: str, text: str,
+                            normalize: Callable[[str], str]) -> Tuple[List[Any], List[np.ndarray]]:
+        """Runs in the inference executor: the windows of a text and their scores"""
+        windows = list(iter_windows(text))
+        if not windows:
+            return [], []
+        return windows, list(self._score_windows(scanner_type, [normalize(window.text) for window in windows]))
+
+    def _load_or_create_model(self, scanner_type: str) -> 'tf.keras.Model':
+        import tensorflow as tf
+
+        vulnerabilities = self.vulnerability_types[scanner_type]
+        model = tf.keras.Sequential([
+            tf.keras.layers.Input(shape=(1000,)),
+            tf.keras.layers.Dense(512, activation='relu'),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.Dropout(0.3),
+            tf.keras.layers.Dense(256, activation='relu'),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.Dropout(0.3),
+            tf.keras.layers.Dense(128, activation='relu'),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.Dense(len(vulnerabilities), activation='sigmoid')
+        ])
+
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+            loss='binary_crossentropy',
+            metrics=['accuracy', tf.keras.metrics.AUC()]
+        )
+
+        # Carry on from the active version rather than from random weights
+        stored = self.store.load(scanner_type)
+        weights = self.store.training_weights(scanner_type, stored.version) \
+            if stored is not None and self._compatible(scanner_type, stored) else None
+        if weights is not None:
+            try:
+                model.set_weights(weights)
+            except ValueError:
+                logger.info("Not loading %s model version %s: its weights do not fit this model",
+                            scanner_type, stored.version)
+        return model
 
     async def analyze_web_vulnerabilities(self, url: str, found_vulnerabilities: List[Dict]) -> List[Dict]:
         """Analyze web-specific vulnerabilities using AI"""
-        features = self._extract_web_features(url, found_vulnerabilities)
-        predictions = self.models['web'].predict(features)
-        return self._process_predictions('web', predictions[0], 0.5)
+        predictions = await self._predict_text('web', lambda: self._extract_web_text(url, found_vulnerabilities))
+        return self._process_predictions('web', predictions, 0.5)
 
     async def analyze_api_vulnerabilities(self, endpoint: str, response_data: Dict) -> List[Dict]:
         """Analyze API-specific vulnerabilities using AI"""
-        features = self._extract_api_features(endpoint, response_data)
-        predictions = self.models['api'].predict(features)
-        return self._process_predictions('api', predictions[0], 0.6)
+        predictions = await self._predict_text('api', lambda: self._extract_api_text(endpoint, response_data))
+        return self._process_predictions('api', predictions, 0.6)
 
     async def analyze_mobile_vulnerabilities(self, app_binary: bytes, metadata: Dict) -> List[Dict]:
         """Analyze mobile app vulnerabilities using AI"""
-        features = self._extract_mobile_features(app_binary, metadata)
-        predictions = self.models['mobile'].predict(features)
-        return self._process_predictions('mobile', predictions[0], 0.7)
-
-    async def analyze_source_code_vulnerabilities(self, code: str, language: str) -> List[Dict]:
-        """Analyze source code vulnerabilities using AI"""
-        features = self._extract_source_code_features(code, language)
-        predictions = self.models['source_code'].predict(features)
-        return self._process_predictions('source_code', predictions[0], 0.6)
-
-    async def analyze_blockchain_vulnerabilities(self, contract_code: str, bytecode: str) -> List[Dict]:
-        """Analyze blockchain/smart contract vulnerabilities using AI"""
-        features = self._extract_blockchain_features(contract_code, bytecode)
-        predictions = self.models['blockchain'].predict(features)
-        return self._process_predictions('blockchain', predictions[0], 0.7)
-
-    def _extract_web_features(self, url: str, found_vulnerabilities: List[Dict]) -> np.ndarray:
-        """Extract features from web content and found vulnerabilities"""
+        predictions = await self._predict_text('mobile', lambda: self._extract_mobile_text(app_binary, metadata))
+        return self._process_predictions('mobile', predictions, 0.7)
+
+    async def analyze_source_code_vulnerabilities(self, code: str, language: str,
+                                                  windowed: bool = False) -> List[Dict]:
+        """Analyze source code vulnerabilities using AI.
+
+        With windowed=True the code is scored in overlapping line windows
+        instead of as a whole, and findings carry start_line and end_line.
+        """
+        if windowed:
+            return await self._analyze_windows(
+                'source_code', code, 0.6, lambda window: f"{language} {self._normalize_source_code(window)}"
+            )
+        predictions = await self._predict_text('source_code', lambda: self._extract_source_code_text(code, language))
+        return self._process_predictions('source_code', predictions, 0.6)
+
+    async def analyze_blockchain_vulnerabilities(self, contract_code: str, bytecode: str,
+                                                 windowed: bool = False) -> List[Dict]:
+        """Analyze blockchain/smart contract vulnerabilities using AI.
+
+        With windowed=True the contract source is scored in overlapping line
+        windows whose findings carry start_line and end_line; bytecode has no
+        lines and is still scored as a whole.
+        """
+        if windowed:
+            findings = await self._analyze_windows('blockchain', contract_code, 0.7)
+            if bytecode:
+                predictions = await self._predict_text('blockchain', lambda: bytecode)
+                findings.extend(self._process_predictions('blockchain', predictions, 0.7))
+            return findings
+        predictions = await self._predict_text(
+            'blockchain', lambda: self._extract_blockchain_text(contract_code, bytecode))
+        return self._process_predictions('blockchain', predictions, 0.7)
+
+    def _extract_web_text(self, url: str, found_vulnerabilities: List[Dict]) -> str:
+        """Text analyzed for web content and found vulnerabilities"""
         text_content = ' '.join([
             str(vuln.get('description', '')) + ' ' +
             str(vuln.get('type', '')) + ' ' +
             str(vuln.get('payload', ''))
             for vuln in found_vulnerabilities
         ])
-        return self._vectorize_text('web', text_content)
+        return text_content
 
-    def _extract_api_features(self, endpoint: str, response_data: Dict) -> np.ndarray:
-        """Extract features from API endpoint and response"""
+    def _extract_api_text(self, endpoint: str, response_data: Dict) -> str:
+        """Text analyzed for an API endpoint and response"""
         text_content = f"{endpoint} {json.dumps(response_data)}"
-        return self._vectorize_text('api', text_content)
+        return text_content
 
-    def _extract_mobile_features(self, app_binary: bytes, metadata: Dict) -> np.ndarray:
-        """Extract features from mobile app binary and metadata"""
+    def _extract_mobile_text(self, app_binary: bytes, metadata: Dict) -> str:
+        """Text analyzed for a mobile app binary and metadata"""
         text_content = f"{str(metadata)} {app_binary[:1000].hex()}"
-        return self._vectorize_text('mobile', text_content)
+        return text_content
 
-    def _extract_source_code_features(self, code: str, language: str) -> np.ndarray:
-        """Extract features from source code"""
-        # Remove comments and normalize whitespace
+    def _extract_source_code_text(self, code: str, language: str) -> str:
+        """Text analyzed for source code"""
+        text_content = f"{language} {self._normalize_source_code(code)}"
+        return text_content
+
+    @staticmethod
+    def _normalize_source_code(code: str) -> str:
+        """Remove comments and normalize whitespace"""
         code = re.sub(r'/\*[\s\S]*?\*/|//.*', '', code)
-        code = re.sub(r'\s+', ' ', code)
-        text_content = f"{language} {code}"
-        return self._vectorize_text('source_code', text_content)
+        return re.sub(r'\s+', ' ', code)
 
-    def _extract_blockchain_features(self, contract_code: str, bytecode: str) -> np.ndarray:
-        """Extract features from smart contract code and bytecode"""
+    def _extract_blockchain_text(self, contract_code: str, bytecode: str) -> str:
+        """Text analyzed for smart contract code and bytecode"""
         text_content = f"{contract_code} {bytecode}"
-        return self._vectorize_text('blockchain', text_content)
-
-    def _vectorize_text(self, scanner_type: str, text: str) -> np.ndarray:
-        """Convert text to feature vector using appropriate vectorizer"""
-        # Fit vectorizer if not already fitted
-        if not hasattr(self.vectorizers[scanner_type], 'vocabulary_'):
-            self.vectorizers[scanner_type].fit([text])
+        return text_content
 
-        features = self.vectorizers[scanner_type].transform([text]).toarray()
-        return features
+    def _vectorize_text(self, scanner_type: str, text: str) -> Any:
+        """Convert text to a sparse 1 x 1000 feature row"""
+        return self.featurizer.transform_one(text)
 
     def _process_predictions(self, scanner_type: str, predictions: np.ndarray, threshold: float) -> List[Dict]:
         """Process model predictions into vulnerability findings"""
@@ -185,43 +524,56 @@ class VulnerabilityDetector:
         # For now, return basic recommendations
         return [f"Review and fix {vuln_type} vulnerability according to security best practices"]
 
-    async def train_model(self, scanner_type: str, training_data: List[Dict[str, Any]]) -> None:
-        """Train the model for a specific scanner type"""
-        if scanner_type not in self.models:
+    async def train_model(self, scanner_type: str, training_data: Iterable[Dict[str, Any]],
+                          epochs: int = 10) -> Dict[str, Any]:
+        """Train the model for a specific scanner type.
+
+        training_data is any re-iterable source of {"text", "labels"} samples,
+        such as a list or a ShardSource over JSONL/SQLite shards; it is
+        streamed through a TrainingPipeline in a worker thread, so neither
+        the samples nor the event loop are held up. Returns the training
+        statistics.
+        """
+        if scanner_type not in self.vulnerability_types:
             raise ValueError(f"Invalid scanner type: {scanner_type}")
 
-        # Extract features and labels from training data
-        X = []
-        y = []
-        for item in training_data:
-            text = item.get('text', '')
-            labels = item.get('labels', [])
-
-            features = self._vectorize_text(scanner_type, text)
-            X.append(features[0])
-
-            # Convert labels to multi-hot encoding
-            label_vector = np.zeros(len(self.vulnerability_types[scanner_type]))
-            for label in labels:
-                if label in self.vulnerability_types[scanner_type]:
-                    idx = self.vulnerability_types[scanner_type].index(label)
-                    label_vector[idx] = 1
-            y.append(label_vector)
-
-        X = np.array(X)
-        y = np.array(y)
-
-        # Train the model
-        self.models[scanner_type].fit(
-            X, y,
-            epochs=10,
-            batch_size=32,
-            validation_split=0.2,
-            callbacks=[
-                tf.keras.callbacks.EarlyStopping(
-                    monitor='val_loss',
-                    patience=3,
-                    restore_best_weights=True
-                )
-            ]
+        pipeline = TrainingPipeline(
+            self.get_model(scanner_type),
+            self.vulnerability_types[scanner_type],
+            featurizer=self.featurizer,
+            checkpoint_dir=os.path.join(self.store.root, scanner_type, 'checkpoints')
         )
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, pipeline.run, training_data, epochs)
+
+        # Stored whatever the runtime, so a restarted process serves and trains on from it
+        model = self.get_model(scanner_type)
+        version = self.store.save(scanner_type, export_dense_model(model),
+                                  self.featurizer.get_config(), self.vulnerability_types[scanner_type],
+                                  {'source': 'train_model', 'samples': stats['samples'],
+                                   'validation_samples': stats['validation_samples'],
+                                   'epochs': stats['epochs'], 'samples_per_sec': stats['samples_per_sec']},
+                                  training_weights=model.get_weights())
+        if settings.AI_RUNTIME != 'keras':
+            if settings.AI_RUNTIME == 'tflite':
+                # Quantized from the new version and compared with it on the validation holdout
+                stats['quantization'] = await loop.run_in_executor(
+                    None, lambda: self.export_quantized(scanner_type, version=version,
+                                                        holdout=pipeline.holdout_samples(training_data))
+                )
+            self._use_version(scanner_type, version)
+        return stats
+
+
+_shared_detector: Optional[VulnerabilityDetector] = None
+_shared_lock = threading.Lock()
+
+
+def get_vulnerability_detector() -> VulnerabilityDetector:
+    """The process-wide detector shared by all scanners"""
+    global _shared_detector
+    if _shared_detector is None:
+        with _shared_lock:
+            if _shared_detector is None:
+                _shared_detector = VulnerabilityDetector()
+    return _shared_detector
@@ -0,0 +1,50 @@
+"""Splitting large texts into overlapping line windows for scoring"""
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from app.core.config import settings
+
+
+class TextWindow(NamedTuple):
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    text: str
+
+
+def iter_windows(text: str, window_lines: Optional[int] = None,
+                 overlap: Optional[int] = None) -> Iterator[TextWindow]:
+    """Overlapping windows of window_lines lines, each starting window_lines - overlap after the last.
+
+    The text is split into lines once; every window only joins its own
+    slice, so the cost is linear in the size of the text.
+    """
+    window_lines = window_lines or settings.AI_WINDOW_LINES
+    overlap = settings.AI_WINDOW_OVERLAP if overlap is None else overlap
+    if not 0 <= overlap < window_lines:
+        raise ValueError("Window overlap must be smaller than the window")
+    lines = text.splitlines()
+    if not lines:
+        return
+    step = window_lines - overlap
+    for start in range(0, max(len(lines) - overlap, 1), step):
+        chunk = lines[start:start + window_lines]
+        yield TextWindow(start + 1, start + len(chunk), '\n'.join(chunk))
+
+
+def merge_window_findings(findings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge findings of one type from overlapping or adjacent windows into one line range.
+
+    The merged finding keeps the highest confidence of its windows.
+    """
+    merged: List[Dict[str, Any]] = []
+    open_by_type: Dict[str, Dict[str, Any]] = {}
+    for finding in sorted(findings, key=lambda f: (f['start_line'], f['end_line'])):
+        current = open_by_type.get(finding['type'])
+        if current is not None and finding['start_line'] <= current['end_line'] + 1:
+            current['end_line'] = max(current['end_line'], finding['end_line'])
+            if finding['confidence'] > current['confidence']:
+                current.update(confidence=finding['confidence'], severity=finding['severity'])
+            continue
+        current = dict(finding)
+        open_by_type[finding['type']] = current
+        merged.append(current)
+    return merged
@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -17,6 +18,106 @@ class Settings(BaseSettings):
     MAX_SCAN_DEPTH: int = 3
     SCAN_TIMEOUT: int = 300
 
+    # Web crawler settings
+    WEB_CRAWL_CONCURRENCY: int = 10
+    WEB_MAX_PAGES: int = 10000
+    WEB_FRONTIER_MAX_SIZE: int = 100000
+    WEB_SEEN_CAPACITY: int = 1000000
+    WEB_SEEN_ERROR_RATE: float = 0.001
+    WEB_ANALYSIS_QUEUE_SIZE: int = 100
+    WEB_ANALYSIS_WORKERS: int = 4
+    WEB_ANALYSIS_EXECUTOR: str = "thread"  # "thread" or "process"
+    WEB_ANALYSIS_BODY_BYTES: int = 256 * 1024
+    WEB_HTML_MAX_BYTES: int = 20 * 1024 * 1024  # HTML parsed for links beyond this is ignored
+    WEB_SITEMAP_MAX_DOCUMENTS: int = 1000
+    WEB_SITEMAP_MAX_BYTES: int = 50 * 1024 * 1024  # per sitemap, after decompression
+    WEB_SITEMAP_SEED_RATE: float = 1000.0  # URLs pushed onto the frontier per second
+    WEB_CHECKPOINT_PATH: str = "/tmp/vapt_web_checkpoints.db"
+    WEB_CHECKPOINT_INTERVAL: int = 60  # seconds, 0 disables checkpointing
+    WEB_SCAN_CACHE_SIZE: int = 200  # completed scans kept in memory
+    WEB_SCAN_CACHE_TTL: int = 900  # seconds a completed scan stays in memory after its last access
+
+    # Response body inspection
+    MAX_RESPONSE_BODY_BYTES: int = 1024 * 1024  # 1 MB
+    RESPONSE_CHUNK_SIZE: int = 64 * 1024
+    MAX_EVIDENCE_SAMPLES: int = 3
+
+    # HTTP revalidation cache shared by the scanners
+    HTTP_CACHE_ENABLED: bool = True
+    HTTP_CACHE_PATH: str = "/tmp/vapt_http_cache.db"
+    HTTP_CACHE_MAX_ENTRIES: int = 200000
+
+    # TLS posture probe
+    TLS_PROBE_CONCURRENCY: int = 50  # handshakes in flight across all probed hosts
+    TLS_PROBE_TIMEOUT: float = 10.0
+    TLS_CACHE_TTL: int = 3600  # seconds a host's probe result is reused
+    TLS_CACHE_SIZE: int = 10000  # probe results kept process-wide, least recently used dropped first
+    TLS_EXPIRY_WARNING_DAYS: int = 30
+
+    # DNS resolution and subdomain discovery
+    DNS_NAMESERVER: str = ""  # first nameserver in /etc/resolv.conf when empty
+    DNS_TIMEOUT: float = 2.0
+    DNS_RETRIES: int = 2
+    DNS_QUERY_RATE: float = 200.0  # queries per second per resolver
+    DNS_CONCURRENCY: int = 100
+    DNS_MAX_TTL: int = 3600
+    DNS_NEGATIVE_TTL: int = 300
+    DNS_CACHE_SIZE: int = 50000  # answers kept process-wide, least recently used dropped first
+    SUBDOMAIN_WORDLIST_PATH: str = ""  # one label per line; a built-in list when empty
+
+    # API scanner settings
+    API_SCAN_CONCURRENCY: int = 20
+    MAX_SPEC_BYTES: int = 200 * 1024 * 1024  # 200 MB
+    SPEC_CACHE_DIR: str = "/tmp/vapt_spec_cache"
+    FUZZ_BATCH_SIZE: int = 50
+    FUZZ_SIMHASH_THRESHOLD: int = 8
+    PAYLOAD_CORPUS_DIR: str = ""  # <class>.txt files extending the built-in corpora
+    PAYLOAD_ENCODINGS: list = []  # evasion variants, e.g. ["url"]; requests are encoded by aiohttp regardless
+    PAYLOAD_MAX_PER_CLASS: int = 40  # 0 for the full expanded corpus
+    GRAPHQL_BATCH_SIZE: int = 50
+    GRAPHQL_SCHEMA_TTL: int = 3600
+    GRAPHQL_CACHE_SIZE: int = 256  # endpoints, and distinct schemas, whose introspection is kept
+    GRAPHQL_MAX_DEPTH_PROBE: int = 10
+    GRAPHQL_ALIAS_PROBE_COUNT: int = 100
+
+    # AI inference
+    AI_BATCH_MAX_SIZE: int = 32
+    AI_BATCH_MAX_WAIT: float = 0.005  # seconds a request waits for others to share its batch
+    AI_INFERENCE_THREADS: int = 2
+    AI_INFERENCE_POOL_WORKERS: int = 0  # pre-forked processes sharing one copy of the models; 0 infers in-process
+    AI_INFERENCE_POOL_SOCKET: str = "/tmp/vapt_inference.sock"
+    AI_INFERENCE_POOL_TIMEOUT: float = 30.0  # seconds to wait for the pool to answer a batch
+    AI_INFERENCE_POOL_MAX_MESSAGE: int = 256 * 1024 * 1024  # bytes of arrays accepted in one pool message
+    AI_RUNTIME: str = "numpy"  # "numpy" (exported weights), "tflite" (quantized export) or "keras"
+    AI_QUANTIZATION: str = "int8"  # precision served by the tflite runtime; only "int8", float16 is export-only
+    AI_MODEL_DIR: str = "/tmp/vapt_models"
+    AI_MODEL_CHECK_INTERVAL: float = 5.0  # seconds between checks for a newly activated model version
+    AI_FEATURIZER_MAX_CHARS: int = 1024 * 1024  # text beyond this is not featurized
+    AI_WINDOW_LINES: int = 50  # lines per window when scoring source files window by window
+    AI_WINDOW_OVERLAP: int = 10
+    AI_PREDICTION_CACHE_SIZE: int = 50000  # analyzed texts whose features and scores are kept in memory
+    AI_PREDICTION_CACHE_PATH: str = ""  # SQLite file backing the memory cache; no disk tier when empty
+    AI_PREDICTION_CACHE_DISK_ENTRIES: int = 1000000
+
+    # AI training
+    AI_TRAINING_BATCH_SIZE: int = 256
+    AI_TRAINING_WORKERS: int = 4
+    AI_TRAINING_EXECUTOR: str = "thread"  # "thread" or "process"
+    AI_TRAINING_PREFETCH: int = 4  # featurized batches kept ready ahead of the model
+    AI_TRAINING_HOLDOUT: float = 0.2  # share of samples held out for validation
+    AI_TRAINING_CHECKPOINT_EVERY: int = 200  # batches between checkpoints
+
+    @field_validator('AI_QUANTIZATION')
+    @classmethod
+    def _served_precision(cls, value: str) -> str:
+        if value != 'int8':
+            raise ValueError(
+                f"AI_QUANTIZATION {value!r} cannot be served: only 'int8' is faster than the numpy runtime. "
+                "float16 models are expanded to float32 when loaded, so they take more memory and time; "
+                "export them with VulnerabilityDetector.export_quantized(precision='float16') instead"
+            )
+        return value
+
     class Config:
         case_sensitive = True
 
@@ -1,4 +1,6 @@
 from .database import Database
+from .crawl_checkpoint import CrawlCheckpointStore
+from .scan_state import ScanStateStore
 from .vulnerability_db import VulnerabilityDatabase
 
-__all__ = ['Database', 'VulnerabilityDatabase']
+__all__ = ['Database', 'CrawlCheckpointStore', 'ScanStateStore', 'VulnerabilityDatabase']
@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional
+import json
+
+from app.core.config import settings
+from app.core.databases.database import Database
+
+
+class CrawlCheckpointStore(Database):
+    """SQLite checkpoints of running web scans.
+
+    One row per scan holds its record, counters and seen-set bits; the
+    frontier is rewritten on every checkpoint and findings are appended, so
+    a checkpoint only writes what changed since the previous one. The store
+    is not thread-safe: use it from a single thread.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """Initialize the checkpoint store.
+
+        Args:
+            db_path: Path to the SQLite file, WEB_CHECKPOINT_PATH by default
+        """
+        super().__init__(db_path or settings.WEB_CHECKPOINT_PATH)
+
+    def connect(self) -> None:
+        """Open the database and create the checkpoint tables."""
+        super().connect()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.create_table('crawl_scans', {
+            'scan_id': 'TEXT PRIMARY KEY',
+            'record': 'TEXT NOT NULL',
+            'crawl_state': 'TEXT NOT NULL',
+            'seen_bits': 'BLOB',
+            'updated_at': 'REAL NOT NULL'
+        })
+        self.create_table('crawl_frontier', {
+            'scan_id': 'TEXT NOT NULL',
+            'priority': 'REAL NOT NULL',
+            'url': 'TEXT NOT NULL',
+            'depth': 'INTEGER NOT NULL'
+        })
+        self.create_table('crawl_findings', {
+            'scan_id': 'TEXT NOT NULL',
+            'seq': 'INTEGER NOT NULL',
+            'finding': 'TEXT NOT NULL'
+        })
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_crawl_frontier_scan ON crawl_frontier (scan_id)")
+        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS ix_crawl_findings_seq ON crawl_findings (scan_id, seq)")
+        self.commit()
+
+    def save(self, record: Dict[str, Any], state: Dict[str, Any], findings_from: int) -> None:
+        """Write a checkpoint of one scan.
+
+        Args:
+            record: The scan record as returned by get_scan_status
+            state: Crawler state from WebCrawler.export_state
+            findings_from: Number of findings already written by earlier checkpoints
+        """
+        if not self.connection:
+            self.connect()
+        scan_id = record['id']
+        summary = {key: value for key, value in record.items() if key != 'findings'}
+        crawl_state = {key: value for key, value in state.items() if key not in ('frontier', 'seen_bits')}
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO crawl_scans (scan_id, record, crawl_state, seen_bits, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (scan_id, json.dumps(summary), json.dumps(crawl_state), state['seen_bits'], state['saved_at'])
+            )
+            self.connection.execute("DELETE FROM crawl_frontier WHERE scan_id = ?", (scan_id,))
+            self.connection.executemany(
+                "INSERT INTO crawl_frontier (scan_id, priority, url, depth) VALUES (?, ?, ?, ?)",
+                ((scan_id, priority, url, depth) for priority, url, depth in state['frontier'])
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO crawl_findings (scan_id, seq, finding) VALUES (?, ?, ?)",
+                ((scan_id, seq, json.dumps(finding))
+                 for seq, finding in enumerate(record['findings'][findings_from:], start=findings_from))
+            )
+
+    def load(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        """Load the last checkpoint of a scan.
+
+        Args:
+            scan_id: ID of the scan
+
+        Returns:
+            Dictionary with 'record' (findings included) and 'state', or None
+        """
+        if not self.connection:
+            self.connect()
+        rows = self.execute_query(
+            "SELECT record, crawl_state, seen_bits FROM crawl_scans WHERE scan_id = ?", (scan_id,)
+        )
+        if not rows:
+            return None
+        record_json, state_json, seen_bits = rows[0]
+
+        record = json.loads(record_json)
+        record['findings'] = [
+            json.loads(finding) for finding, in self.execute_query(
+                "SELECT finding FROM crawl_findings WHERE scan_id = ? ORDER BY seq", (scan_id,)
+            )
+        ]
+        state = json.loads(state_json)
+        state['seen_bits'] = seen_bits
+        state['frontier'] = self.execute_query(
+            "SELECT priority, url, depth FROM crawl_frontier WHERE scan_id = ?", (scan_id,)
+        )
+        return {'record': record, 'state': state}
+
+    def list_scans(self) -> List[str]:
+        """Return the IDs of all checkpointed scans."""
+        if not self.connection:
+            self.connect()
+        return [scan_id for scan_id, in self.execute_query("SELECT scan_id FROM crawl_scans ORDER BY updated_at")]
+
+    def delete(self, scan_id: str) -> None:
+        """Remove every checkpoint row of a scan.
+
+        Args:
+            scan_id: ID of the scan
+        """
+        if not self.connection:
+            self.connect()
+        with self.connection:
+            for table in ('crawl_scans', 'crawl_frontier', 'crawl_findings'):
+                self.connection.execute(f"DELETE FROM {table} WHERE scan_id = ?", (scan_id,))
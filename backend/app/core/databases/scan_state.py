@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import json
+import time
+
+from app.core.config import settings
+from app.models.scan import Scan
+
+
+class ScanStateStore:
+    """Scan records held in memory while they are hot, in the database afterwards.
+
+    Running scans are pinned in memory. Once a scan completes it is written
+    to the scans table and stays in the hot tier until it has been idle for
+    the TTL or is pushed out by the LRU limit; get() reloads evicted scans
+    from the database transparently. A completed scan that could not be
+    written is kept and retried rather than lost.
+    """
+
+    def __init__(self, scan_type: str, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 session_factory: Optional[Callable] = None):
+        """Initialize the store.
+
+        Args:
+            scan_type: Value of Scan.scan_type for records spilled by this store
+            max_entries: Completed scans kept in memory, WEB_SCAN_CACHE_SIZE by default
+            ttl: Seconds a completed scan stays in memory after its last access
+            session_factory: SQLAlchemy session factory, the application's by default
+        """
+        self.scan_type = scan_type
+        self.max_entries = max_entries or settings.WEB_SCAN_CACHE_SIZE
+        self.ttl = settings.WEB_SCAN_CACHE_TTL if ttl is None else ttl
+        self._session_factory = session_factory
+        self._records: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # scan_id -> (last access, approximate size) for completed scans only
+        self._completed: Dict[str, list] = {}
+        self._unspilled: set = set()
+        self.stats = {'hits': 0, 'misses': 0, 'db_loads': 0, 'spills': 0, 'spill_errors': 0,
+                      'lru_evictions': 0, 'ttl_evictions': 0, 'dropped': 0}
+
+    def __contains__(self, scan_id: str) -> bool:
+        return scan_id in self._records
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Hold a running scan in memory until complete() is called"""
+        self._records[record['id']] = record
+
+    def peek(self, scan_id: str) -> Dict[str, Any]:
+        """The in-memory record, without touching statistics or LRU order"""
+        return self._records[scan_id]
+
+    async def get(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        """Return a scan record from memory or, failing that, from the database"""
+        self._evict_expired()
+        record = self._records.get(scan_id)
+        if record is not None:
+            self.stats['hits'] += 1
+            self._records.move_to_end(scan_id)
+            if scan_id in self._completed:
+                self._completed[scan_id][0] = time.monotonic()
+            return record
+
+        self.stats['misses'] += 1
+        record = await asyncio.get_running_loop().run_in_executor(None, self._load, scan_id)
+        if record is not None:
+            self.stats['db_loads'] += 1
+            self._remember_completed(record)
+            self._evict_expired()
+        return record
+
+    async def complete(self, scan_id: str) -> None:
+        """Write a finished scan to the database and make it evictable"""
+        record = self._records[scan_id]
+        self._remember_completed(record)
+        await self._spill(record)
+        for earlier in list(self._unspilled - {scan_id})[:5]:
+            await self._spill(self._records[earlier])
+        self._evict_expired()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+            'entries': len(self._records),
+            'running': len(self._records) - len(self._completed),
+            'completed': len(self._completed),
+            'unspilled': len(self._unspilled),
+            'completed_bytes': sum(size for _, size in self._completed.values()),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+        }
+
+    def _remember_completed(self, record: Dict[str, Any]) -> None:
+        scan_id = record['id']
+        self._records[scan_id] = record
+        self._records.move_to_end(scan_id)
+        self._completed[scan_id] = [time.monotonic(), len(json.dumps(record, default=str))]
+
+    async def _spill(self, record: Dict[str, Any]) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._save, record)
+        except Exception:
+            self.stats['spill_errors'] += 1
+            self._unspilled.add(record['id'])
+        else:
+            self.stats['spills'] += 1
+            self._unspilled.discard(record['id'])
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for scan_id, (last_access, _) in list(self._completed.items()):
+            if now - last_access >= self.ttl and scan_id not in self._unspilled:
+                self._evict(scan_id)
+                self.stats['ttl_evictions'] += 1
+
+        # Oldest first; running scans are never evicted
+        for scan_id in list(self._records):
+            if len(self._completed) <= self.max_entries:
+                break
+            if scan_id not in self._completed:
+                continue
+            if scan_id in self._unspilled:
+                if len(self._unspilled) <= self.max_entries:
+                    continue
+                # The database has been failing for too long to keep holding on
+                self._unspilled.discard(scan_id)
+                self.stats['dropped'] += 1
+            else:
+                self.stats['lru_evictions'] += 1
+            self._evict(scan_id)
+
+    def _evict(self, scan_id: str) -> None:
+        del self._records[scan_id]
+        del self._completed[scan_id]
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db.session import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _save(self, record: Dict[str, Any]) -> None:
+        result = json.loads(json.dumps(record, default=str))
+        session = self._session()
+        try:
+            row = session.query(Scan).filter(Scan.scan_uid == record['id']).one_or_none()
+            if row is None:
+                row = Scan(scan_uid=record['id'], scan_type=self.scan_type)
+                session.add(row)
+            row.target = record.get('target_url', '')
+            row.status = record.get('status', 'completed')
+            row.start_time = _parse_time(record.get('start_time'))
+            row.end_time = _parse_time(record.get('end_time'))
+            row.result = result
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _load(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            session = self._session()
+        except Exception:
+            return None
+        try:
+            row = session.query(Scan).filter(
+                Scan.scan_uid == scan_id, Scan.scan_type == self.scan_type
+            ).one_or_none()
+            return dict(row.result) if row is not None and row.result else None
+        except Exception:
+            return None
+        finally:
+            session.close()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
@@ -1,16 +1,73 @@
 import aiohttp
 import json
 import asyncio
+import hashlib
+import os
+import resource
+import time
+from contextlib import contextmanager
 from typing import Dict, Any, List, Optional
 import re
 from urllib.parse import urljoin, urlparse
 from app.core.databases.vulnerability_db import VulnerabilityDatabase
-from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
+from app.core.config import settings
+from app.core.scanners.graphql_engine import GraphQLEngine
+from app.core.scanners.injection_fuzzer import InjectionFuzzer
+from app.core.scanners.openapi_ingest import OpenAPISpecLoader
+from app.core.utils.body_inspector import StreamingPatternMatcher, MatchAggregator, read_body_limited, scan_response
+from app.core.utils.http_cache import get_http_cache
+from app.core.utils.payload_generator import PayloadGenerator
+from app.core.utils.tls_probe import TLSProbe, tls_findings
+
+# Injection classes the fuzzer has back-end error signatures for
+INJECTION_CLASSES = ('sql', 'nosql', 'command', 'xml')
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        # Not Linux: only the process-lifetime peak is available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ScanPhases:
+    """Wall time, request count and RSS growth of each phase of one scan.
+
+    One instance per scan() call, so concurrent scans on a shared scanner
+    keep separate accounts.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._current: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Record one scan phase"""
+        self._current = name
+        metrics = self.metrics.setdefault(name, {'requests': 0, 'wall_time': 0.0, 'rss_delta_mb': 0.0})
+        start, rss = time.perf_counter(), _rss_mb()
+        try:
+            yield
+        finally:
+            metrics['wall_time'] += time.perf_counter() - start
+            # Process-wide, so concurrent scans add to each other's figures
+            metrics['rss_delta_mb'] += _rss_mb() - rss
+            self._current = None
+
+    async def on_request_start(self, session, trace_config_ctx, params) -> None:
+        if self._current:
+            self.metrics[self._current]['requests'] += 1
+
 
 class APIScanner:
     def __init__(self):
         self.vuln_db = VulnerabilityDatabase()
-        self.ai_detector = VulnerabilityDetector()
+        self.ai_detector = get_vulnerability_detector()
         self.common_endpoints = [
             '/api', '/v1', '/v2', '/docs', '/swagger', '/health',
             '/auth', '/login', '/users', '/admin', '/graphql'
@@ -18,6 +75,23 @@ class APIScanner:
         self.common_methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS']
         self.auth_endpoints = ['/login', '/auth', '/token']
         self.sensitive_endpoints = ['/admin', '/users', '/config']
+        self.sensitive_patterns = {
+            'email': r'\b[\w\.-]+@[\w\.-]+\.\w+\b',
+            'ssn': r'\b\d{3}-\d{2}-\d{4}\b',
+            'credit_card': r'\b\d{16}\b',
+            'sensitive_keyword': r'password|secret|key|token|credential',
+            'jwt': r'bearer\s+[a-zA-Z0-9\-_]+\.[a-zA-Z0-9\-_]+\.[a-zA-Z0-9\-_]+',
+        }
+        self.sensitive_matcher = StreamingPatternMatcher(self.sensitive_patterns)
+        self.docs_endpoints = [
+            '/swagger', '/docs', '/openapi.json', '/swagger.json',
+            '/openapi.yaml', '/swagger.yaml', '/v3/api-docs'
+        ]
+        self.http_cache = get_http_cache()
+        self.spec_loader = OpenAPISpecLoader(http_cache=self.http_cache)
+        self.payload_generator = PayloadGenerator()
+        # Phase metrics of the most recently completed scan
+        self.phase_metrics: Dict[str, Dict[str, Any]] = {}
 
     async def scan(self, target_url: str, method: str = None, options: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -26,6 +100,7 @@ class APIScanner:
         vulnerabilities = []
         endpoint_results = {}
         discovered_endpoints = set()
+        api_probes = []
 
         # Normalize target URL
         if not target_url.startswith(('http://', 'https://')):
@@ -33,37 +108,76 @@ class APIScanner:
 
         base_url = target_url.rstrip('/')
 
-        async with aiohttp.ClientSession() as session:
-            # Discover API endpoints
-            await self._discover_endpoints(session, base_url, discovered_endpoints)
+        phases = ScanPhases()
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(phases.on_request_start)
+
+        async with aiohttp.ClientSession(trace_configs=[trace_config]) as session:
+            # Check the TLS setup of the API host
+            with phases.phase('transport'):
+                vulnerabilities.extend(await self._test_transport_security(base_url))
 
-            # Test discovered endpoints
-            for endpoint in discovered_endpoints:
-                vulnerabilities.extend(await self._test_endpoint_security(session, endpoint))
+            # Discover API endpoints
+            with phases.phase('discovery'):
+                await self._discover_endpoints(session, base_url, discovered_endpoints, api_probes)
+
+            # Test documented operations with their example parameters
+            with phases.phase('spec_operations'):
+                vulnerabilities.extend(await self._test_spec_operations(session, api_probes))
+
+            # GraphQL endpoints get schema-driven probes instead of REST method probes
+            with phases.phase('graphql'):
+                graphql_endpoints = {e for e in discovered_endpoints if urlparse(e).path.rstrip('/').endswith('graphql')}
+                graphql_engine = GraphQLEngine(session)
+                for endpoint in graphql_endpoints:
+                    vulnerabilities.extend(await graphql_engine.scan(endpoint))
+
+            # Test remaining discovered endpoints
+            with phases.phase('endpoint_security'):
+                documented = {probe['url'] for probe in api_probes}
+                for endpoint in discovered_endpoints - documented - graphql_endpoints:
+                    vulnerabilities.extend(await self._test_endpoint_security(session, endpoint))
 
             # Perform authentication tests
-            auth_vulns = await self._test_authentication(session, base_url)
-            vulnerabilities.extend(auth_vulns)
+            with phases.phase('authentication'):
+                auth_vulns = await self._test_authentication(session, base_url)
+                vulnerabilities.extend(auth_vulns)
 
             # Test rate limiting
-            rate_vulns = await self._test_rate_limiting(session, base_url)
-            vulnerabilities.extend(rate_vulns)
+            with phases.phase('rate_limiting'):
+                rate_vulns = await self._test_rate_limiting(session, base_url)
+                vulnerabilities.extend(rate_vulns)
 
             # Test for injection vulnerabilities
-            injection_vulns = await self._test_injection_vulnerabilities(session, base_url)
-            vulnerabilities.extend(injection_vulns)
+            with phases.phase('injection'):
+                injection_vulns = await self._test_injection_vulnerabilities(session, base_url, api_probes)
+                vulnerabilities.extend(injection_vulns)
 
             # Test for sensitive data exposure
-            exposure_vulns = await self._test_data_exposure(session, base_url)
-            vulnerabilities.extend(exposure_vulns)
+            with phases.phase('data_exposure'):
+                exposure_vulns = await self._test_data_exposure(session, base_url)
+                vulnerabilities.extend(exposure_vulns)
 
             # AI-enhanced vulnerability detection
-            ai_vulns = await self.ai_detector.analyze_api_vulnerabilities(base_url, endpoint_results)
-            vulnerabilities.extend(ai_vulns)
+            with phases.phase('ai_analysis'):
+                ai_vulns = await self.ai_detector.analyze_api_vulnerabilities(base_url, endpoint_results)
+                vulnerabilities.extend(ai_vulns)
 
+        if self.http_cache:
+            await asyncio.get_running_loop().run_in_executor(None, self.http_cache.flush)
+        self.phase_metrics = phases.metrics
         return self._generate_report(vulnerabilities, discovered_endpoints)
 
-    async def _discover_endpoints(self, session: aiohttp.ClientSession, base_url: str, discovered_endpoints: set) -> None:
+    async def _test_transport_security(self, base_url: str) -> List[Dict]:
+        """Probe protocol versions, cipher suites and certificate of an HTTPS API"""
+        parsed = urlparse(base_url)
+        if parsed.scheme != 'https':
+            return []
+        result = await TLSProbe().probe(parsed.hostname, parsed.port or 443)
+        return [{**finding, 'endpoint': base_url} for finding in tls_findings(result)]
+
+    async def _discover_endpoints(self, session: aiohttp.ClientSession, base_url: str,
+                                  discovered_endpoints: set, api_probes: List[Dict]) -> None:
         """Discover API endpoints through various methods"""
         # Check common endpoints
         for endpoint in self.common_endpoints:
@@ -83,24 +197,55 @@ class APIScanner:
             except Exception:
                 continue
 
-        # Check for API documentation
-        for docs_endpoint in ['/swagger', '/docs', '/openapi.json', '/swagger.json']:
+        # Check for API documentation and expand every documented operation
+        for docs_endpoint in self.docs_endpoints:
             try:
-                url = f"{base_url}{docs_endpoint}"
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        if 'swagger' in content.lower() or 'openapi' in content.lower():
-                            # Parse API documentation for endpoints
-                            try:
-                                api_spec = json.loads(content)
-                                if 'paths' in api_spec:
-                                    for path in api_spec['paths']:
-                                        discovered_endpoints.add(f"{base_url}{path}")
-                            except json.JSONDecodeError:
-                                pass
+                probes = await self.spec_loader.load_probes(session, f"{base_url}{docs_endpoint}", base_url)
             except Exception:
                 continue
+            if probes:
+                api_probes.extend(probes)
+                discovered_endpoints.update(probe['url'] for probe in probes)
+                break
+
+    async def _test_spec_operations(self, session: aiohttp.ClientSession, api_probes: List[Dict]) -> List[Dict]:
+        """Send every documented operation once with its example parameters"""
+        vulnerabilities = []
+        semaphore = asyncio.Semaphore(settings.API_SCAN_CONCURRENCY)
+
+        async def run_probe(probe: Dict) -> None:
+            async with semaphore:
+                try:
+                    async with session.request(
+                        probe['method'], probe['url'],
+                        params=probe['params'] or None,
+                        headers=probe['headers'] or None,
+                        json=probe['json'],
+                        data=probe['data']
+                    ) as response:
+                        if probe['requires_auth'] and 200 <= response.status < 300:
+                            vulnerabilities.append({
+                                'type': 'authentication_bypass',
+                                'severity': 'critical',
+                                'endpoint': probe['url'],
+                                'method': probe['method'],
+                                'description': 'Operation documented as authenticated is accessible without credentials'
+                            })
+                        elif response.status >= 500:
+                            content = await read_body_limited(response)
+                            if any(error in content.lower() for error in ['exception', 'stack trace', 'syntax error']):
+                                vulnerabilities.append({
+                                    'type': 'error_exposure',
+                                    'severity': 'high',
+                                    'endpoint': probe['url'],
+                                    'method': probe['method'],
+                                    'description': 'Detailed error information exposed'
+                                })
+                except Exception:
+                    pass
+
+        await asyncio.gather(*(run_probe(probe) for probe in api_probes))
+        return vulnerabilities
 
     async def _test_endpoint_security(self, session: aiohttp.ClientSession, endpoint: str) -> List[Dict]:
         """Test various security aspects of an endpoint"""
@@ -137,7 +282,7 @@ class APIScanner:
 
                     # Check for error exposure
                     if response.status >= 500:
-                        content = await response.text()
+                        content = await read_body_limited(response)
                         if any(error in content.lower() for error in ['exception', 'error', 'stack trace', 'syntax error']):
                             vulnerabilities.append({
                                 'type': 'error_exposure',
@@ -216,6 +361,9 @@ class APIScanner:
                 )
 
                 success_count = sum(1 for r in responses if not isinstance(r, Exception) and r.status == 200)
+                for r in responses:
+                    if not isinstance(r, Exception):
+                        r.release()
                 if success_count > 45:  # If more than 90% requests succeed
                     vulnerabilities.append({
                         'type': 'missing_rate_limiting',
@@ -228,68 +376,66 @@ class APIScanner:
 
         return vulnerabilities
 
-    async def _test_injection_vulnerabilities(self, session: aiohttp.ClientSession, base_url: str) -> List[Dict]:
+    async def _test_injection_vulnerabilities(self, session: aiohttp.ClientSession, base_url: str,
+                                              api_probes: Optional[List[Dict]] = None) -> List[Dict]:
         """Test for various injection vulnerabilities"""
-        vulnerabilities = []
+        # Corpora are expanded lazily and cached, so every target and injection point reuses them
+        injection_tests = self.payload_generator.corpora(INJECTION_CLASSES)
 
-        # Test payloads
-        injection_tests = {
-            'sql': ["' OR '1'='1", "admin'--", "1; DROP TABLE users"],
-            'nosql': ['{"$gt": ""}', '{"$ne": null}'],
-            'command': ['; ls -la', '& dir', '| cat /etc/passwd'],
-            'xml': ['<!DOCTYPE test [ <!ENTITY xxe SYSTEM "file:///etc/passwd"> ]>']
-        }
+        # Documented operations carry their real parameters, otherwise probe common endpoints
+        targets = [probe for probe in api_probes or [] if probe['method'] not in ('OPTIONS', 'HEAD', 'TRACE')]
+        if not targets:
+            targets = [
+                {'method': 'POST', 'url': f"{base_url}{endpoint}", 'json': {'param': ''}}
+                for endpoint in self.common_endpoints
+            ]
 
-        for endpoint in self.common_endpoints:
-            url = f"{base_url}{endpoint}"
-            for injection_type, payloads in injection_tests.items():
-                for payload in payloads:
-                    try:
-                        async with session.post(url, json={'param': payload}) as response:
-                            content = await response.text()
-                            if any(error in content.lower() for error in ['error', 'exception', 'syntax']):
-                                vulnerabilities.append({
-                                    'type': f'{injection_type}_injection',
-                                    'severity': 'critical',
-                                    'endpoint': url,
-                                    'payload': payload,
-                                    'description': f'Potential {injection_type} injection vulnerability'
-                                })
-                    except Exception:
-                        continue
-
-        return vulnerabilities
+        fuzzer = InjectionFuzzer(session)
+        return await fuzzer.fuzz(targets, injection_tests)
 
     async def _test_data_exposure(self, session: aiohttp.ClientSession, base_url: str) -> List[Dict]:
         """Test for sensitive data exposure"""
         vulnerabilities = []
 
-        sensitive_patterns = [
-            r'\b[\w\.-]+@[\w\.-]+\.\w+\b',  # Email
-            r'\b\d{3}-\d{2}-\d{4}\b',  # SSN
-            r'\b\d{16}\b',  # Credit card
-            r'password|secret|key|token|credential',  # Sensitive keywords
-            r'bearer\s+[a-zA-Z0-9\-_]+\.[a-zA-Z0-9\-_]+\.[a-zA-Z0-9\-_]+',  # JWT
-        ]
+        aggregator = MatchAggregator()
 
         for endpoint in self.common_endpoints:
             url = f"{base_url}{endpoint}"
+            cached = await self.http_cache.lookup(url) if self.http_cache else None
+            headers = {}
+            if cached and 'sensitive_data' in cached['results']:
+                headers = self.http_cache.conditional_headers(cached)
             try:
-                async with session.get(url) as response:
-                    content = await response.text()
-                    for pattern in sensitive_patterns:
-                        matches = re.finditer(pattern, content, re.IGNORECASE)
-                        for match in matches:
-                            vulnerabilities.append({
-                                'type': 'sensitive_data_exposure',
-                                'severity': 'critical',
-                                'endpoint': url,
-                                'description': f'Potential sensitive data exposure: {pattern}',
-                                'evidence': match.group()[:20] + '...'  # Truncate for safety
-                            })
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and headers:
+                        # Unchanged since the last scan, so are its matches
+                        self.http_cache.not_modified(cached)
+                        aggregator.restore(url, cached['results']['sensitive_data']['value'])
+                        continue
+                    digest = hashlib.sha256()
+                    async for pattern_name, evidence in scan_response(response, self.sensitive_matcher,
+                                                                      digest=digest):
+                        aggregator.add(url, pattern_name, evidence)
+                    if self.http_cache and response.status == 200 and self.http_cache.store(
+                            url, response.status, response.headers.items(), digest.hexdigest(),
+                            response.content.total_bytes):
+                        self.http_cache.set_result(url, 'sensitive_data', digest.hexdigest(),
+                                                   aggregator.records_for(url))
             except Exception:
                 continue
 
+        for url, pattern_name, record in aggregator.items():
+            vulnerabilities.append({
+                'type': 'sensitive_data_exposure',
+                'severity': 'critical',
+                'endpoint': url,
+                'description': f'Potential sensitive data exposure: {self.sensitive_patterns[pattern_name]}',
+                'pattern': pattern_name,
+                'match_count': record['count'],
+                'evidence': record['samples'][0] if record['samples'] else '',
+                'evidence_samples': record['samples']
+            })
+
         return vulnerabilities
 
     def _generate_report(self, vulnerabilities: List[Dict], discovered_endpoints: set) -> Dict:
@@ -6,12 +6,12 @@ import asyncio
 from web3 import Web3
 from eth_utils import to_checksum_address
 from app.core.databases.vulnerability_db import VulnerabilityDatabase
-from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
 
 class BlockchainScanner:
     def __init__(self):
         self.vuln_db = VulnerabilityDatabase()
-        self.ai_detector = VulnerabilityDetector()
+        self.ai_detector = get_vulnerability_detector()
         # Initialize Web3 with configurable endpoint
         self.w3 = Web3(Web3.HTTPProvider('https://mainnet.infura.io/v3/9aa3d95b3bc440fa88ea12eaa4456161'))
 
@@ -56,10 +56,6 @@ class BlockchainScanner:
             elif scan_type == 'source':
                 await self._scan_contract_source(target, vulnerabilities)
 
-            # Enhance results with AI analysis
-            ai_results = await self.ai_detector.analyze_smart_contract(target)
-            vulnerabilities.extend(ai_results)
-
             return self._generate_report(vulnerabilities)
 
         except Exception as e:
@@ -100,6 +96,9 @@ class BlockchainScanner:
             bytecode_vulns = self._analyze_bytecode(code)
             vulnerabilities.extend(bytecode_vulns)
 
+            # Enhance results with AI analysis
+            vulnerabilities.extend(await self.ai_detector.analyze_blockchain_vulnerabilities('', code.hex()))
+
             # Run Mythril analysis
             await self._run_mythril_analysis(contract_address, vulnerabilities)
 
@@ -121,6 +120,12 @@ class BlockchainScanner:
                 content = f.read()
                 await self._analyze_source_patterns(content, source_path, vulnerabilities)
 
+            # Enhance results with AI analysis, located by window of lines
+            ai_results = await self.ai_detector.analyze_blockchain_vulnerabilities(content, '', windowed=True)
+            for result in ai_results:
+                result.update(file=source_path, line=result['start_line'])
+            vulnerabilities.extend(ai_results)
+
         except Exception as e:
             vulnerabilities.append({
                 'type': 'scan_error',
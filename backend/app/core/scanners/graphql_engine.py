@@ -0,0 +1,388 @@
+"""GraphQL endpoint testing with cached introspection and batched probes"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.scanners.injection_fuzzer import COMPILED_SIGNATURES, ReflectionFilter
+from app.core.utils.body_inspector import read_body_limited
+
+INTROSPECTION_QUERY = """
+query IntrospectionQuery {
+  __schema {
+    queryType { name }
+    mutationType { name }
+    types {
+      kind name
+      fields(includeDeprecated: true) {
+        name
+        args { name type { ...TypeRef } }
+        type { ...TypeRef }
+      }
+      inputFields { name type { ...TypeRef } }
+      enumValues(includeDeprecated: true) { name }
+    }
+  }
+}
+fragment TypeRef on __Type {
+  kind name
+  ofType { kind name ofType { kind name ofType { kind name ofType { kind name } } } }
+}
+"""
+
+SENSITIVE_FIELD_PATTERN = re.compile(
+    r'user|admin|account|token|secret|password|credential|config|internal|private|role|permission|session',
+    re.IGNORECASE
+)
+
+INJECTION_PAYLOADS = {
+    'sql': ["' OR '1'='1", "1' AND SLEEP(0)--"],
+    'nosql': ['{"$ne": null}', "'; return true; var a='"],
+}
+
+SCALAR_EXAMPLES = {'Int': '1', 'Float': '1.0', 'Boolean': 'true', 'ID': '"1"', 'String': '"test"'}
+
+# Schemas already introspected in this process: endpoint -> (fetched at, schema hash, schema)
+_schema_cache: 'OrderedDict[str, Tuple[float, str, GraphQLSchema]]' = OrderedDict()
+# Probes generated per schema hash, shared by every endpoint serving the same schema
+_probe_cache: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+
+
+def _cache_get(cache: OrderedDict, key: str) -> Any:
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache: OrderedDict, key: str, value: Any) -> None:
+    """Store a value, dropping the least recently used entries past GRAPHQL_CACHE_SIZE"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > settings.GRAPHQL_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _unwrap(type_ref: Dict[str, Any]) -> Tuple[str, str, bool, bool]:
+    """Return (kind, name, non_null, is_list) of a possibly wrapped type"""
+    non_null = is_list = False
+    first = True
+    while type_ref and type_ref.get('kind') in ('NON_NULL', 'LIST'):
+        if type_ref['kind'] == 'NON_NULL' and first:
+            non_null = True
+        if type_ref['kind'] == 'LIST':
+            is_list = True
+        first = False
+        type_ref = type_ref.get('ofType') or {}
+    return type_ref.get('kind', ''), type_ref.get('name', ''), non_null, is_list
+
+
+class GraphQLSchema:
+    """The parts of an introspection result the probe generator needs"""
+
+    def __init__(self, introspection: Dict[str, Any]):
+        schema = introspection['__schema']
+        self.types = {t['name']: t for t in schema.get('types', []) if t.get('name')}
+        self.query_type = (schema.get('queryType') or {}).get('name')
+        self.mutation_type = (schema.get('mutationType') or {}).get('name')
+
+    def root_fields(self, operation: str = 'query') -> List[Dict[str, Any]]:
+        type_name = self.query_type if operation == 'query' else self.mutation_type
+        return [f for f in (self.types.get(type_name) or {}).get('fields') or [] if not f['name'].startswith('__')]
+
+    def literal_for(self, type_ref: Dict[str, Any], depth: int = 0) -> str:
+        """An example GraphQL literal for an argument type"""
+        kind, name, _, is_list = _unwrap(type_ref)
+        if kind == 'ENUM':
+            values = (self.types.get(name) or {}).get('enumValues') or []
+            literal = values[0]['name'] if values else 'null'
+        elif kind == 'INPUT_OBJECT' and depth < 3:
+            fields = (self.types.get(name) or {}).get('inputFields') or []
+            required = [f for f in fields if _unwrap(f['type'])[2]]
+            literal = '{' + ', '.join(
+                f"{f['name']}: {self.literal_for(f['type'], depth + 1)}" for f in required
+            ) + '}'
+        else:
+            literal = SCALAR_EXAMPLES.get(name, '"test"')
+        return f'[{literal}]' if is_list else literal
+
+    def selection_for(self, type_ref: Dict[str, Any], depth: int = 0) -> str:
+        """A minimal sub-selection for a field's return type, empty for scalars"""
+        kind, name, _, _ = _unwrap(type_ref)
+        if kind not in ('OBJECT', 'INTERFACE'):
+            return ''
+        fields = (self.types.get(name) or {}).get('fields') or []
+        scalars = [
+            f['name'] for f in fields
+            if _unwrap(f['type'])[0] in ('SCALAR', 'ENUM') and not any(_unwrap(a['type'])[2] for a in f.get('args') or [])
+        ]
+        if scalars:
+            return '{ ' + ' '.join(scalars[:5]) + ' }'
+        return '{ __typename }'
+
+    def field_call(self, field: Dict[str, Any], overrides: Optional[Dict[str, str]] = None) -> str:
+        """field(requiredArgs...) { selection } with optional literal overrides"""
+        overrides = overrides or {}
+        args = [
+            f"{arg['name']}: {overrides.get(arg['name']) or self.literal_for(arg['type'])}"
+            for arg in field.get('args') or []
+            if _unwrap(arg['type'])[2] or arg['name'] in overrides
+        ]
+        call = field['name'] + (f"({', '.join(args)})" if args else '')
+        return f"{call} {self.selection_for(field['type'])}".strip()
+
+    def deep_selection(self, depth: int) -> Optional[str]:
+        """Follow object-typed fields from the query root to build a selection depth levels deep"""
+        for root_field in self.root_fields():
+            if any(_unwrap(a['type'])[2] for a in root_field.get('args') or []):
+                continue
+            path = [root_field['name']]
+            _, type_name, _, _ = _unwrap(root_field['type'])
+            while len(path) < depth:
+                fields = (self.types.get(type_name) or {}).get('fields') or []
+                nested = next((
+                    f for f in fields
+                    if _unwrap(f['type'])[0] in ('OBJECT', 'INTERFACE')
+                    and not any(_unwrap(a['type'])[2] for a in f.get('args') or [])
+                ), None)
+                if nested is None:
+                    break
+                path.append(nested['name'])
+                type_name = _unwrap(nested['type'])[1]
+            if len(path) >= depth:
+                return ' { '.join(path) + ' { __typename' + ' }' * len(path)
+        return None
+
+
+class GraphQLEngine:
+    """Introspect a GraphQL endpoint once and test it with batched probes.
+
+    Probes are generated per field and argument from the schema and sent
+    several per request: as a JSON array of operations when the server
+    accepts query batching, otherwise as aliased fields of one operation.
+    Responses are mapped back to probes through the array index or the
+    alias in each error path.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.batch_size = settings.GRAPHQL_BATCH_SIZE
+        self.requests_sent = 0
+        self._array_batching: Dict[str, bool] = {}
+
+    async def scan(self, endpoint: str) -> List[Dict[str, Any]]:
+        schema_entry = await self._get_schema(endpoint)
+        if schema_entry is None:
+            return []
+        schema_hash, schema = schema_entry
+
+        vulnerabilities = [{
+            'type': 'graphql_introspection_enabled',
+            'severity': 'medium',
+            'endpoint': endpoint,
+            'description': 'GraphQL introspection is enabled and exposes the full schema'
+        }]
+
+        probes = _cache_get(_probe_cache, schema_hash)
+        if probes is None:
+            probes = self._generate_probes(schema)
+            _cache_put(_probe_cache, schema_hash, probes)
+
+        results = await self._send_probes(endpoint, [p for p in probes if p['kind'] in ('auth', 'injection')])
+        for probe, result in results:
+            finding = self._evaluate(endpoint, probe, result)
+            if finding:
+                vulnerabilities.append(finding)
+
+        vulnerabilities.extend(await self._test_limits(endpoint, schema))
+
+        if self._array_batching.get(endpoint):
+            vulnerabilities.append({
+                'type': 'graphql_batching_enabled',
+                'severity': 'low',
+                'endpoint': endpoint,
+                'description': 'Array query batching is accepted, allowing many operations per request (brute force, rate-limit bypass)'
+            })
+        return vulnerabilities
+
+    async def _get_schema(self, endpoint: str) -> Optional[Tuple[str, GraphQLSchema]]:
+        cached = _cache_get(_schema_cache, endpoint)
+        if cached and time.monotonic() - cached[0] < settings.GRAPHQL_SCHEMA_TTL:
+            return cached[1], cached[2]
+        if cached:
+            del _schema_cache[endpoint]
+
+        result = await self._post(endpoint, {'query': INTROSPECTION_QUERY})
+        if not isinstance(result, dict) or not (result.get('data') or {}).get('__schema'):
+            return None
+
+        schema_hash = hashlib.sha256(json.dumps(result['data'], sort_keys=True).encode()).hexdigest()
+        schema = GraphQLSchema(result['data'])
+        _cache_put(_schema_cache, endpoint, (time.monotonic(), schema_hash, schema))
+        return schema_hash, schema
+
+    def _generate_probes(self, schema: GraphQLSchema) -> List[Dict[str, Any]]:
+        probes = []
+        for field in schema.root_fields('query'):
+            if SENSITIVE_FIELD_PATTERN.search(field['name']):
+                probes.append({
+                    'kind': 'auth',
+                    'field': field['name'],
+                    'selection': schema.field_call(field)
+                })
+
+            for arg in field.get('args') or []:
+                _, type_name, _, _ = _unwrap(arg['type'])
+                if type_name not in ('String', 'ID'):
+                    continue
+                for injection_type, payloads in INJECTION_PAYLOADS.items():
+                    for payload in payloads:
+                        probes.append({
+                            'kind': 'injection',
+                            'field': field['name'],
+                            'argument': arg['name'],
+                            'injection_type': injection_type,
+                            'payload': payload,
+                            'selection': schema.field_call(field, {arg['name']: json.dumps(payload)})
+                        })
+        return probes
+
+    async def _send_probes(self, endpoint: str, probes: List[Dict[str, Any]]) -> List[Tuple[Dict, Dict]]:
+        results = []
+        for start in range(0, len(probes), self.batch_size):
+            batch = probes[start:start + self.batch_size]
+            if self._array_batching.get(endpoint, True):
+                batch_results = await self._send_array_batch(endpoint, batch)
+                if batch_results is not None:
+                    results.extend(zip(batch, batch_results))
+                    continue
+            results.extend(zip(batch, await self._send_alias_batch(endpoint, batch)))
+        return results
+
+    async def _send_array_batch(self, endpoint: str, batch: List[Dict[str, Any]]) -> Optional[List[Dict]]:
+        """Results of a batch sent as a JSON array, or None to send it as aliases instead"""
+        payload = [{'query': f"query {{ {probe['selection']} }}"} for probe in batch]
+        status, result = await self._post_with_status(endpoint, payload)
+        if isinstance(result, list) and len(result) == len(batch):
+            self._array_batching[endpoint] = True
+            return [r if isinstance(r, dict) else {} for r in result]
+        if status == 400 or (status is not None and status < 500 and isinstance(result, dict)):
+            # The server answered and refused the array: stop offering it one
+            self._array_batching[endpoint] = False
+        # Otherwise a timeout or server error, which says nothing about batching support
+        return None
+
+    async def _send_alias_batch(self, endpoint: str, batch: List[Dict[str, Any]]) -> List[Dict]:
+        query = 'query { ' + ' '.join(f"p{i}: {probe['selection']}" for i, probe in enumerate(batch)) + ' }'
+        result = await self._post(endpoint, {'query': query})
+        if not isinstance(result, dict):
+            return [{} for _ in batch]
+
+        data = result.get('data') or {}
+        per_probe = [{'data': {probe['field']: data.get(f'p{i}')}, 'errors': []} for i, probe in enumerate(batch)]
+        document_errors = []
+        for error in result.get('errors') or []:
+            if not isinstance(error, dict):
+                continue
+            path = error.get('path') or []
+            if path and isinstance(path[0], str) and path[0].startswith('p') and path[0][1:].isdigit():
+                index = int(path[0][1:])
+                if index < len(per_probe):
+                    per_probe[index]['errors'].append(error)
+                    continue
+            document_errors.append(error)
+
+        if document_errors and len(batch) > 1:
+            # Validation errors carry no path and fail the whole document, hiding
+            # every other probe's result: bisect until they are pinned on their probes
+            middle = len(batch) // 2
+            return (await self._send_alias_batch(endpoint, batch[:middle])
+                    + await self._send_alias_batch(endpoint, batch[middle:]))
+        for entry in per_probe:
+            entry['errors'].extend(document_errors)
+        return per_probe
+
+    def _evaluate(self, endpoint: str, probe: Dict[str, Any], result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        errors = ' '.join(str(e.get('message', '')) for e in result.get('errors') or [] if isinstance(e, dict))
+        value = (result.get('data') or {}).get(probe['field'])
+
+        if probe['kind'] == 'auth' and value not in (None, [], {}) and not errors:
+            return {
+                'type': 'graphql_authorization_bypass',
+                'severity': 'high',
+                'endpoint': endpoint,
+                'field': probe['field'],
+                'description': f"Sensitive field '{probe['field']}' resolved without authentication"
+            }
+
+        if probe['kind'] == 'injection':
+            signature = COMPILED_SIGNATURES.get(probe['injection_type'])
+            # Validation messages quote the offending literal, which is the payload itself
+            if signature and signature.search(ReflectionFilter(probe['payload']).feed(errors, final=True)):
+                return {
+                    'type': f"{probe['injection_type']}_injection",
+                    'severity': 'critical',
+                    'endpoint': endpoint,
+                    'field': probe['field'],
+                    'parameter': probe['argument'],
+                    'payload': probe['payload'],
+                    'description': f"Potential {probe['injection_type']} injection through GraphQL argument "
+                                   f"'{probe['field']}.{probe['argument']}'"
+                }
+        return None
+
+    async def _test_limits(self, endpoint: str, schema: GraphQLSchema) -> List[Dict[str, Any]]:
+        vulnerabilities = []
+
+        deep_query = schema.deep_selection(settings.GRAPHQL_MAX_DEPTH_PROBE)
+        alias_field = next((
+            f for f in schema.root_fields()
+            if not any(_unwrap(a['type'])[2] for a in f.get('args') or [])
+        ), None)
+        alias_query = None
+        if alias_field:
+            selection = schema.field_call(alias_field)
+            alias_query = 'query { ' + ' '.join(
+                f'a{i}: {selection}' for i in range(settings.GRAPHQL_ALIAS_PROBE_COUNT)
+            ) + ' }'
+
+        deep_result, alias_result = await asyncio.gather(
+            self._post(endpoint, {'query': f'query {{ {deep_query} }}'}) if deep_query else asyncio.sleep(0),
+            self._post(endpoint, {'query': alias_query}) if alias_query else asyncio.sleep(0)
+        )
+
+        if isinstance(deep_result, dict) and deep_result.get('data') and not deep_result.get('errors'):
+            vulnerabilities.append({
+                'type': 'graphql_missing_depth_limit',
+                'severity': 'medium',
+                'endpoint': endpoint,
+                'description': f'Query nested {settings.GRAPHQL_MAX_DEPTH_PROBE} levels deep was executed'
+            })
+        if isinstance(alias_result, dict) and len(alias_result.get('data') or {}) >= settings.GRAPHQL_ALIAS_PROBE_COUNT:
+            vulnerabilities.append({
+                'type': 'graphql_missing_complexity_limit',
+                'severity': 'medium',
+                'endpoint': endpoint,
+                'description': f'Query with {settings.GRAPHQL_ALIAS_PROBE_COUNT} aliased fields was executed'
+            })
+        return vulnerabilities
+
+    async def _post(self, endpoint: str, payload: Any) -> Any:
+        return (await self._post_with_status(endpoint, payload))[1]
+
+    async def _post_with_status(self, endpoint: str, payload: Any) -> Tuple[Optional[int], Any]:
+        """The response status and decoded JSON body; None for what could not be had"""
+        status = None
+        try:
+            async with self.session.post(endpoint, json=payload) as response:
+                self.requests_sent += 1
+                status = response.status
+                return status, json.loads(await read_body_limited(response))
+        except Exception:
+            return status, None
@@ -0,0 +1,208 @@
+"""Incremental extraction of crawl edges from HTML as it is downloaded"""
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+# Attributes that point at other resources, per tag
+LINK_ATTRIBUTES = {
+    'a': ('href',),
+    'area': ('href',),
+    'link': ('href',),
+    'frame': ('src',),
+    'iframe': ('src',),
+    'script': ('src',),
+    'img': ('src',),
+    'form': ('action',),
+    'button': ('formaction',),
+    'input': ('formaction',),
+}
+
+FORM_FIELD_TAGS = ('input', 'textarea', 'select', 'button')
+
+# Elements whose content is not markup; their bodies are measured, not parsed
+RAW_TEXT_TAGS = ('script', 'style')
+RAW_TEXT_END = {tag: re.compile(f'</{tag}', re.IGNORECASE) for tag in RAW_TEXT_TAGS}
+
+
+class StreamingHTMLExtractor(HTMLParser):
+    """Feed-as-you-go parser collecting links, forms and script markers.
+
+    No tree is built: each start tag is inspected and forgotten. Links are
+    handed out by pop_links() after every chunk so they never accumulate,
+    while forms and script markers are kept up to fixed limits.
+
+    Text is handed to the parser only up to the last '>' received, so it
+    never sees half a tag. Script and style bodies and comments are skipped
+    here rather than buffered by the parser until they end, and a tag that
+    grows past max_pending characters is discarded before the parser sees
+    it, so memory stays constant however large the page is.
+    """
+
+    def __init__(self, encoding: Optional[str] = None, max_forms: int = 50, max_fields: int = 100,
+                 max_scripts: int = 200, max_pending: int = 64 * 1024):
+        super().__init__(convert_charrefs=True)
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding or 'utf-8')('replace')
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.max_forms = max_forms
+        self.max_fields = max_fields
+        self.max_scripts = max_scripts
+        self.max_pending = max_pending
+        self.base_href: Optional[str] = None
+        self.forms: List[Dict[str, Any]] = []
+        self.scripts: List[Dict[str, Any]] = []
+        self.bytes_parsed = 0
+        self.links_found = 0
+        self._links: List[str] = []
+        self._open_form: Optional[Dict[str, Any]] = None
+        self._open_script: Optional[Dict[str, Any]] = None
+        # Text received but not yet given to the parser, and what it is inside of
+        self._pending = ''
+        self._raw_text: Optional[str] = None
+        self._in_comment = False
+        self._skipped_lines = 0
+
+    def feed_bytes(self, chunk: bytes) -> None:
+        self.bytes_parsed += len(chunk)
+        self._pending += self._decoder.decode(chunk)
+        self._advance()
+
+    def close(self) -> None:
+        self._pending += self._decoder.decode(b'', final=True)
+        self._advance()
+        if self._raw_text is not None:
+            self._skip_raw_text(len(self._pending))
+        elif not self._in_comment:
+            self.feed(self._pending)
+        self._pending = ''
+        super().close()
+
+    def _advance(self) -> None:
+        """Give the parser every complete tag received, skipping what it would buffer"""
+        while self._pending:
+            if self._in_comment:
+                end = self._pending.find('-->')
+                if end < 0:
+                    self._skip(max(len(self._pending) - 2, 0))
+                    return
+                self._skip(end + 3)
+                self._in_comment = False
+            elif self._raw_text is not None:
+                end = RAW_TEXT_END[self._raw_text].search(self._pending)
+                if end is None:
+                    # Keep what could be the start of the end tag
+                    self._skip_raw_text(max(len(self._pending) - len(self._raw_text) - 1, 0))
+                    return
+                # The parser is waiting for the end tag; it gets it without the body
+                self._skip_raw_text(end.start())
+                self._raw_text = None
+                self._feed_markup()
+            else:
+                self._feed_markup()
+                if self._raw_text is None and not self._in_comment:
+                    return
+
+    def _feed_markup(self) -> None:
+        end = self._pending.rfind('>') + 1
+        comment = self._pending.rfind('<!--', 0, end)
+        if comment >= 0 and self._pending.find('-->', comment + 4) < 0:
+            # An unterminated comment: the parser would hold it until it ends
+            self.feed(self._pending[:comment])
+            self._pending = self._pending[comment:]
+            if self._raw_text is None:
+                self._skip(4)
+                self._in_comment = True
+            return
+        if end == 0 and len(self._pending) > self.max_pending:
+            tag = self._pending.rfind('<')
+            if tag < 0:
+                tag = len(self._pending)
+            # Text before an unterminated tag is parsed, the tag kept unless oversized
+            self.feed(self._pending[:tag])
+            self._pending = self._pending[tag:]
+            if len(self._pending) > self.max_pending:
+                self._skip(len(self._pending))
+            return
+        self.feed(self._pending[:end])
+        self._pending = self._pending[end:]
+
+    def _skip_raw_text(self, length: int) -> None:
+        if self._open_script is not None:
+            self._open_script['length'] += length
+        self._skip(length)
+
+    def _skip(self, length: int) -> None:
+        """Drop pending text the parser is not given, keeping line numbers right"""
+        self._skipped_lines += self._pending.count('\n', 0, length)
+        self._pending = self._pending[length:]
+
+    def getpos(self) -> Tuple[int, int]:
+        line, offset = super().getpos()
+        return line + self._skipped_lines, offset
+
+    def pop_links(self) -> List[str]:
+        """Links found since the last call"""
+        links, self._links = self._links, []
+        return links
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        attributes = {name: value or '' for name, value in attrs}
+
+        if tag == 'base' and self.base_href is None and attributes.get('href'):
+            self.base_href = attributes['href']
+        for name in LINK_ATTRIBUTES.get(tag, ()):
+            link = attributes.get(name, '').strip()
+            if link and not link.startswith('#'):
+                self._links.append(link)
+                self.links_found += 1
+
+        if tag == 'form':
+            self._open_form = None
+            if len(self.forms) < self.max_forms:
+                self._open_form = {
+                    'action': attributes.get('action', ''),
+                    'method': attributes.get('method', 'get').lower(),
+                    'line': self.getpos()[0],
+                    'inputs': []
+                }
+                self.forms.append(self._open_form)
+        elif tag in FORM_FIELD_TAGS and self._open_form is not None:
+            if len(self._open_form['inputs']) < self.max_fields:
+                self._open_form['inputs'].append({
+                    'name': attributes.get('name', ''),
+                    'type': attributes.get('type', 'text' if tag == 'input' else tag).lower()
+                })
+        if tag in RAW_TEXT_TAGS:
+            self._raw_text = tag
+
+        if tag == 'script':
+            self._open_script = None
+            if len(self.scripts) < self.max_scripts:
+                self._open_script = {
+                    'src': attributes.get('src') or None,
+                    'inline': not attributes.get('src'),
+                    'line': self.getpos()[0],
+                    'length': 0
+                }
+                self.scripts.append(self._open_script)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag in RAW_TEXT_TAGS:
+            self._raw_text = None
+        if tag == 'script':
+            self._open_script = None
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == self._raw_text:
+            self._raw_text = None
+        if tag == 'form':
+            self._open_form = None
+        elif tag == 'script':
+            self._open_script = None
+
+    def handle_data(self, data: str) -> None:
+        if self._open_script is not None:
+            self._open_script['length'] += len(data)
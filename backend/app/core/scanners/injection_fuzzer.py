@@ -0,0 +1,312 @@
+"""Baseline-diff injection fuzzing for the API scanner"""
+import asyncio
+import codecs
+import hashlib
+import html
+import json
+import math
+import itertools
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, quote_plus
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.utils.body_inspector import iter_body_chunks
+
+# Headers whose presence changes from one response to the next on their own
+VOLATILE_HEADERS = {
+    'date', 'content-length', 'etag', 'last-modified', 'expires', 'age',
+    'x-request-id', 'x-correlation-id', 'x-runtime', 'set-cookie', 'server-timing'
+}
+
+# Back-end error messages that indicate the payload reached an interpreter. None
+# of them may occur in the payloads themselves, or an endpoint echoing its input
+# would look injectable.
+ERROR_SIGNATURES = {
+    'sql': r'sql syntax|syntax error at or near|unclosed quotation mark|ORA-\d{5}|sqlite3?\.|SQLSTATE|pg_query|mysql_fetch',
+    'nosql': r'MongoError|MongoServerError|BSONError|BSONTypeError|CastError|unknown (?:top level )?operator',
+    'command': r'root:x:0:0|/bin/(?:ba)?sh:|command not found|Volume Serial Number',
+    'xml': r'DOCTYPE is disallowed|XML parsing error|SAXParseException|lxml\.etree|XMLSyntaxError|undefined entity',
+}
+
+COMPILED_SIGNATURES = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in ERROR_SIGNATURES.items()}
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+class SimHash:
+    """Incremental 64-bit simhash over the word tokens of a text stream"""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._tail = ''
+
+    def update(self, text: str) -> None:
+        text = self._tail + text
+        # The last token may continue in the next chunk
+        match = re.search(r'\w+$', text)
+        self._tail = match.group() if match else ''
+        if match:
+            text = text[:match.start()]
+        self._counts.update(_TOKEN_RE.findall(text.lower()))
+
+    def digest(self) -> int:
+        if self._tail:
+            self._counts[self._tail.lower()] += 1
+            self._tail = ''
+        weights = [0] * 64
+        for token, count in self._counts.items():
+            value = _hash64(token.encode())
+            for bit in range(64):
+                weights[bit] += count if value >> bit & 1 else -count
+        return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def reflected_forms(value: str) -> List[str]:
+    """The ways a server commonly echoes a sent value back, longest first"""
+    forms = {value, json.dumps(value)[1:-1], html.escape(value), html.escape(value, quote=False),
+             quote(value, safe=''), quote_plus(value)}
+    return sorted((form for form in forms if form), key=len, reverse=True)
+
+
+class ReflectionFilter:
+    """Remove echoes of a sent value from a body decoded in chunks.
+
+    Text that could be the start of an echo completed by the next chunk is
+    held back until that chunk arrives.
+    """
+
+    def __init__(self, sent: Optional[str] = None):
+        forms = reflected_forms(sent) if sent else []
+        self._pattern = re.compile('|'.join(map(re.escape, forms)), re.IGNORECASE) if forms else None
+        self._hold = len(forms[0]) - 1 if forms else 0
+        self._pending = ''
+
+    def feed(self, text: str, final: bool = False) -> str:
+        if self._pattern is None:
+            return text
+        pending = self._pattern.sub(' ', self._pending + text)
+        cut = len(pending) if final else max(len(pending) - self._hold, 0)
+        self._pending = pending[cut:]
+        return pending[:cut]
+
+
+class ResponseFingerprint(NamedTuple):
+    """Compact summary of a response, small enough to keep thousands of them"""
+    status: int
+    length_bucket: int
+    header_set: int
+    simhash: int
+    error_classes: Tuple[str, ...]
+
+
+def length_bucket(length: int) -> int:
+    """Half-octave bucket so small length jitter does not count as a change"""
+    return int(math.log2(length + 1) * 2)
+
+
+async def fingerprint_response(response: aiohttp.ClientResponse,
+                               signatures: Optional[Dict[str, re.Pattern]] = None,
+                               sent: Optional[str] = None) -> ResponseFingerprint:
+    """Stream the body once to build its fingerprint without keeping it.
+
+    Echoes of the sent value are left out of the simhash and the signature
+    search: a payload reflected back is not evidence that it was executed.
+    """
+    signatures = signatures or COMPILED_SIGNATURES
+    simhash = SimHash()
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    reflections = ReflectionFilter(sent)
+    length = 0
+    errors = set()
+    tail = ''
+
+    def inspect(text: str) -> None:
+        nonlocal tail
+        simhash.update(text)
+        window = tail + text
+        for error_class, pattern in signatures.items():
+            if error_class not in errors and pattern.search(window):
+                errors.add(error_class)
+        tail = window[-128:]
+
+    async for chunk in iter_body_chunks(response):
+        length += len(chunk)
+        inspect(reflections.feed(decoder.decode(chunk)))
+    inspect(reflections.feed(decoder.decode(b'', final=True), final=True))
+
+    header_names = sorted(
+        name.lower() for name in response.headers.keys() if name.lower() not in VOLATILE_HEADERS
+    )
+    return ResponseFingerprint(
+        status=response.status,
+        length_bucket=length_bucket(length),
+        header_set=_hash64('\n'.join(header_names).encode()),
+        simhash=simhash.digest(),
+        error_classes=tuple(sorted(errors))
+    )
+
+
+class Baseline(NamedTuple):
+    fingerprint: ResponseFingerprint
+    simhash_noise: int
+    length_stable: bool
+
+
+class InjectionFuzzer:
+    """Fuzz request parameters and keep only responses that deviate from a baseline.
+
+    Each target is first requested twice with benign values. The two
+    fingerprints give the baseline and the natural simhash noise of the
+    endpoint (timestamps, CSRF tokens and similar). Payload variants are then
+    sent in batches and a response is reported only when it differs from the
+    baseline beyond that noise, or when it carries a back-end error signature
+    the baseline did not.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, batch_size: Optional[int] = None,
+                 simhash_threshold: Optional[int] = None):
+        self.session = session
+        self.batch_size = batch_size or settings.FUZZ_BATCH_SIZE
+        self.simhash_threshold = settings.FUZZ_SIMHASH_THRESHOLD if simhash_threshold is None else simhash_threshold
+        self.semaphore = asyncio.Semaphore(settings.API_SCAN_CONCURRENCY)
+        self.requests_sent = 0
+
+    async def fuzz(self, targets: List[Dict[str, Any]], payloads: Dict[str, Iterable[str]]) -> List[Dict[str, Any]]:
+        """Fuzz every injection point of every target with every payload"""
+        findings = []
+        for target in targets:
+            baseline = await self._record_baseline(target)
+            if baseline is None:
+                continue
+
+            variants = self._variants(target, payloads)
+            while True:
+                batch = list(itertools.islice(variants, self.batch_size))
+                if not batch:
+                    break
+                results = await asyncio.gather(
+                    *(self._send(self._inject(target, point, payload), payload) for _, payload, point in batch)
+                )
+                for (injection_type, payload, point), fingerprint in zip(batch, results):
+                    if fingerprint is None:
+                        continue
+                    differences = self._differences(baseline, fingerprint)
+                    finding = self._finding(target, injection_type, payload, point, fingerprint, differences)
+                    if finding:
+                        findings.append(finding)
+        return findings
+
+    def _variants(self, target: Dict[str, Any],
+                  payloads: Dict[str, Iterable[str]]) -> Iterator[Tuple[str, str, Tuple[str, str]]]:
+        for point in self._injection_points(target):
+            for injection_type, type_payloads in payloads.items():
+                for payload in type_payloads:
+                    yield injection_type, payload, point
+
+    async def _record_baseline(self, target: Dict[str, Any]) -> Optional[Baseline]:
+        points = self._injection_points(target)
+        # Values that do not occur naturally, as their echoes are removed from the body
+        first = await self._send(self._inject(target, points[0], 'vapt0'), 'vapt0')
+        second = await self._send(self._inject(target, points[0], 'vapt1'), 'vapt1')
+        if first is None or second is None:
+            return None
+        return Baseline(
+            fingerprint=first,
+            simhash_noise=hamming_distance(first.simhash, second.simhash),
+            length_stable=first.length_bucket == second.length_bucket
+        )
+
+    async def _send(self, request: Dict[str, Any], sent: Optional[str] = None) -> Optional[ResponseFingerprint]:
+        async with self.semaphore:
+            try:
+                async with self.session.request(
+                    request['method'], request['url'],
+                    params=request.get('params') or None,
+                    headers=request.get('headers') or None,
+                    json=request.get('json'),
+                    data=request.get('data')
+                ) as response:
+                    self.requests_sent += 1
+                    return await fingerprint_response(response, sent=sent)
+            except Exception:
+                return None
+
+    @staticmethod
+    def _injection_points(target: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """(location, name) pairs of the string-ish parameters of a target"""
+        points = [('params', name) for name in (target.get('params') or {})]
+        for location in ('json', 'data'):
+            body = target.get(location)
+            if isinstance(body, dict):
+                points.extend(
+                    (location, name) for name, value in body.items()
+                    if not isinstance(value, (dict, list))
+                )
+        return points or [('json', 'param')]
+
+    @staticmethod
+    def _inject(target: Dict[str, Any], point: Tuple[str, str], payload: str) -> Dict[str, Any]:
+        location, name = point
+        request = dict(target)
+        container = request.get(location)
+        container = dict(container) if isinstance(container, dict) else {}
+        container[name] = payload
+        request[location] = container
+        return request
+
+    def _differences(self, baseline: Baseline, fingerprint: ResponseFingerprint) -> List[str]:
+        reference = baseline.fingerprint
+        differences = []
+        if fingerprint.status != reference.status:
+            differences.append('status')
+        if baseline.length_stable and fingerprint.length_bucket != reference.length_bucket:
+            differences.append('length')
+        if fingerprint.header_set != reference.header_set:
+            differences.append('headers')
+        distance = hamming_distance(fingerprint.simhash, reference.simhash)
+        if distance > baseline.simhash_noise + self.simhash_threshold:
+            differences.append('body')
+        new_errors = set(fingerprint.error_classes) - set(reference.error_classes)
+        if new_errors:
+            differences.append('error_signature')
+        return differences
+
+    @staticmethod
+    def _finding(target: Dict[str, Any], injection_type: str, payload: str, point: Tuple[str, str],
+                 fingerprint: ResponseFingerprint, differences: List[str]) -> Optional[Dict[str, Any]]:
+        if not differences:
+            return None
+
+        if injection_type in fingerprint.error_classes:
+            severity = 'critical'
+        elif 'error_signature' in differences or fingerprint.status >= 500:
+            severity = 'high'
+        elif 'status' in differences or 'body' in differences:
+            severity = 'medium'
+        else:
+            # Header or length jitter alone is not worth reporting
+            return None
+
+        return {
+            'type': f'{injection_type}_injection',
+            'severity': severity,
+            'endpoint': target['url'],
+            'method': target['method'],
+            'parameter': f'{point[0]}.{point[1]}',
+            'payload': payload,
+            'status': fingerprint.status,
+            'differences': differences,
+            'description': f'Potential {injection_type} injection vulnerability: response deviates from baseline'
+        }
@@ -6,13 +6,13 @@ import re
 import aiohttp
 from typing import Dict, Any, List, Optional, Tuple
 from app.core.databases.vulnerability_db import VulnerabilityDatabase
-from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
 from app.core.scanners.mobile_scanner_utils import *
 
 class MobileScanner:
     def __init__(self):
         self.vuln_db = VulnerabilityDatabase()
-        self.ai_detector = VulnerabilityDetector()
+        self.ai_detector = get_vulnerability_detector()
         self.android_permissions = {
             'dangerous': [
                 'READ_CALENDAR', 'WRITE_CALENDAR',
@@ -0,0 +1,340 @@
+"""OpenAPI / Swagger specification ingestion for the API scanner"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+import ijson
+import yaml
+
+from app.core.config import settings
+from app.core.utils.body_inspector import iter_body_chunks
+from app.core.utils.http_cache import HTTPCache
+
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+# Top-level sections that can be large and are streamed instead of built in memory
+STREAMED_SECTIONS = ('paths',)
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+
+
+class RefResolver:
+    """Resolve local JSON references (``#/components/...``) with memoization.
+
+    Each reference is resolved once per spec and the result is shared by every
+    operation that points at it. Recursive schemas are cut off at the point
+    where they refer back to themselves.
+    """
+
+    def __init__(self, document: Dict[str, Any]):
+        self.document = document
+        self._cache: Dict[str, Any] = {}
+        self._resolving = set()
+
+    def resolve(self, node: Any) -> Any:
+        if isinstance(node, dict):
+            if '$ref' in node and isinstance(node['$ref'], str):
+                return self._resolve_ref(node['$ref'])
+            return {key: self.resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self.resolve(item) for item in node]
+        return node
+
+    def _resolve_ref(self, ref: str) -> Any:
+        if ref in self._cache:
+            return self._cache[ref]
+        if ref in self._resolving or not ref.startswith('#/'):
+            # Cycle or external reference, leave it unexpanded
+            return {}
+
+        target = self.document
+        for part in ref[2:].split('/'):
+            part = part.replace('~1', '/').replace('~0', '~')
+            if not isinstance(target, dict) or part not in target:
+                self._cache[ref] = {}
+                return {}
+            target = target[part]
+
+        self._resolving.add(ref)
+        try:
+            resolved = self.resolve(target)
+        finally:
+            self._resolving.discard(ref)
+        self._cache[ref] = resolved
+        return resolved
+
+
+class OpenAPISpecLoader:
+    """Download, parse and expand OpenAPI 3 and Swagger 2 specifications.
+
+    Specs are streamed to a temporary file while being hashed, so the raw
+    document is never held in memory. JSON specs are parsed incrementally:
+    everything except ``paths`` is built once for reference resolution, then
+    path items are read one at a time and expanded into probes. Expanded
+    probes are cached on disk by content hash, and with an http_cache the
+    spec is revalidated so an unchanged one is not even downloaded again.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, http_cache: Optional[HTTPCache] = None):
+        self.cache_dir = cache_dir or settings.SPEC_CACHE_DIR
+        self.http_cache = http_cache
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    async def load_probes(self, session: aiohttp.ClientSession, spec_url: str,
+                          base_url: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the probe list for the spec at spec_url, or None if it is not a spec"""
+        fetched = await self._fetch(session, spec_url)
+        if fetched is None:
+            return None
+        spec_path, content_hash = fetched
+
+        # Parsing a large spec takes seconds; keep it off the event loop
+        probes = await asyncio.get_running_loop().run_in_executor(
+            None, self._expand_or_load, spec_path, content_hash)
+        if probes is None:
+            return None
+        return [self._bind_probe(probe, base_url) for probe in probes]
+
+    def _expand_or_load(self, spec_path: Optional[str], content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached probes for content_hash, expanding and caching the spec if there are none"""
+        try:
+            probes = self._load_cached_probes(content_hash)
+            if probes is None:
+                if spec_path is None:
+                    return None
+                probes = list(self.expand_file(spec_path))
+                self._store_cached_probes(content_hash, probes)
+            return probes
+        finally:
+            if spec_path:
+                os.unlink(spec_path)
+
+    async def _fetch(self, session: aiohttp.ClientSession, spec_url: str) -> Optional[Tuple[Optional[str], str]]:
+        """Stream the spec to a temporary file, returning (path, content hash)"""
+        cached = await self.http_cache.lookup(spec_url) if self.http_cache else None
+        headers = {}
+        # Revalidate only while the probes expanded from it are still on disk
+        if cached and os.path.exists(self._probe_cache_path(cached['digest'])):
+            headers = self.http_cache.conditional_headers(cached)
+
+        async with session.get(spec_url, headers=headers) as response:
+            if response.status == 304 and headers:
+                self.http_cache.not_modified(cached)
+                return None, cached['digest']
+            if response.status != 200:
+                return None
+
+            digest = hashlib.sha256()
+            size = 0
+            fd, spec_path = tempfile.mkstemp(prefix='spec_', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as spec_file:
+                async for chunk in iter_body_chunks(response, settings.MAX_SPEC_BYTES):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    spec_file.write(chunk)
+            response_headers = list(response.headers.items())
+
+        if not self._looks_like_spec(spec_path):
+            os.unlink(spec_path)
+            return None
+
+        content_hash = digest.hexdigest()
+        if self.http_cache:
+            self.http_cache.store(spec_url, 200, response_headers, content_hash, size)
+        return spec_path, content_hash
+
+    @staticmethod
+    def _looks_like_spec(spec_path: str) -> bool:
+        with open(spec_path, 'rb') as f:
+            head = f.read(64 * 1024).decode('utf-8', 'replace').lower()
+        return 'swagger' in head or 'openapi' in head
+
+    def expand_file(self, spec_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield one probe per operation in the spec file"""
+        with open(spec_path, 'rb') as f:
+            is_json = f.read(1024).lstrip()[:1] in (b'{', b'[')
+
+        if is_json:
+            with open(spec_path, 'rb') as f:
+                document = self._read_json_skeleton(f)
+            resolver = RefResolver(document)
+            with open(spec_path, 'rb') as f:
+                for path, path_item in ijson.kvitems(f, 'paths', use_float=True):
+                    yield from self._expand_path(document, resolver, path, path_item)
+        else:
+            with open(spec_path, 'rb') as f:
+                document = yaml.load(f, Loader=_YamlLoader) or {}
+            resolver = RefResolver(document)
+            for path, path_item in (document.get('paths') or {}).items():
+                yield from self._expand_path(document, resolver, path, path_item)
+
+    @staticmethod
+    def _read_json_skeleton(spec_file: IO[bytes]) -> Dict[str, Any]:
+        """Build every top-level section except the streamed ones"""
+        document: Dict[str, Any] = {}
+        builder = None
+        key = None
+        for prefix, event, value in ijson.parse(spec_file, use_float=True):
+            if prefix == '' and event == 'map_key':
+                if builder is not None:
+                    document[key] = builder.value
+                key = value
+                builder = None if value in STREAMED_SECTIONS else ijson.ObjectBuilder()
+            elif builder is not None and prefix != '':
+                builder.event(event, value)
+        if builder is not None:
+            document[key] = builder.value
+        return document
+
+    def _expand_path(self, document: Dict[str, Any], resolver: RefResolver,
+                     path: str, path_item: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        path_item = resolver.resolve(path_item) if isinstance(path_item, dict) else {}
+        shared_params = path_item.get('parameters', [])
+        server_path = self._server_path(document)
+
+        for method in HTTP_METHODS:
+            operation = path_item.get(method)
+            if not isinstance(operation, dict):
+                continue
+
+            parameters = self._merge_parameters(shared_params, operation.get('parameters', []))
+            concrete_path = path
+            query, headers, form, body = {}, {}, {}, None
+
+            for param in parameters:
+                location = param.get('in')
+                name = param.get('name', '')
+                if location == 'body':
+                    body = self._example_for_schema(param.get('schema', {}))
+                    continue
+                value = self._example_for_parameter(param)
+                if location == 'path':
+                    concrete_path = concrete_path.replace(f'{{{name}}}', str(value))
+                elif location == 'query':
+                    query[name] = value
+                elif location == 'header':
+                    headers[name] = str(value)
+                elif location == 'formData':
+                    form[name] = value
+
+            request_body = operation.get('requestBody') or {}
+            content = request_body.get('content') or {}
+            if 'application/json' in content:
+                body = self._example_for_schema(content['application/json'].get('schema', {}))
+            elif 'application/x-www-form-urlencoded' in content:
+                example = self._example_for_schema(
+                    content['application/x-www-form-urlencoded'].get('schema', {}))
+                form = example if isinstance(example, dict) else {}
+
+            # Leftover template segments get a generic value
+            concrete_path = re.sub(r'\{[^}/]+\}', '1', concrete_path)
+
+            yield {
+                'method': method.upper(),
+                'path': f"{server_path}{concrete_path}",
+                'template': path,
+                'operation_id': operation.get('operationId'),
+                'params': query,
+                'headers': headers,
+                'json': body,
+                'data': form or None,
+                'requires_auth': bool(operation.get('security', document.get('security'))),
+            }
+
+    @staticmethod
+    def _merge_parameters(shared: List[Dict], specific: List[Dict]) -> List[Dict]:
+        merged = {(p.get('name'), p.get('in')): p for p in shared if isinstance(p, dict)}
+        merged.update({(p.get('name'), p.get('in')): p for p in specific if isinstance(p, dict)})
+        return list(merged.values())
+
+    @staticmethod
+    def _server_path(document: Dict[str, Any]) -> str:
+        if 'swagger' in document:
+            return (document.get('basePath') or '').rstrip('/')
+        servers = document.get('servers') or []
+        if servers and isinstance(servers[0], dict):
+            url = servers[0].get('url', '')
+            # Only keep the path part, the scanned host is the target
+            url = re.sub(r'^[a-z]+://[^/]+', '', url)
+            return re.sub(r'\{[^}]+\}', '', url).rstrip('/')
+        return ''
+
+    def _example_for_parameter(self, param: Dict[str, Any]) -> Any:
+        if 'example' in param:
+            return param['example']
+        schema = param.get('schema') or param
+        return self._example_for_schema(schema)
+
+    def _example_for_schema(self, schema: Dict[str, Any], depth: int = 0) -> Any:
+        if not isinstance(schema, dict) or depth > 5:
+            return None
+        for key in ('example', 'default'):
+            if key in schema:
+                return schema[key]
+        if schema.get('enum'):
+            return schema['enum'][0]
+        for combinator in ('allOf', 'oneOf', 'anyOf'):
+            if schema.get(combinator):
+                if combinator == 'allOf':
+                    merged = {}
+                    for part in schema['allOf']:
+                        example = self._example_for_schema(part, depth + 1)
+                        if isinstance(example, dict):
+                            merged.update(example)
+                    return merged
+                return self._example_for_schema(schema[combinator][0], depth + 1)
+
+        schema_type = schema.get('type')
+        if schema_type == 'object' or 'properties' in schema:
+            return {
+                name: self._example_for_schema(prop, depth + 1)
+                for name, prop in (schema.get('properties') or {}).items()
+            }
+        if schema_type == 'array':
+            return [self._example_for_schema(schema.get('items', {}), depth + 1)]
+        if schema_type == 'integer':
+            return schema.get('minimum', 1)
+        if schema_type == 'number':
+            return float(schema.get('minimum', 1.0))
+        if schema_type == 'boolean':
+            return True
+        return {
+            'uuid': '00000000-0000-0000-0000-000000000001',
+            'date': '2024-01-01',
+            'date-time': '2024-01-01T00:00:00Z',
+            'email': 'test@example.com',
+            'uri': 'https://example.com',
+        }.get(schema.get('format'), 'test')
+
+    @staticmethod
+    def _bind_probe(probe: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        bound = dict(probe)
+        bound['url'] = urljoin(f"{base_url}/", probe['path'].lstrip('/'))
+        return bound
+
+    def _probe_cache_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f'{content_hash}.jsonl')
+
+    def _load_cached_probes(self, content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._probe_cache_path(content_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _store_cached_probes(self, content_hash: str, probes: List[Dict[str, Any]]) -> None:
+        path = self._probe_cache_path(content_hash)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for probe in probes:
+                f.write(json.dumps(probe, default=str) + '\n')
+        os.replace(tmp_path, path)
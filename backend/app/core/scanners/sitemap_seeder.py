@@ -0,0 +1,168 @@
+"""Seeding the crawl frontier from robots.txt and sitemaps"""
+import asyncio
+import zlib
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from urllib.parse import urljoin
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.scanners.web_crawler import WebCrawler, normalize_url
+from app.core.utils.body_inspector import read_body_limited
+
+GZIP_MAGIC = b'\x1f\x8b'
+ROBOTS_MAX_BYTES = 512 * 1024
+
+
+def parse_robots(text: str) -> Tuple[List[str], List[str]]:
+    """Sitemap URLs and literal Allow/Disallow paths listed in a robots.txt"""
+    sitemaps, paths = [], []
+    for line in text.splitlines():
+        key, _, value = line.split('#', 1)[0].partition(':')
+        key, value = key.strip().lower(), value.strip()
+        if not value:
+            continue
+        if key == 'sitemap':
+            sitemaps.append(value)
+        elif key in ('allow', 'disallow') and value.startswith('/') and not any(c in value for c in '*$'):
+            paths.append(value)
+    return sitemaps, paths
+
+
+class SitemapSeeder:
+    """Feeds a crawler with the URLs a site advertises about itself.
+
+    robots.txt is read for Sitemap lines and for the paths it asks crawlers
+    to avoid, which are often the interesting ones. Sitemaps and sitemap
+    indexes are decompressed and parsed while they download and every
+    element is cleared once read, so a sitemap with millions of entries
+    costs no more memory than a small one. URLs go through the crawler's
+    normal seed path, which deduplicates them against its seen-set, at no
+    more than WEB_SITEMAP_SEED_RATE per second and only while the frontier
+    is less than half full.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, crawler: WebCrawler):
+        self.session = session
+        self.crawler = crawler
+        self.rate = settings.WEB_SITEMAP_SEED_RATE
+        self._next_push = 0.0
+        self.stats = {
+            'robots_paths': 0,
+            'sitemaps_read': 0,
+            'sitemap_errors': 0,
+            'urls_listed': 0,
+            'urls_seeded': 0,
+            'urls_skipped': 0,
+        }
+
+    async def run(self, base_url: str) -> None:
+        """Seed the crawler from base_url's robots.txt and sitemaps until they are exhausted"""
+        self.crawler.frontier.hold()
+        try:
+            await self._seed(base_url)
+        finally:
+            self.crawler.frontier.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+    async def _seed(self, base_url: str) -> None:
+        sitemaps, paths = await self._read_robots(urljoin(base_url, '/robots.txt'))
+        for path in paths:
+            self.stats['robots_paths'] += 1
+            await self._push(urljoin(base_url, path))
+
+        pending = deque(sitemaps or [urljoin(base_url, '/sitemap.xml')])
+        fetched = set()
+        while pending and len(fetched) < settings.WEB_SITEMAP_MAX_DOCUMENTS and not self._crawl_full():
+            url = normalize_url(pending.popleft())
+            if not url or url in fetched or url not in self.crawler.scope:
+                continue
+            fetched.add(url)
+            try:
+                async with aclosing(self._read_sitemap(url)) as entries:
+                    async for kind, loc in entries:
+                        if kind == 'sitemap':
+                            pending.append(loc)
+                        else:
+                            self.stats['urls_listed'] += 1
+                            await self._push(loc)
+                            if self._crawl_full():
+                                break
+                self.stats['sitemaps_read'] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError, ParseError, zlib.error):
+                self.stats['sitemap_errors'] += 1
+
+    async def _read_robots(self, url: str) -> Tuple[List[str], List[str]]:
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    return [], []
+                return parse_robots(await read_body_limited(response, ROBOTS_MAX_BYTES))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return [], []
+
+    async def _read_sitemap(self, url: str) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ('sitemap' | 'url', loc) for each entry, gzip-compressed or not"""
+        parser = XMLPullParser(events=('start', 'end'))
+        decompressor = None
+        sniffed = False
+        root = None
+        index = False
+        remaining = settings.WEB_SITEMAP_MAX_BYTES
+
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                return
+            async for chunk in response.content.iter_chunked(settings.RESPONSE_CHUNK_SIZE):
+                if not sniffed:
+                    sniffed = True
+                    if chunk.startswith(GZIP_MAGIC):
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                while chunk and remaining > 0:
+                    if decompressor:
+                        data = decompressor.decompress(chunk, min(remaining, settings.RESPONSE_CHUNK_SIZE))
+                        chunk = decompressor.unconsumed_tail
+                    else:
+                        data, chunk = chunk[:remaining], b''
+                    remaining -= len(data)
+                    parser.feed(data)
+
+                    for event, element in parser.read_events():
+                        tag = element.tag.rsplit('}', 1)[-1]
+                        if event == 'start':
+                            if root is None:
+                                root, index = element, tag == 'sitemapindex'
+                            continue
+                        if tag == 'loc' and element.text and element.text.strip():
+                            yield ('sitemap' if index else 'url'), element.text.strip()
+                        elif tag in ('url', 'sitemap'):
+                            # Drop finished entries so the tree never grows
+                            root.clear()
+                if remaining <= 0:
+                    break
+
+    async def _push(self, url: str) -> None:
+        frontier = self.crawler.frontier
+        while len(frontier) >= frontier.max_size // 2 and not self._crawl_full():
+            await asyncio.sleep(0.1)
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._next_push = max(self._next_push, now) + 1.0 / self.rate
+        delay = self._next_push - now
+        # Always yield, a fast sitemap would otherwise starve the crawl workers
+        await asyncio.sleep(delay if delay > 0.05 else 0)
+
+        # Sitemap entries count as one hop from the target
+        if self.crawler.add_seed(url, depth=1):
+            self.stats['urls_seeded'] += 1
+        else:
+            self.stats['urls_skipped'] += 1
+
+    def _crawl_full(self) -> bool:
+        return self.crawler.stats['pages_fetched'] >= self.crawler.max_pages
@@ -1,5 +1,5 @@
 from app.core.databases.vulnerability_db import VulnerabilityDatabase
-from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
 from typing import Dict, Any, List
 import re
 import os
@@ -9,7 +9,7 @@ from pathlib import Path
 class SourceCodeScanner:
     def __init__(self):
         self.vuln_db = VulnerabilityDatabase()
-        self.ai_detector = VulnerabilityDetector()
+        self.ai_detector = get_vulnerability_detector()
         self.vulnerability_patterns = {
             'sql_injection': {
                 'pattern': r'execute\s*\(\s*[\'"][^\']*\%s.*[\'"]\s*\)|raw_input\s*\(\s*.*\s*\)|input\s*\(\s*.*\s*\)',
@@ -57,7 +57,7 @@ class SourceCodeScanner:
         vulnerabilities = []
         try:
             if os.path.isfile(code_path):
-                await self._scan_file(code_path, vulnerabilities)
+                await self._scan_file(code_path, vulnerabilities, language)
             elif os.path.isdir(code_path):
                 await self._scan_directory(code_path, vulnerabilities)
 
@@ -73,7 +73,7 @@ class SourceCodeScanner:
         except Exception as e:
             return {'error': str(e), 'vulnerabilities': []}
 
-    async def _scan_file(self, file_path: str, vulnerabilities: List[Dict[str, Any]]):
+    async def _scan_file(self, file_path: str, vulnerabilities: List[Dict[str, Any]], language: str = None):
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -89,6 +89,14 @@ class SourceCodeScanner:
                         'line': line_number,
                         'code': match.group(0)
                     })
+
+            # AI findings per window of lines, so large files still get a location
+            ai_vulns = await self.ai_detector.analyze_source_code_vulnerabilities(
+                content, language or 'unknown', windowed=True
+            )
+            for vuln in ai_vulns:
+                vuln.update(file=file_path, line=vuln['start_line'])
+            vulnerabilities.extend(ai_vulns)
         except Exception as e:
             vulnerabilities.append({
                 'type': 'scan_error',
@@ -116,6 +124,6 @@ class SourceCodeScanner:
                 for lang, exts in language_extensions.items():
                     if file_ext in exts:
                         file_path = os.path.join(root, file)
-                        await self._scan_file(file_path, vulnerabilities)
+                        await self._scan_file(file_path, vulnerabilities, lang)
                         await self._analyze_language_specific(file_path, lang, vulnerabilities)
                         break
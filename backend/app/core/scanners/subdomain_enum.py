@@ -0,0 +1,137 @@
+"""Subdomain discovery from a wordlist and certificate SANs"""
+import asyncio
+import secrets
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.core.config import settings
+from app.core.utils.dns_resolver import DNSResolver
+from app.core.utils.tls_probe import TLSProbe
+
+DEFAULT_WORDLIST = (
+    'www', 'api', 'app', 'admin', 'portal', 'dev', 'develop', 'staging', 'stage', 'test', 'qa', 'uat',
+    'beta', 'demo', 'sandbox', 'internal', 'intranet', 'vpn', 'remote', 'mail', 'webmail', 'smtp',
+    'auth', 'login', 'sso', 'id', 'accounts', 'dashboard', 'console', 'manage', 'cms', 'blog', 'shop',
+    'store', 'pay', 'payments', 'billing', 'docs', 'help', 'support', 'status', 'static', 'assets',
+    'cdn', 'media', 'img', 'images', 'files', 'upload', 'download', 'm', 'mobile', 'graphql', 'gateway',
+    'git', 'gitlab', 'jenkins', 'ci', 'jira', 'wiki', 'grafana', 'kibana', 'monitor', 'metrics',
+    'db', 'backup', 'old', 'legacy', 'v1', 'v2', 'partner', 'partners', 'ftp', 'ns1', 'ns2',
+)
+
+BATCH_SIZE = 500
+SAN_ROUNDS = 2
+
+HostHandler = Callable[[str, List[str]], None]
+
+
+class SubdomainEnumerator:
+    """Finds live subdomains of a domain.
+
+    Candidates come from the wordlist (DEFAULT_WORDLIST, or one name per
+    line from SUBDOMAIN_WORDLIST_PATH) and from the subject alternative
+    names of certificates served by the domain and by every subdomain found,
+    for up to SAN_ROUNDS rounds. Names are resolved in batches through the
+    caching resolver; when the domain has a wildcard record, wordlist names
+    that only resolve to the wildcard addresses are discarded.
+    """
+
+    def __init__(self, resolver: DNSResolver, tls_probe: Optional[TLSProbe] = None,
+                 wordlist: Optional[Iterable[str]] = None, tls_port: int = 443):
+        self.resolver = resolver
+        self.tls_probe = tls_probe
+        self.wordlist = wordlist
+        self.tls_port = tls_port
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'candidates': 0, 'resolved': 0, 'wildcard_filtered': 0,
+                      'san_names': 0, 'certificates_read': 0}
+
+    async def run(self, domain: str, on_host: Optional[HostHandler] = None) -> Dict[str, Dict[str, Any]]:
+        """Resolve every candidate of domain, calling on_host(name, addresses) for each live one"""
+        domain = domain.lower().rstrip('.')
+        wildcard = set()
+        for addresses in (await self.resolver.resolve_many(
+                f'{secrets.token_hex(8)}.{domain}' for _ in range(2))).values():
+            wildcard.update(addresses)
+
+        tried: Set[str] = set()
+        certified = [domain]
+        for names in self._batches(self._wordlist_names(domain)):
+            await self._resolve(names, 'wordlist', wildcard, tried, on_host)
+
+        for _ in range(SAN_ROUNDS):
+            san_names = await self._harvest_sans(domain, certified)
+            if not san_names:
+                break
+            before = set(self.hosts)
+            for names in self._batches(iter(san_names)):
+                await self._resolve(names, 'certificate', set(), tried, on_host)
+            certified = [name for name in self.hosts if name not in before]
+        return self.hosts
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'live_hosts': len(self.hosts), 'resolver': self.resolver.get_stats()}
+
+    def _wordlist_names(self, domain: str) -> Iterator[str]:
+        yield domain
+        for word in self._words():
+            word = word.strip().lower().strip('.')
+            if word and not word.startswith('#'):
+                yield f'{word}.{domain}'
+
+    def _words(self) -> Iterator[str]:
+        if self.wordlist is not None:
+            yield from self.wordlist
+        elif settings.SUBDOMAIN_WORDLIST_PATH:
+            with open(settings.SUBDOMAIN_WORDLIST_PATH) as f:
+                yield from f
+        else:
+            yield from DEFAULT_WORDLIST
+
+    @staticmethod
+    def _batches(names: Iterator[str]) -> Iterator[List[str]]:
+        while True:
+            batch = list(islice(names, BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    async def _resolve(self, names: List[str], source: str, wildcard: Set[str], tried: Set[str],
+                       on_host: Optional[HostHandler]) -> None:
+        names = [name for name in names if name not in tried]
+        tried.update(names)
+        self.stats['candidates'] += len(names)
+        for name, addresses in (await self.resolver.resolve_many(names)).items():
+            if not addresses:
+                continue
+            if wildcard and set(addresses) <= wildcard:
+                self.stats['wildcard_filtered'] += 1
+                continue
+            self.stats['resolved'] += 1
+            self.hosts[name] = {'addresses': addresses, 'source': source}
+            if on_host:
+                on_host(name, addresses)
+
+    async def _harvest_sans(self, domain: str, names: List[str]) -> List[str]:
+        """Subdomains of domain named in the certificates of names"""
+        if self.tls_probe is None:
+            return []
+        targets = [(name, self.hosts[name]['addresses'][0]) for name in names if name in self.hosts]
+        # Only the names are needed: one handshake per host, not a full probe
+        certificates = await asyncio.gather(*(
+            self.tls_probe.certificate(address, self.tls_port, server_name=name) for name, address in targets
+        ))
+
+        found = []
+        for certificate in certificates:
+            if not certificate:
+                continue
+            self.stats['certificates_read'] += 1
+            for name in certificate['names']:
+                name = name.lower().rstrip('.')
+                if name.startswith('*.'):
+                    name = name[2:]
+                if name not in self.hosts and (name == domain or name.endswith(f'.{domain}')):
+                    found.append(name)
+        found = list(dict.fromkeys(found))
+        self.stats['san_names'] += len(found)
+        return found
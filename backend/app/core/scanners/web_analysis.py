@@ -0,0 +1,274 @@
+"""Passive analysis of crawled pages, run off the crawler's event loop"""
+import asyncio
+import hashlib
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from app.core.config import settings
+from app.core.utils.http_cache import HTTPCache
+
+SECURITY_HEADERS = {
+    'Strict-Transport-Security': 'medium',
+    'Content-Security-Policy': 'medium',
+    'X-Content-Type-Options': 'low',
+    'X-Frame-Options': 'medium',
+    'Referrer-Policy': 'low',
+}
+
+# Response headers the passive checks read, besides Set-Cookie
+ANALYZED_HEADERS = frozenset({'content-type', 'server', *(header.lower() for header in SECURITY_HEADERS)})
+
+CSRF_FIELD_NAMES = ('csrf', 'xsrf', '_token', 'authenticity_token', '__requestverificationtoken', 'nonce')
+
+
+class ResponseSnapshot(NamedTuple):
+    """What the analysis stage gets to see of a fetched page; picklable for process pools"""
+    url: str
+    status: int
+    headers: Tuple[Tuple[str, str], ...]
+    body: bytes
+    forms: Tuple[Dict[str, Any], ...] = ()
+    scripts: Tuple[Dict[str, Any], ...] = ()
+
+
+def analyze_snapshot(snapshot: ResponseSnapshot) -> List[Dict[str, Any]]:
+    """Run every passive check on one page"""
+    findings = []
+    parts = urlsplit(snapshot.url)
+    headers = {}
+    cookies = []
+    for name, value in snapshot.headers:
+        headers[name.lower()] = value
+        if name.lower() == 'set-cookie':
+            cookies.append(value)
+    is_html = 'html' in headers.get('content-type', '').lower()
+
+    findings.extend(_check_headers(snapshot.url, parts.scheme, headers, is_html))
+    findings.extend(_check_cookies(snapshot.url, parts.scheme, cookies))
+
+    if snapshot.status >= 500 and any(
+            marker in snapshot.body[:65536].lower() for marker in (b'traceback', b'stack trace', b'exception')):
+        findings.append(_finding('error_exposure', 'medium', snapshot.url, parts.path,
+                                 'Detailed error information exposed'))
+
+    findings.extend(_check_forms(snapshot.url, parts.scheme, snapshot.forms))
+    findings.extend(_check_inline_scripts(snapshot.url, headers, snapshot.scripts))
+    if is_html:
+        findings.extend(_check_reflection(snapshot.url, parts.query, snapshot.body.decode('utf-8', 'replace')))
+
+    return findings
+
+
+def _finding(vuln_type: str, severity: str, url: str, detail: str, description: str) -> Dict[str, Any]:
+    return {
+        'type': vuln_type,
+        'severity': severity,
+        'host': urlsplit(url).hostname,
+        'detail': detail,
+        'description': description,
+        'location': url
+    }
+
+
+def _check_headers(url: str, scheme: str, headers: Dict[str, str], is_html: bool) -> List[Dict[str, Any]]:
+    findings = []
+    if is_html:
+        for header, severity in SECURITY_HEADERS.items():
+            if header == 'Strict-Transport-Security' and scheme != 'https':
+                continue
+            if header.lower() not in headers:
+                findings.append(_finding('missing_security_header', severity, url, header, f'Missing {header} header'))
+
+    server = headers.get('server', '')
+    if any(char.isdigit() for char in server):
+        findings.append(_finding('server_version_disclosure', 'low', url, server,
+                                 f'Server header discloses version information: {server}'))
+    return findings
+
+
+def _check_cookies(url: str, scheme: str, raw_cookies: List[str]) -> List[Dict[str, Any]]:
+    findings = []
+    for raw_cookie in raw_cookies:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(raw_cookie)
+        except Exception:
+            continue
+        for name, morsel in cookie.items():
+            missing = [flag for flag, present in (
+                ('Secure', morsel['secure'] or scheme != 'https'),
+                ('HttpOnly', morsel['httponly']),
+                ('SameSite', morsel['samesite'])
+            ) if not present]
+            if missing:
+                findings.append(_finding('insecure_cookie', 'medium', url, name,
+                                         f"Cookie '{name}' is missing the {', '.join(missing)} attribute(s)"))
+    return findings
+
+
+def _check_forms(url: str, scheme: str, forms: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    findings = []
+    for form in forms:
+        action = form['action'] or urlsplit(url).path
+        names = [i['name'].lower() for i in form['inputs']]
+        has_password = any(i['type'] == 'password' for i in form['inputs'])
+
+        if form['method'] == 'post' and not any(token in name for name in names for token in CSRF_FIELD_NAMES):
+            findings.append(_finding('missing_csrf_token', 'medium', url, action,
+                                     f"POST form to '{action}' has no anti-CSRF token field"))
+        if has_password and (scheme != 'https' or form['action'].startswith('http://')):
+            findings.append(_finding('cleartext_password_form', 'high', url, action,
+                                     f"Password form submits to '{action}' over unencrypted HTTP"))
+        if has_password and form['method'] == 'get':
+            findings.append(_finding('password_in_query', 'medium', url, action,
+                                     f"Password form to '{action}' uses GET, exposing credentials in URLs"))
+    return findings
+
+
+def _check_inline_scripts(url: str, headers: Dict[str, str],
+                          scripts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    inline = [script for script in scripts if script['inline'] and script['length']]
+    policy = headers.get('content-security-policy', '').lower()
+    if not inline or 'unsafe-inline' not in policy:
+        return []
+    return [_finding('csp_allows_inline_script', 'low', url, 'unsafe-inline',
+                     f"Content-Security-Policy allows 'unsafe-inline' and the page runs "
+                     f"{len(inline)} inline script(s), starting at line {inline[0]['line']}")]
+
+
+def _check_reflection(url: str, query: str, text: str) -> List[Dict[str, Any]]:
+    findings = []
+    for name, value in parse_qsl(query):
+        # Short values reflect by coincidence far too often
+        if len(value) >= 4 and value in text:
+            findings.append(_finding('reflected_input', 'low', url, name,
+                                     f"Query parameter '{name}' is reflected unencoded in the response"))
+    return findings
+
+
+class AnalysisPipeline:
+    """Bounded queue between page fetchers and a pool of analysis workers.
+
+    Fetchers await submit(); when the queue is full they wait, which slows
+    the crawl down to the speed of analysis instead of buffering pages
+    without limit. Workers run analyze_snapshot in an executor, threads by
+    default or processes when WEB_ANALYSIS_EXECUTOR is "process", so the
+    number of passive checks does not weigh on the fetch loop. With an
+    http_cache, findings are stored against the page digest and headers and
+    reused without analysis while both are unchanged.
+    """
+
+    def __init__(self, on_findings: Callable[[List[Dict[str, Any]]], None],
+                 executor: Optional[Executor] = None, workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, http_cache: Optional[HTTPCache] = None):
+        self.on_findings = on_findings
+        self.http_cache = http_cache
+        self.executor = executor or create_analysis_executor()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.WEB_ANALYSIS_QUEUE_SIZE)
+        self.worker_count = workers or settings.WEB_ANALYSIS_WORKERS
+        self._workers: List[asyncio.Task] = []
+        # URLs submitted but not analysed yet, which a checkpoint has to fetch again
+        self.pending: Dict[str, None] = {}
+        self.stats = {'submitted': 0, 'analyzed': 0, 'reused': 0, 'failed': 0, 'backpressure_waits': 0,
+                      'analysis_time': 0.0}
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def submit(self, url: str, status: int, headers, body: bytes,
+                     page: Optional[Dict[str, Any]] = None) -> None:
+        page = page or {}
+        snapshot = ResponseSnapshot(
+            url=url,
+            status=status,
+            headers=tuple((k, v) for k, v in headers.items()),
+            body=body[:settings.WEB_ANALYSIS_BODY_BYTES],
+            forms=tuple(page.get('forms', ())),
+            scripts=tuple(page.get('scripts', ()))
+        )
+        self.stats['submitted'] += 1
+        result_key = None
+        if self.http_cache and page.get('digest'):
+            result_key = _result_key(snapshot, page['digest'])
+            findings = await self.http_cache.get_result(url, 'web_passive', result_key)
+            if findings is not None:
+                self.stats['reused'] += 1
+                if findings:
+                    self.on_findings(findings)
+                return
+
+        if self.queue.full():
+            self.stats['backpressure_waits'] += 1
+        self.pending[url] = None
+        await self.queue.put((snapshot, result_key))
+
+    async def close(self) -> None:
+        """Wait for every submitted page to be analysed, then stop the workers"""
+        await self.queue.join()
+        await self.stop()
+
+    async def stop(self) -> None:
+        """Stop the workers without waiting for queued pages"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'queued': self.queue.qsize(), 'analysis_time': round(self.stats['analysis_time'], 3)}
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            snapshot, result_key = await self.queue.get()
+            start = time.perf_counter()
+            try:
+                findings = await loop.run_in_executor(self.executor, analyze_snapshot, snapshot)
+                self.stats['analyzed'] += 1
+                if result_key:
+                    self.http_cache.set_result(snapshot.url, 'web_passive', result_key, findings)
+                if findings:
+                    self.on_findings(findings)
+            except Exception:
+                self.stats['failed'] += 1
+            finally:
+                self.pending.pop(snapshot.url, None)
+                self.stats['analysis_time'] += time.perf_counter() - start
+                self.queue.task_done()
+
+
+def _result_key(snapshot: ResponseSnapshot, digest: str) -> str:
+    """Passive checks look at the status and some headers as well as the body.
+
+    Only what the checks read goes into the key: volatile headers such as
+    Date or Age, and cookie values and expiry dates, would otherwise make
+    every response of an unchanged page look new.
+    """
+    key = hashlib.sha256(f'{digest}:{snapshot.status}'.encode())
+    for name, value in sorted((name.lower(), value) for name, value in snapshot.headers):
+        if name == 'set-cookie':
+            for cookie_name, flags in sorted(_cookie_flags(value)):
+                key.update(f'\n{name}:{cookie_name}:{flags}'.encode())
+        elif name in ANALYZED_HEADERS:
+            key.update(f'\n{name}:{value}'.encode())
+    return key.hexdigest()
+
+
+def _cookie_flags(raw_cookie: str) -> List[Tuple[str, str]]:
+    """The attributes of a Set-Cookie header that _check_cookies looks at"""
+    cookie = SimpleCookie()
+    try:
+        cookie.load(raw_cookie)
+    except Exception:
+        return []
+    return [(name, f"{bool(morsel['secure'])},{bool(morsel['httponly'])},{morsel['samesite']}")
+            for name, morsel in cookie.items()]
+
+
+def create_analysis_executor() -> Executor:
+    if settings.WEB_ANALYSIS_EXECUTOR == 'process':
+        return ProcessPoolExecutor(max_workers=settings.WEB_ANALYSIS_WORKERS)
+    return ThreadPoolExecutor(max_workers=settings.WEB_ANALYSIS_WORKERS, thread_name_prefix='web-analysis')
@@ -0,0 +1,400 @@
+"""Asynchronous crawl engine used by the web scanner"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import math
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+from app.core.config import settings
+from app.core.scanners.html_extractor import StreamingHTMLExtractor
+from app.core.utils.body_inspector import iter_body_chunks
+from app.core.utils.http_cache import HTTPCache
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Pages with more links than this are not cached, recording them would cost more than refetching
+MAX_RECORDED_LINKS = 5000
+
+# Links to these are never fetched, they cannot contain further pages
+SKIPPED_EXTENSIONS = re.compile(
+    r'\.(?:png|jpe?g|gif|svg|ico|webp|bmp|css|woff2?|ttf|eot|otf|mp[34]|avi|mov|webm|pdf|zip|gz|tar|rar|7z|exe|dmg|iso)$',
+    re.IGNORECASE
+)
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Canonical form of a URL so equivalent spellings are crawled once.
+
+    Resolves it against base, lowercases scheme and host, drops default
+    ports and fragments, resolves dot segments and sorts query parameters.
+    Parameters with empty values are kept: an application may treat ?q=
+    differently from no q at all. Returns None for anything that is not
+    http(s).
+    """
+    if base:
+        url = urljoin(base, url.strip())
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower().rstrip('.')
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+
+    segments = []
+    for segment in parts.path.split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    path = '/'.join(segments) or '/'
+    if not path.startswith('/'):
+        path = '/' + path
+
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set for URLs already seen.
+
+    A million URLs at a 0.1% false-positive rate take under 2 MB, against
+    well over 100 MB for a set of strings. A false positive means a page is
+    skipped, never that one is fetched twice.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> bool:
+        """Add item, returning False if it was (probably) already present"""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p // 8] & (1 << (p % 8)) for p in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class CrawlFrontier:
+    """Priority queue of URLs to fetch, deduplicated against a seen-set.
+
+    Lower priority values are fetched first; by default that is the link
+    depth, so the crawl is breadth-first. URLs with query strings get a small
+    penalty so that parameterised listings do not crowd out new paths.
+    """
+
+    def __init__(self, seen: BloomFilter, max_size: int):
+        self.seen = seen
+        self.max_size = max_size
+        self.dropped = 0
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._counter = itertools.count()
+        self._in_progress = 0
+        self._changed = asyncio.Event()
+
+    def push(self, url: str, depth: int, priority: Optional[float] = None) -> bool:
+        if len(self._heap) >= self.max_size:
+            self.dropped += 1
+            return False
+        if not self.seen.add(url):
+            return False
+        if priority is None:
+            priority = depth + (0.5 if '?' in url else 0.0)
+        heapq.heappush(self._heap, (priority, next(self._counter), url, depth))
+        self._changed.set()
+        return True
+
+    def hold(self) -> None:
+        """Register a producer outside the crawl; get() keeps waiting until it calls task_done()"""
+        self._in_progress += 1
+
+    async def get(self) -> Optional[Tuple[str, int]]:
+        """Next (url, depth), or None once the frontier is empty and no fetch or producer is running"""
+        while not self._heap:
+            if self._in_progress == 0:
+                return None
+            self._changed.clear()
+            await self._changed.wait()
+        self._in_progress += 1
+        _, _, url, depth = heapq.heappop(self._heap)
+        return url, depth
+
+    def task_done(self) -> None:
+        self._in_progress -= 1
+        self._changed.set()
+
+    def entries(self) -> List[Tuple[float, str, int]]:
+        """(priority, url, depth) of every queued URL, for checkpoints"""
+        return [(priority, url, depth) for priority, _, url, depth in self._heap]
+
+    def restore(self, entries: Iterable[Tuple[float, str, int]]) -> None:
+        """Queue checkpointed URLs again; they are expected to be in the seen-set already"""
+        for priority, url, depth in entries:
+            heapq.heappush(self._heap, (priority, next(self._counter), url, depth))
+        self._changed.set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class CrawlScope:
+    """Hosts the crawl may visit"""
+
+    def __init__(self, hosts: Iterable[str], include_subdomains: bool = False):
+        self.hosts: Set[str] = {h.lower() for h in hosts}
+        self.include_subdomains = include_subdomains
+
+    def add_host(self, host: str) -> None:
+        self.hosts.add(host.lower())
+
+    def __contains__(self, url: str) -> bool:
+        host = (urlsplit(url).hostname or '').lower()
+        if host in self.hosts:
+            return True
+        return self.include_subdomains and any(host.endswith(f'.{h}') for h in self.hosts)
+
+
+PageHandler = Callable[[str, int, Mapping[str, str], bytes, Optional[Dict[str, Any]]], Awaitable[None]]
+
+
+class WebCrawler:
+    """Concurrent crawler: a pool of workers draining a shared frontier.
+
+    Every fetched page is handed to on_page (url, status, headers, body
+    prefix, HTML summary) for analysis. HTML is parsed while it downloads, up
+    to WEB_HTML_MAX_BYTES, and links are pushed back onto the frontier chunk
+    by chunk while they are within max_depth and the scope; only the first
+    WEB_ANALYSIS_BODY_BYTES of a body are kept. With an http_cache, pages
+    seen by an earlier scan are revalidated, and on a 304 their recorded
+    links and forms are used instead of the body.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, scope: CrawlScope, max_depth: int,
+                 on_page: Optional[PageHandler] = None, concurrency: Optional[int] = None,
+                 max_pages: Optional[int] = None, http_cache: Optional[HTTPCache] = None):
+        self.session = session
+        self.scope = scope
+        self.max_depth = max_depth
+        self.on_page = on_page
+        self.http_cache = http_cache
+        self.concurrency = concurrency or settings.WEB_CRAWL_CONCURRENCY
+        self.max_pages = max_pages or settings.WEB_MAX_PAGES
+        self.seen = BloomFilter(settings.WEB_SEEN_CAPACITY, settings.WEB_SEEN_ERROR_RATE)
+        self.frontier = CrawlFrontier(self.seen, settings.WEB_FRONTIER_MAX_SIZE)
+        self.in_flight: Dict[str, int] = {}
+        self._previous_elapsed = 0.0
+        self.stats: Dict[str, Any] = {
+            'pages_fetched': 0,
+            'bytes_received': 0,
+            'html_bytes_parsed': 0,
+            'truncated_pages': 0,
+            'not_modified': 0,
+            'errors': 0,
+            'max_depth_reached': 0,
+            'started_at': None,
+        }
+
+    def add_seed(self, url: str, depth: int = 0) -> bool:
+        normalized = normalize_url(url)
+        if not normalized or normalized not in self.scope:
+            return False
+        return self.frontier.push(normalized, depth)
+
+    async def run(self) -> None:
+        self.stats['started_at'] = time.time() - self._previous_elapsed
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.wait(workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.stats['started_at'] if self.stats['started_at'] else 0.0
+        return {
+            **self.stats,
+            'queued': len(self.frontier),
+            'seen': len(self.seen),
+            'dropped': self.frontier.dropped,
+            'elapsed': round(elapsed, 2),
+            'pages_per_second': round(self.stats['pages_fetched'] / elapsed, 2) if elapsed else 0.0,
+        }
+
+    def export_state(self, unfinished: Iterable[Tuple[str, int]] = ()) -> Dict[str, Any]:
+        """Everything needed to resume the crawl later.
+
+        URLs being fetched right now, and any unfinished (url, depth) pairs
+        the caller adds, are saved as queued so they are fetched again.
+        """
+        frontier = self.frontier.entries()
+        for url, depth in itertools.chain(self.in_flight.items(), unfinished):
+            frontier.append((float(depth), url, depth))
+        return {
+            'frontier': frontier,
+            'seen_bits': bytes(self.seen.bits),
+            'seen_count': self.seen.count,
+            'stats': {key: value for key, value in self.stats.items() if key != 'started_at'},
+            'elapsed': self.get_stats()['elapsed'],
+            'saved_at': time.time(),
+        }
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """Continue from a state saved by export_state instead of seeding"""
+        if len(state['seen_bits']) == len(self.seen.bits):
+            self.seen.bits = bytearray(state['seen_bits'])
+            self.seen.count = state['seen_count']
+        else:
+            # The seen-set was resized since the checkpoint; visited pages may be fetched again
+            for _, url, _ in state['frontier']:
+                self.seen.add(url)
+        self.frontier.restore(state['frontier'])
+        self.stats.update(state['stats'])
+        self._previous_elapsed = state['elapsed']
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self.frontier.get()
+            if item is None:
+                return
+            url, depth = item
+            self.in_flight[url] = depth
+            try:
+                if self.stats['pages_fetched'] < self.max_pages:
+                    await self._fetch(url, depth)
+            except Exception:
+                self.stats['errors'] += 1
+            finally:
+                self.frontier.task_done()
+            # Not reached when cancelled, so a checkpoint taken on shutdown still lists the URL
+            del self.in_flight[url]
+
+    async def _fetch(self, url: str, depth: int) -> None:
+        cached = await self.http_cache.lookup(url) if self.http_cache else None
+        # Only pages whose links were recorded can be skipped, or the crawl would lose its edges
+        request_headers = self.http_cache.conditional_headers(cached) if cached and 'page' in cached['results'] else {}
+        keep = settings.WEB_ANALYSIS_BODY_BYTES
+        prefix = bytearray()
+        digest = hashlib.sha256()
+        received = 0
+        extractor = None
+        links: Optional[List[str]] = []
+
+        async with self.session.get(url, allow_redirects=False, headers=request_headers) as response:
+            if response.status == 304 and request_headers:
+                self.http_cache.not_modified(cached)
+                await self._replay(url, depth, cached)
+                return
+
+            headers = response.headers.copy()
+            status = response.status
+            if 'html' in headers.get('Content-Type', '').lower():
+                extractor = StreamingHTMLExtractor(response.charset)
+            max_bytes = settings.WEB_HTML_MAX_BYTES if extractor else keep
+
+            async for chunk in iter_body_chunks(response, max_bytes):
+                received += len(chunk)
+                digest.update(chunk)
+                if len(prefix) < keep:
+                    prefix += chunk[:keep - len(prefix)]
+                if extractor:
+                    extractor.feed_bytes(chunk)
+                    links = self._follow(url, depth, extractor, links)
+            if received >= max_bytes and not response.content.at_eof():
+                self.stats['truncated_pages'] += 1
+
+        self.stats['pages_fetched'] += 1
+        self.stats['bytes_received'] += received
+        self.stats['max_depth_reached'] = max(self.stats['max_depth_reached'], depth)
+
+        page = {'forms': [], 'scripts': [], 'links': 0, 'digest': digest.hexdigest()}
+        if extractor:
+            extractor.close()
+            self.stats['html_bytes_parsed'] += extractor.bytes_parsed
+            links = self._follow(url, depth, extractor, links)
+            page.update(forms=extractor.forms, scripts=extractor.scripts, links=extractor.links_found)
+        if status in (301, 302, 303, 307, 308) and headers.get('Location'):
+            links = self._follow_links(url, depth, [headers['Location']], links)
+
+        if self.http_cache and status == 200 and links is not None and \
+                self.http_cache.store(url, status, headers.items(), page['digest'], received):
+            self.http_cache.set_result(url, 'page', page['digest'], {
+                'links': links, 'forms': page['forms'], 'scripts': page['scripts'], 'link_count': page['links']
+            })
+
+        if self.on_page:
+            await self.on_page(url, status, headers, bytes(prefix), page)
+
+    async def _replay(self, url: str, depth: int, cached: Dict[str, Any]) -> None:
+        """Treat an unchanged page as fetched, using what was recorded the last time"""
+        recorded = cached['results']['page']['value']
+        self.stats['pages_fetched'] += 1
+        self.stats['not_modified'] += 1
+        self.stats['max_depth_reached'] = max(self.stats['max_depth_reached'], depth)
+        # Links were recorded under the scope of the scan that fetched the page, which may be wider
+        self._follow_links(url, depth, recorded['links'], None)
+
+        if self.on_page:
+            page = {'forms': recorded['forms'], 'scripts': recorded['scripts'], 'links': recorded['link_count'],
+                    'digest': cached['digest'], 'not_modified': True}
+            await self.on_page(url, cached['status'], CIMultiDict(cached['headers']), b'', page)
+
+    def _follow(self, url: str, depth: int, extractor: StreamingHTMLExtractor,
+                links: Optional[List[str]]) -> Optional[List[str]]:
+        return self._follow_links(self._link_base(url, extractor), depth, extractor.pop_links(), links)
+
+    def _follow_links(self, base: str, depth: int, found: Iterable[str],
+                      links: Optional[List[str]]) -> Optional[List[str]]:
+        """Queue in-scope links and record them for the cache, until there are too many to record"""
+        for link in self._resolve_links(base, found):
+            if depth < self.max_depth:
+                self.frontier.push(link, depth + 1)
+            if links is not None:
+                links.append(link)
+                if len(links) > MAX_RECORDED_LINKS:
+                    links = None
+        return links
+
+    @staticmethod
+    def _link_base(url: str, extractor: StreamingHTMLExtractor) -> str:
+        return urljoin(url, extractor.base_href) if extractor.base_href else url
+
+    def _resolve_links(self, base: str, links: Iterable[str]) -> Iterator[str]:
+        for link in links:
+            normalized = normalize_url(link, base)
+            if normalized and normalized in self.scope and not SKIPPED_EXTENSIONS.search(urlsplit(normalized).path):
+                yield normalized
@@ -1,42 +1,267 @@
+import asyncio
 import uuid
 from datetime import datetime
-from typing import Dict, Any, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.databases.crawl_checkpoint import CrawlCheckpointStore
+from app.core.databases.scan_state import ScanStateStore
+from app.core.scanners.sitemap_seeder import SitemapSeeder
+from app.core.scanners.subdomain_enum import SubdomainEnumerator
+from app.core.scanners.web_analysis import AnalysisPipeline, create_analysis_executor
+from app.core.scanners.web_crawler import CrawlScope, WebCrawler
+from app.core.utils.dns_resolver import DNSResolver
+from app.core.utils.http_cache import get_http_cache
+from app.core.utils.tls_probe import TLSProbe, tls_findings
+
+SCAN_DEPTHS = {'quick': 1, 'normal': settings.MAX_SCAN_DEPTH, 'deep': settings.MAX_SCAN_DEPTH * 2}
+
 
 class WebScanner:
-    def __init__(self):
-        self.scans = {}
+    def __init__(self, checkpoints: Optional[CrawlCheckpointStore] = None, store: Optional[ScanStateStore] = None):
+        self.scans = store or ScanStateStore('web')
+        self.checkpoints = checkpoints or CrawlCheckpointStore()
+        self._crawlers: Dict[str, WebCrawler] = {}
+        self._pipelines: Dict[str, AnalysisPipeline] = {}
+        self._seeders: Dict[str, SitemapSeeder] = {}
+        self._enumerators: Dict[str, SubdomainEnumerator] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._analysis_executor: Optional[Executor] = None
+        # The checkpoint store's SQLite connection must stay on one thread
+        self._checkpoint_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='web-checkpoint')
+        self._checkpointed_findings: Dict[str, int] = {}
 
     async def start_scan(self, target_url: str, options: Optional[Dict[str, Any]] = None) -> str:
         scan_id = str(uuid.uuid4())
-        self.scans[scan_id] = {
+        if not target_url.startswith(('http://', 'https://')):
+            target_url = f'https://{target_url}'
+
+        self.scans.add({
             'id': scan_id,
             'target_url': target_url,
             'status': 'running',
             'start_time': datetime.utcnow().isoformat(),
             'findings': [],
             'options': options or {}
-        }
-
-        # Simulate finding some vulnerabilities
-        self.scans[scan_id]['findings'] = [
-            {
-                'type': 'XSS',
-                'severity': 'high',
-                'description': 'Potential Cross-Site Scripting vulnerability found',
-                'location': f'{target_url}/search?q=test'
-            },
-            {
-                'type': 'SQL Injection',
-                'severity': 'critical',
-                'description': 'Possible SQL injection point detected',
-                'location': f'{target_url}/users?id=1'
-            }
-        ]
-
-        self.scans[scan_id]['status'] = 'completed'
+        })
+        self._tasks[scan_id] = asyncio.create_task(self._run_scan(scan_id))
         return scan_id
 
     async def get_scan_status(self, scan_id: str) -> Dict[str, Any]:
-        if scan_id not in self.scans:
+        scan = await self.scans.get(scan_id)
+        if scan is None:
             raise ValueError(f"Scan {scan_id} not found")
-        return self.scans[scan_id]
+        self._refresh_stats(scan_id, scan)
+        return scan
+
+    async def resume_scans(self) -> List[str]:
+        """Restart every scan left running by a previous process from its last checkpoint"""
+        loop = asyncio.get_running_loop()
+        resumed = []
+        for scan_id in await loop.run_in_executor(self._checkpoint_executor, self.checkpoints.list_scans):
+            if scan_id in self.scans:
+                continue
+            checkpoint = await loop.run_in_executor(self._checkpoint_executor, self.checkpoints.load, scan_id)
+            if not checkpoint or checkpoint['record'].get('status') != 'running':
+                continue
+            scan = checkpoint['record']
+            scan['resumed'] = scan.get('resumed', 0) + 1
+            self.scans.add(scan)
+            self._checkpointed_findings[scan_id] = len(scan['findings'])
+            self._tasks[scan_id] = asyncio.create_task(self._run_scan(scan_id, checkpoint['state']))
+            resumed.append(scan_id)
+        return resumed
+
+    def get_store_stats(self) -> Dict[str, Any]:
+        return self.scans.get_stats()
+
+    async def shutdown(self) -> None:
+        """Checkpoint and stop all running scans so the next process can resume them"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_scan(self, scan_id: str, checkpoint: Optional[Dict[str, Any]] = None) -> None:
+        scan = self.scans.peek(scan_id)
+        options = scan['options']
+        target = scan['target_url']
+        seen_findings = {(f['type'], f.get('host'), f.get('detail')) for f in scan['findings']}
+
+        def on_findings(findings: List[Dict[str, Any]]) -> None:
+            for finding in findings:
+                key = (finding['type'], finding.get('host'), finding.get('detail'))
+                if key not in seen_findings:
+                    seen_findings.add(key)
+                    scan['findings'].append(finding)
+
+        if self._analysis_executor is None:
+            self._analysis_executor = create_analysis_executor()
+        http_cache = get_http_cache() if options.get('use_cache', True) else None
+        pipeline = AnalysisPipeline(on_findings, executor=self._analysis_executor, http_cache=http_cache)
+        self._pipelines[scan_id] = pipeline
+        pipeline.start()
+        checkpointer = None
+        finished = True
+
+        try:
+            timeout = aiohttp.ClientTimeout(total=None, sock_read=30)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                crawler = WebCrawler(
+                    session,
+                    # Subdomains found before a restart stay in scope when the scan resumes
+                    CrawlScope([urlsplit(target).hostname, *scan.get('subdomains', {})],
+                               options.get('include_subdomains', False)),
+                    max_depth=self._resolve_depth(options),
+                    on_page=pipeline.submit,
+                    concurrency=options.get('concurrency'),
+                    max_pages=options.get('max_pages'),
+                    http_cache=http_cache
+                )
+                self._crawlers[scan_id] = crawler
+                scan_timeout = options.get('timeout', settings.SCAN_TIMEOUT)
+                if checkpoint:
+                    crawler.restore_state(checkpoint)
+                    scan_timeout = max(scan_timeout - checkpoint['elapsed'], 1)
+                else:
+                    crawler.add_seed(target)
+
+                jobs = [crawler.run()]
+                if options.get('use_sitemaps', True):
+                    seeder = SitemapSeeder(session, crawler)
+                    self._seeders[scan_id] = seeder
+                    # Listed first so the seeder holds the frontier open before any worker can drain it
+                    jobs.insert(0, seeder.run(target))
+                if options.get('include_subdomains', False):
+                    jobs.insert(0, self._discover_subdomains(scan_id, crawler))
+                if urlsplit(target).scheme == 'https' and options.get('check_tls', True):
+                    jobs.append(self._probe_transport(scan, on_findings))
+                if settings.WEB_CHECKPOINT_INTERVAL > 0:
+                    checkpointer = asyncio.create_task(self._checkpoint_loop(scan_id))
+                await asyncio.wait_for(self._gather(jobs), timeout=scan_timeout)
+            await pipeline.close()
+            scan['status'] = 'completed'
+        except asyncio.TimeoutError:
+            await pipeline.close()
+            scan['status'] = 'completed'
+            scan['error'] = 'Scan timed out before the crawl finished'
+        except asyncio.CancelledError:
+            # Shutting down: leave a checkpoint behind so resume_scans can pick the scan up
+            finished = False
+            if scan_id in self._crawlers:
+                await self._checkpoint(scan_id)
+            raise
+        except Exception as e:
+            scan['status'] = 'failed'
+            scan['error'] = str(e)
+        finally:
+            if checkpointer:
+                checkpointer.cancel()
+            crawler = self._crawlers.pop(scan_id, None)
+            if crawler:
+                scan['crawl_stats'] = crawler.get_stats()
+            seeder = self._seeders.pop(scan_id, None)
+            if seeder:
+                scan['seed_stats'] = seeder.get_stats()
+            enumerator = self._enumerators.pop(scan_id, None)
+            if enumerator:
+                scan['subdomain_stats'] = enumerator.get_stats()
+                enumerator.resolver.close()
+            pipeline = self._pipelines.pop(scan_id)
+            await pipeline.stop()
+            scan['analysis_stats'] = pipeline.get_stats()
+            if http_cache:
+                await asyncio.get_running_loop().run_in_executor(None, http_cache.flush)
+            self._tasks.pop(scan_id, None)
+            if finished:
+                scan['end_time'] = datetime.utcnow().isoformat()
+                self._checkpointed_findings.pop(scan_id, None)
+                await asyncio.get_running_loop().run_in_executor(
+                    self._checkpoint_executor, self.checkpoints.delete, scan_id
+                )
+                await self.scans.complete(scan_id)
+
+    def _refresh_stats(self, scan_id: str, scan: Dict[str, Any]) -> None:
+        crawler = self._crawlers.get(scan_id)
+        if crawler:
+            scan['crawl_stats'] = crawler.get_stats()
+        pipeline = self._pipelines.get(scan_id)
+        if pipeline:
+            scan['analysis_stats'] = pipeline.get_stats()
+        seeder = self._seeders.get(scan_id)
+        if seeder:
+            scan['seed_stats'] = seeder.get_stats()
+        enumerator = self._enumerators.get(scan_id)
+        if enumerator:
+            scan['subdomain_stats'] = enumerator.get_stats()
+
+    async def _discover_subdomains(self, scan_id: str, crawler: WebCrawler) -> None:
+        """Seed the crawl with the root of every live subdomain of the target's domain"""
+        scan = self.scans.peek(scan_id)
+        target = urlsplit(scan['target_url'])
+        domain = target.hostname.lower()
+        if domain.startswith('www.'):
+            domain = domain[4:]
+        if '.' not in domain or domain.replace('.', '').isdigit() or ':' in domain:
+            return
+
+        subdomains = scan.setdefault('subdomains', {})
+
+        def on_host(name: str, addresses: List[str]) -> None:
+            subdomains[name] = addresses
+            crawler.scope.add_host(name)
+            crawler.add_seed(f'{target.scheme}://{name}/')
+
+        enumerator = SubdomainEnumerator(DNSResolver(), TLSProbe() if target.scheme == 'https' else None)
+        self._enumerators[scan_id] = enumerator
+        crawler.frontier.hold()
+        try:
+            await enumerator.run(domain, on_host)
+        finally:
+            crawler.frontier.task_done()
+
+    @staticmethod
+    async def _probe_transport(scan: Dict[str, Any], on_findings) -> None:
+        """Check the TLS setup of the target while the crawl runs"""
+        parsed = urlsplit(scan['target_url'])
+        result = await TLSProbe().probe(parsed.hostname, parsed.port or 443)
+        scan['tls'] = {key: result[key] for key in
+                       ('protocol', 'cipher', 'supported_protocols', 'verified', 'certificate', 'error')}
+        on_findings(tls_findings(result))
+
+    @staticmethod
+    async def _gather(jobs: List) -> None:
+        # wait_for on a bare gather() leaves its CancelledError unretrieved when cancelled
+        await asyncio.gather(*jobs)
+
+    async def _checkpoint_loop(self, scan_id: str) -> None:
+        while True:
+            await asyncio.sleep(settings.WEB_CHECKPOINT_INTERVAL)
+            await self._checkpoint(scan_id)
+
+    async def _checkpoint(self, scan_id: str) -> None:
+        scan = self.scans.peek(scan_id)
+        self._refresh_stats(scan_id, scan)
+        crawler = self._crawlers[scan_id]
+        pipeline = self._pipelines[scan_id]
+        # Pages still waiting for analysis are fetched again on resume; their links are already queued
+        state = crawler.export_state((url, crawler.max_depth) for url in pipeline.pending)
+        record = {key: value for key, value in scan.items() if key != 'findings'}
+        record['findings'] = scan['findings'][:]
+        written = self._checkpointed_findings.get(scan_id, 0)
+
+        await asyncio.get_running_loop().run_in_executor(
+            self._checkpoint_executor, self.checkpoints.save, record, state, written
+        )
+        self._checkpointed_findings[scan_id] = len(record['findings'])
+
+    @staticmethod
+    def _resolve_depth(options: Dict[str, Any]) -> int:
+        depth = options.get('max_depth', options.get('scan_depth', settings.MAX_SCAN_DEPTH))
+        if isinstance(depth, str):
+            return SCAN_DEPTHS.get(depth, settings.MAX_SCAN_DEPTH)
+        return int(depth)
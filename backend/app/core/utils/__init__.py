@@ -0,0 +1,9 @@
+from .body_inspector import StreamingPatternMatcher, MatchAggregator, read_body_limited, scan_response
+from .dns_resolver import DNSResolver
+from .http_cache import HTTPCache, get_http_cache
+from .payload_generator import PayloadGenerator
+from .tls_probe import TLSProbe, tls_findings
+
+__all__ = ['StreamingPatternMatcher', 'MatchAggregator', 'read_body_limited', 'scan_response', 'HTTPCache',
+           'get_http_cache', 'TLSProbe', 'tls_findings', 'DNSResolver',
+           'PayloadGenerator']
@@ -0,0 +1,165 @@
+"""Bounded, streaming inspection of HTTP response bodies"""
+import codecs
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app.core.config import settings
+
+
+async def iter_body_chunks(response: aiohttp.ClientResponse, max_bytes: Optional[int] = None,
+                           chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield raw body chunks until the body ends or max_bytes have been read"""
+    max_bytes = settings.MAX_RESPONSE_BODY_BYTES if max_bytes is None else max_bytes
+    chunk_size = chunk_size or settings.RESPONSE_CHUNK_SIZE
+    remaining = max_bytes
+
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if len(chunk) >= remaining:
+            yield chunk[:remaining]
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _incremental_decoder(response: aiohttp.ClientResponse) -> codecs.IncrementalDecoder:
+    try:
+        return codecs.getincrementaldecoder(response.charset or 'utf-8')('replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')('replace')
+
+
+async def read_body_limited(response: aiohttp.ClientResponse, max_bytes: Optional[int] = None) -> str:
+    """Read at most max_bytes of the response body and decode it as text"""
+    decoder = _incremental_decoder(response)
+    parts = [decoder.decode(chunk) async for chunk in iter_body_chunks(response, max_bytes)]
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
+
+_NON_WORD = re.compile(r'\W')
+_LAST_NON_WORD = re.compile(r'\W(?=\w*\Z)')
+
+
+class StreamingPatternMatcher:
+    """Match a fixed set of patterns against text fed in chunks.
+
+    All patterns are compiled into a single alternation with one named group
+    per pattern, so each chunk is scanned once. A short tail of every chunk is
+    carried over so matches spanning chunk boundaries are still found; matches
+    must therefore be shorter than ``overlap`` characters. The tail starts at
+    a non-word character, so ``\b`` never matches inside a token that was
+    cut in two.
+    """
+
+    def __init__(self, patterns: Dict[str, str], flags: int = re.IGNORECASE, overlap: int = 256):
+        self.patterns = patterns
+        self.overlap = overlap
+        self._group_names = {f'p{i}': name for i, name in enumerate(patterns)}
+        self._regex = re.compile(
+            '|'.join(f'(?P<{group}>{patterns[name]})' for group, name in self._group_names.items()),
+            flags
+        )
+
+    def scanner(self) -> 'PatternScan':
+        """Start a new scan over one body"""
+        return PatternScan(self)
+
+    def _finditer(self, text: str):
+        for match in self._regex.finditer(text):
+            yield self._group_names[match.lastgroup], match
+
+
+class PatternScan:
+    """State of a single streaming scan started by StreamingPatternMatcher"""
+
+    def __init__(self, matcher: StreamingPatternMatcher):
+        self._matcher = matcher
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Scan the next chunk and return (pattern name, matched text) pairs"""
+        self._buffer += text
+        safe_end = len(self._buffer) - self._matcher.overlap
+        if safe_end <= 0:
+            return []
+
+        matches = []
+        cut = safe_end
+        scanned = 0
+        pending = False
+        for name, match in self._matcher._finditer(self._buffer):
+            if match.end() > safe_end:
+                # May still grow with the next chunk, rescan it then
+                cut = min(cut, match.start())
+                pending = True
+                break
+            matches.append((name, match.group()))
+            scanned = match.end()
+            cut = max(cut, scanned)
+        self._buffer = self._buffer[self._token_boundary(scanned, cut, pending):]
+        return matches
+
+    def _token_boundary(self, scanned: int, cut: int, pending: bool) -> int:
+        """Where to cut the buffer, at most at cut, so the kept tail does not start inside a token"""
+        separator = _LAST_NON_WORD.search(self._buffer, scanned, cut)
+        if separator:
+            # The separator stays as left context for the next scan
+            return separator.start()
+        if pending:
+            return cut
+        # The overlap falls inside one long token: resume after it rather than in its middle
+        separator = _NON_WORD.search(self._buffer, cut)
+        return separator.start() if separator else cut
+
+    def close(self) -> List[Tuple[str, str]]:
+        """Scan whatever is left in the buffer"""
+        matches = [(name, match.group()) for name, match in self._matcher._finditer(self._buffer)]
+        self._buffer = ''
+        return matches
+
+
+class MatchAggregator:
+    """Collapse individual pattern matches into one record per endpoint and pattern"""
+
+    def __init__(self, max_samples: Optional[int] = None, evidence_length: int = 20):
+        self.max_samples = settings.MAX_EVIDENCE_SAMPLES if max_samples is None else max_samples
+        self.evidence_length = evidence_length
+        self._records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add(self, endpoint: str, pattern: str, evidence: str) -> None:
+        record = self._records.setdefault((endpoint, pattern), {'count': 0, 'samples': []})
+        record['count'] += 1
+        sample = evidence[:self.evidence_length] + '...'  # Truncate for safety
+        if len(record['samples']) < self.max_samples and sample not in record['samples']:
+            record['samples'].append(sample)
+
+    def items(self):
+        for (endpoint, pattern), record in self._records.items():
+            yield endpoint, pattern, record
+
+    def records_for(self, endpoint: str) -> Dict[str, Dict[str, Any]]:
+        """Records of one endpoint by pattern, in a form that can be stored and restored"""
+        return {pattern: record for (url, pattern), record in self._records.items() if url == endpoint}
+
+    def restore(self, endpoint: str, records: Dict[str, Dict[str, Any]]) -> None:
+        for pattern, record in records.items():
+            self._records[(endpoint, pattern)] = {'count': record['count'], 'samples': list(record['samples'])}
+
+
+async def scan_response(response: aiohttp.ClientResponse, matcher: StreamingPatternMatcher,
+                        max_bytes: Optional[int] = None, digest=None) -> AsyncIterator[Tuple[str, str]]:
+    """Stream a response body through matcher, yielding matches as they are found.
+
+    If a hashlib object is given as digest it is updated with the raw bytes read.
+    """
+    decoder = _incremental_decoder(response)
+    scan = matcher.scanner()
+    async for chunk in iter_body_chunks(response, max_bytes):
+        if digest is not None:
+            digest.update(chunk)
+        for match in scan.feed(decoder.decode(chunk)):
+            yield match
+    for match in scan.feed(decoder.decode(b'', final=True)) + scan.close():
+        yield match
@@ -0,0 +1,237 @@
+"""Asynchronous stub DNS resolver with an in-process TTL cache"""
+import asyncio
+import ipaddress
+import random
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+RECORD_TYPES = {'A': 1, 'AAAA': 28}
+SOA = 6
+RCODE_NXDOMAIN = 3
+
+# (nameserver, name, record type) -> (expires at, addresses); an empty list is a cached negative answer.
+# Least recently used first, at most DNS_CACHE_SIZE entries.
+_answer_cache: 'OrderedDict[Tuple[str, str, str], Tuple[float, List[str]]]' = OrderedDict()
+
+
+def _cache_get(key: Tuple[str, str, str]) -> Optional[List[str]]:
+    cached = _answer_cache.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        del _answer_cache[key]
+        return None
+    _answer_cache.move_to_end(key)
+    return cached[1]
+
+
+def _cache_put(key: Tuple[str, str, str], ttl: float, addresses: List[str]) -> None:
+    """Store an answer, dropping the least recently used entries past DNS_CACHE_SIZE"""
+    _answer_cache[key] = (time.monotonic() + ttl, addresses)
+    _answer_cache.move_to_end(key)
+    while len(_answer_cache) > settings.DNS_CACHE_SIZE:
+        _answer_cache.popitem(last=False)
+
+
+class DNSError(Exception):
+    """The nameserver could not answer, as opposed to saying the name does not exist"""
+
+
+class DNSResolver:
+    """Resolves many names concurrently over UDP against one recursive nameserver.
+
+    Answers are cached for their TTL (capped at DNS_MAX_TTL) and NXDOMAIN or
+    empty answers for the zone's negative TTL, in an LRU cache of
+    DNS_CACHE_SIZE entries shared by every resolver in the process. Queries are limited to DNS_CONCURRENCY in
+    flight and DNS_QUERY_RATE per second, lookups of a name already being
+    resolved wait for that query, and all traffic goes through one socket.
+    """
+
+    def __init__(self, nameserver: Optional[str] = None, port: int = 53, timeout: Optional[float] = None,
+                 rate: Optional[float] = None, concurrency: Optional[int] = None):
+        self.nameserver = nameserver or settings.DNS_NAMESERVER or system_nameserver()
+        self.port = port
+        self.timeout = timeout or settings.DNS_TIMEOUT
+        self.rate = rate or settings.DNS_QUERY_RATE
+        self.semaphore = asyncio.Semaphore(concurrency or settings.DNS_CONCURRENCY)
+        self.stats = {'lookups': 0, 'cache_hits': 0, 'negative_hits': 0, 'queries': 0,
+                      'nxdomain': 0, 'timeouts': 0, 'errors': 0}
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._open_lock = asyncio.Lock()
+        self._next_query = 0.0
+
+    async def resolve(self, name: str, record_type: str = 'A') -> List[str]:
+        """Addresses of name; empty if it does not exist or the nameserver gave no answer"""
+        name = name.lower().rstrip('.')
+        self.stats['lookups'] += 1
+        cached = _cache_get((self.nameserver, name, record_type))
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            if not cached:
+                self.stats['negative_hits'] += 1
+            return cached
+
+        key = (name, record_type)
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            try:
+                addresses, ttl = await self._lookup(name, record_type)
+            except (DNSError, UnicodeError):
+                # Not cached: a failure says nothing about the name
+                addresses = []
+            else:
+                _cache_put((self.nameserver, name, record_type), ttl, addresses)
+            future.set_result(addresses)
+            return addresses
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def resolve_many(self, names: Iterable[str], record_type: str = 'A') -> Dict[str, List[str]]:
+        names = list(dict.fromkeys(names))
+        results = await asyncio.gather(*(self.resolve(name, record_type) for name in names))
+        return dict(zip(names, results))
+
+    def close(self) -> None:
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+    async def _lookup(self, name: str, record_type: str) -> Tuple[List[str], float]:
+        query_type = RECORD_TYPES[record_type]
+        for _ in range(settings.DNS_RETRIES + 1):
+            async with self.semaphore:
+                await self._throttle()
+                response = await self._exchange(name, query_type)
+            if response is None:
+                continue
+            try:
+                rcode, addresses, ttl, negative_ttl = parse_response(response, query_type)
+            except (struct.error, IndexError, ValueError):
+                self.stats['errors'] += 1
+                continue
+            if rcode == RCODE_NXDOMAIN or (rcode == 0 and not addresses):
+                if rcode == RCODE_NXDOMAIN:
+                    self.stats['nxdomain'] += 1
+                return [], min(negative_ttl or settings.DNS_NEGATIVE_TTL, settings.DNS_NEGATIVE_TTL)
+            if rcode != 0:
+                self.stats['errors'] += 1
+                raise DNSError(f'{name}: rcode {rcode}')
+            return addresses, min(ttl, settings.DNS_MAX_TTL)
+        raise DNSError(f'{name}: no answer from {self.nameserver}')
+
+    async def _throttle(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(self._next_query, now)
+        self._next_query = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _exchange(self, name: str, query_type: int) -> Optional[bytes]:
+        if self._transport is None:
+            async with self._open_lock:
+                if self._transport is None:
+                    self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                        lambda: _ResolverProtocol(self._pending), remote_addr=(self.nameserver, self.port)
+                    )
+
+        query_id = random.getrandbits(16)
+        while query_id in self._pending:
+            query_id = random.getrandbits(16)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query_id] = future
+        self.stats['queries'] += 1
+        try:
+            self._transport.sendto(build_query(query_id, name, query_type))
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            return None
+        finally:
+            self._pending.pop(query_id, None)
+
+
+class _ResolverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pending: Dict[int, asyncio.Future]):
+        self.pending = pending
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) < 12:
+            return
+        future = self.pending.get(struct.unpack('!H', data[:2])[0])
+        if future and not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable and the like; the queries time out and are retried
+        pass
+
+
+def build_query(query_id: int, name: str, query_type: int) -> bytes:
+    """A recursive query for one name"""
+    question = b''.join(bytes([len(label)]) + label for label in
+                        (part.encode('idna') for part in name.split('.') if part))
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + question + b'\x00' + \
+        struct.pack('!HH', query_type, 1)
+
+
+def parse_response(data: bytes, query_type: int) -> Tuple[int, List[str], float, Optional[float]]:
+    """rcode, addresses of query_type, their smallest TTL and the negative TTL from an SOA, if any"""
+    _, flags, questions, answers, authorities, _ = struct.unpack('!HHHHHH', data[:12])
+    offset = 12
+    for _ in range(questions):
+        offset = _skip_name(data, offset) + 4
+
+    addresses, ttls, negative_ttl = [], [], None
+    for index in range(answers + authorities):
+        offset = _skip_name(data, offset)
+        record_type, _, ttl, length = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + length]
+        if index < answers and record_type == query_type:
+            addresses.append(str(ipaddress.ip_address(rdata)))
+            ttls.append(ttl)
+        elif index >= answers and record_type == SOA:
+            minimum = struct.unpack('!I', data[offset + length - 4:offset + length])[0]
+            negative_ttl = min(ttl, minimum)
+        offset += length
+    return flags & 0x000F, addresses, min(ttls) if ttls else 0, negative_ttl
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def system_nameserver() -> str:
+    """The first nameserver in /etc/resolv.conf, or a public resolver"""
+    try:
+        with open('/etc/resolv.conf') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    return parts[1]
+    except OSError:
+        pass
+    return '8.8.8.8'
@@ -0,0 +1,241 @@
+"""Persistent HTTP revalidation cache shared by the scanners"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+from app.core.config import settings
+from app.core.databases.database import Database
+
+logger = logging.getLogger("vapt.http_cache")
+
+# Seconds to wait for another process's write; the read or write is skipped after that
+BUSY_TIMEOUT = 0.25
+
+
+class HTTPCache(Database):
+    """Validators, body digests and derived check results per URL.
+
+    Only responses carrying an ETag or Last-Modified header are remembered,
+    since nothing else can be revalidated. Bodies are never stored: a
+    response is represented by the digest of its (bounded) body, and checks
+    store whatever they derived from it under a key of their choosing. When
+    a conditional request comes back 304, callers reuse those results
+    instead of downloading and analysing the body again.
+
+    The SQLite file is only touched by one disk thread: reads are awaited
+    from the event loop and writes are queued to it without waiting, each
+    committed on its own. A failing query is logged and counts as a miss.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: Optional[int] = None):
+        """Initialize the cache.
+
+        Args:
+            db_path: Path to the SQLite file, HTTP_CACHE_PATH by default
+            max_entries: URLs kept before the least recently used are pruned
+        """
+        super().__init__(db_path or settings.HTTP_CACHE_PATH)
+        self.max_entries = max_entries or settings.HTTP_CACHE_MAX_ENTRIES
+        self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='http-cache')
+        self.stats = {'lookups': 0, 'revalidated': 0, 'not_modified': 0, 'bytes_saved': 0,
+                      'stored': 0, 'result_hits': 0, 'result_misses': 0, 'errors': 0}
+
+    def connect(self) -> None:
+        """Open the database and create the cache table."""
+        self.connection = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        self.cursor = self.connection.cursor()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # A cache can lose its last writes on power loss; commits then need no fsync
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_table('http_cache', {
+            'url': 'TEXT PRIMARY KEY',
+            'status': 'INTEGER NOT NULL',
+            'headers': 'TEXT NOT NULL',
+            'etag': 'TEXT',
+            'last_modified': 'TEXT',
+            'digest': 'TEXT NOT NULL',
+            'size': 'INTEGER NOT NULL',
+            'results': 'TEXT NOT NULL',
+            'last_used': 'REAL NOT NULL'
+        })
+        self.execute_query("CREATE INDEX IF NOT EXISTS ix_http_cache_last_used ON http_cache (last_used)")
+        self.commit()
+
+    def execute_query(self, query: str, params: tuple = ()) -> List[tuple]:
+        """Execute SQL query and return results, raising sqlite3.Error instead of printing it"""
+        if not self.connection:
+            self.connect()
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    async def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a URL.
+
+        Args:
+            url: Request URL
+
+        Returns:
+            Dictionary with status, headers, validators, digest, size and results, or None
+        """
+        self.stats['lookups'] += 1
+        return await self._read(self._lookup, url)
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Request headers that revalidate a cached entry."""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        if headers:
+            self.stats['revalidated'] += 1
+        return headers
+
+    def not_modified(self, entry: Dict[str, Any]) -> None:
+        """Record that a revalidation came back 304 for this entry."""
+        self.stats['not_modified'] += 1
+        self.stats['bytes_saved'] += entry['size']
+        self._write(self._execute_write, "UPDATE http_cache SET last_used = ? WHERE url = ?",
+                    (time.time(), entry['url']))
+
+    def store(self, url: str, status: int, headers: Iterable[Tuple[str, str]], digest: str, size: int) -> bool:
+        """Remember a fetched response if it can be revalidated.
+
+        Results stored for an earlier body are dropped when the digest changed.
+        The write is queued, so this does not wait for the disk.
+
+        Args:
+            url: Request URL
+            status: Response status
+            headers: Response headers as (name, value) pairs
+            digest: Digest of the body as read
+            size: Number of body bytes read
+
+        Returns:
+            True if the response had validators and will be stored
+        """
+        headers = [(name, value) for name, value in headers]
+        lowered = {name.lower(): value for name, value in headers}
+        etag, last_modified = lowered.get('etag'), lowered.get('last-modified')
+        if not etag and not last_modified:
+            return False
+
+        self._write(self._store, url, status, json.dumps(headers), etag, last_modified, digest, size)
+        self.stats['stored'] += 1
+        return True
+
+    async def get_result(self, url: str, check: str, key: str) -> Optional[Any]:
+        """Return what a check derived from this URL's content, if the content is unchanged.
+
+        Args:
+            url: Request URL
+            check: Name of the check that stored the result
+            key: Key the result was stored under, normally derived from the body digest
+        """
+        results = await self._read(self._results, url)
+        stored = results.get(check) if results else None
+        if stored is None or stored['key'] != key:
+            self.stats['result_misses'] += 1
+            return None
+        self.stats['result_hits'] += 1
+        return stored['value']
+
+    def set_result(self, url: str, check: str, key: str, value: Any) -> None:
+        """Attach a check result to a cached URL; URLs without an entry are ignored."""
+        self._write(self._set_result, url, check, {'key': key, 'value': value})
+
+    def flush(self) -> None:
+        """Wait for queued writes and prune the least recently used entries; blocks, so not for the event loop"""
+        self._disk_executor.submit(self._run, self._prune).result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+    async def _read(self, operation: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self._disk_executor.submit(self._run, operation, *args))
+
+    def _write(self, operation: Callable[..., Any], *args: Any) -> None:
+        self._disk_executor.submit(self._run, operation, *args)
+
+    def _run(self, operation: Callable[..., Any], *args: Any) -> Any:
+        """Runs on the disk thread"""
+        try:
+            return operation(*args)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.warning("HTTP cache query failed: %s", e)
+            if self.connection:
+                self.connection.rollback()
+            return None
+
+    def _lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        rows = self.execute_query(
+            "SELECT status, headers, etag, last_modified, digest, size, results FROM http_cache WHERE url = ?",
+            (url,)
+        )
+        if not rows:
+            return None
+        status, headers, etag, last_modified, digest, size, results = rows[0]
+        return {
+            'url': url,
+            'status': status,
+            'headers': [tuple(pair) for pair in json.loads(headers)],
+            'etag': etag,
+            'last_modified': last_modified,
+            'digest': digest,
+            'size': size,
+            'results': json.loads(results),
+        }
+
+    def _results(self, url: str) -> Optional[Dict[str, Any]]:
+        rows = self.execute_query("SELECT results FROM http_cache WHERE url = ?", (url,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def _store(self, url: str, status: int, headers: str, etag: Optional[str], last_modified: Optional[str],
+               digest: str, size: int) -> None:
+        previous = self.execute_query("SELECT digest, results FROM http_cache WHERE url = ?", (url,))
+        results = previous[0][1] if previous and previous[0][0] == digest else '{}'
+        self._execute_write(
+            "INSERT OR REPLACE INTO http_cache "
+            "(url, status, headers, etag, last_modified, digest, size, results, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, status, headers, etag, last_modified, digest, size, results, time.time())
+        )
+
+    def _set_result(self, url: str, check: str, result: Dict[str, Any]) -> None:
+        results = self._results(url)
+        if results is None:
+            return
+        results[check] = result
+        self._execute_write("UPDATE http_cache SET results = ? WHERE url = ?", (json.dumps(results), url))
+
+    def _prune(self) -> None:
+        if not self.connection:
+            return
+        self._execute_write(
+            "DELETE FROM http_cache WHERE url IN "
+            "(SELECT url FROM http_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def _execute_write(self, query: str, params: tuple) -> None:
+        self.execute_query(query, params)
+        self.commit()
+
+
+_shared_cache: Optional[HTTPCache] = None
+
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """The process-wide cache, or None when HTTP_CACHE_ENABLED is off"""
+    global _shared_cache
+    if not settings.HTTP_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        _shared_cache = HTTPCache()
+    return _shared_cache
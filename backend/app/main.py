@@ -1,6 +1,15 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.api import api_router
+from app.api.v1.scanners import web
+from app.core.ai.inference_pool import InferencePool
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
+from app.core.config import settings
+
+logger = logging.getLogger("vapt")
 
 app = FastAPI(title="VAPT Scanner")
 
@@ -15,6 +24,36 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api/v1")
 
+inference_pool = InferencePool() if settings.AI_INFERENCE_POOL_WORKERS > 0 else None
+
+@app.on_event("startup")
+async def start_inference_pool():
+    if inference_pool is not None:
+        # Waits for the models to load; another API process may already run the pool
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, inference_pool.start)
+        except (OSError, RuntimeError) as e:
+            # TimeoutError included: scanners predict in-process whenever the pool cannot be reached
+            logger.error("Inference pool did not start, predicting in-process: %s", e)
+
+@app.on_event("startup")
+async def resume_web_scans():
+    await web.scanner.resume_scans()
+
+@app.on_event("shutdown")
+async def checkpoint_web_scans():
+    await web.scanner.shutdown()
+
+@app.on_event("shutdown")
+async def flush_prediction_cache():
+    # Disk writes of the prediction cache are queued; let them land before the process exits
+    await asyncio.get_running_loop().run_in_executor(None, get_vulnerability_detector().prediction_cache.flush)
+
+@app.on_event("shutdown")
+async def stop_inference_pool():
+    if inference_pool is not None:
+        await asyncio.get_running_loop().run_in_executor(None, inference_pool.stop)
+
 @app.get("/")
 async def root():
     return {"message": "VAPT Scanner API"}
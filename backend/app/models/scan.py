@@ -7,6 +7,7 @@ class Scan(Base):
     __tablename__ = "scans"
 
     id = Column(Integer, primary_key=True, index=True)
+    scan_uid = Column(String, unique=True, index=True, nullable=True)
     scan_type = Column(String, nullable=False)
     target = Column(String, nullable=False)
     status = Column(String, nullable=False)
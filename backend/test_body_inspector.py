@@ -0,0 +1,49 @@
+import asyncio
+
+import aiohttp
+
+from app.core.scanners.api_scanner import APIScanner
+from app.core.utils.body_inspector import StreamingPatternMatcher
+from benchmarks.mock_target import MockTarget
+
+PATTERNS = {
+    'credit_card': r'\b\d{16}\b',
+    'ssn': r'\b\d{3}-\d{2}-\d{4}\b',
+}
+
+
+def scan_chunks(matcher, chunks):
+    scan = matcher.scanner()
+    matches = []
+    for chunk in chunks:
+        matches.extend(scan.feed(chunk))
+    return matches + scan.close()
+
+
+def test_matches_do_not_depend_on_chunking():
+    matcher = StreamingPatternMatcher(PATTERNS, overlap=8)
+    body = 'order 12345678901234567 paid with 1234567812345678, ssn 123-45-6789. ' * 4
+    expected = [('credit_card', '1234567812345678'), ('ssn', '123-45-6789')] * 4
+    for size in range(1, 48):
+        # A 17-digit number cut anywhere must never yield a 16-digit card
+        assert scan_chunks(matcher, [body[i:i + size] for i in range(0, len(body), size)]) == expected, size
+
+
+def test_data_exposure_report_keeps_evidence_string():
+    async def run():
+        async with MockTarget(large_body_bytes=4096) as target:
+            scanner = APIScanner()
+            scanner.http_cache = None
+            async with aiohttp.ClientSession() as session:
+                return await scanner._test_data_exposure(session, target.url)
+
+    findings = {finding['pattern']: finding for finding in asyncio.run(run())}
+    email = findings['email']
+    assert isinstance(email['evidence'], str) and email['evidence'] == email['evidence_samples'][0]
+    assert email['match_count'] > len(email['evidence_samples'])
+
+
+if __name__ == "__main__":
+    test_matches_do_not_depend_on_chunking()
+    test_data_exposure_report_keeps_evidence_string()
+    print("Body inspector verified successfully!")
@@ -0,0 +1,150 @@
+import asyncio
+import re
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.config import settings
+from app.core.scanners import graphql_engine
+from app.core.scanners.graphql_engine import GraphQLEngine
+
+
+def _type(kind, name=None, of_type=None):
+    return {'kind': kind, 'name': name, 'ofType': of_type}
+
+
+STRING = _type('SCALAR', 'String')
+SCHEMA = {'__schema': {
+    'queryType': {'name': 'Query'},
+    'mutationType': None,
+    'types': [
+        {'kind': 'OBJECT', 'name': 'Query', 'fields': [
+            {'name': 'users', 'args': [], 'type': _type('LIST', of_type=_type('OBJECT', 'User'))},
+            {'name': 'adminConfig', 'args': [{'name': 'filter', 'type': _type('NON_NULL', of_type=_type('INPUT_OBJECT', 'Filter'))}],
+             'type': _type('OBJECT', 'User')},
+            {'name': 'search', 'args': [{'name': 'term', 'type': STRING}], 'type': _type('LIST', of_type=_type('OBJECT', 'User'))},
+        ]},
+        {'kind': 'OBJECT', 'name': 'User', 'fields': [{'name': 'id', 'args': [], 'type': _type('SCALAR', 'ID')}]},
+        {'kind': 'INPUT_OBJECT', 'name': 'Filter', 'inputFields': [
+            {'name': 'scope', 'type': _type('NON_NULL', of_type=STRING)},
+        ]},
+        {'kind': 'SCALAR', 'name': 'String'},
+        {'kind': 'SCALAR', 'name': 'ID'},
+    ],
+}}
+
+
+def create_graphql_app() -> web.Application:
+    """A GraphQL endpoint without array batching that rejects any document querying adminConfig"""
+    app = web.Application()
+
+    async def graphql(request: web.Request) -> web.Response:
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response({'errors': [{'message': 'Batching is not supported'}]})
+        query = body['query']
+        if '__schema' in query:
+            return web.json_response({'data': SCHEMA})
+        if 'adminConfig' in query:
+            # Like a validation error: no path, no data, the whole document fails
+            return web.json_response({'errors': [{'message': 'Argument "filter" has invalid value {scope: "test"}.'}]})
+        data, errors = {}, []
+        for alias, field, arguments in re.findall(r'(\w+): (\w+)(\([^)]*\))?', query):
+            if field == 'search' and "'" in arguments:
+                data[alias] = None
+                errors.append({'message': 'You have an error in your SQL syntax', 'path': [alias]})
+            elif field in ('users', 'search'):
+                data[alias] = [{'id': '1'}]
+        return web.json_response({'data': data, 'errors': errors} if errors else {'data': data})
+
+    for path in ('/graphql', '/v1/graphql', '/v2/graphql'):
+        app.router.add_post(path, graphql)
+    return app
+
+
+def test_validation_error_does_not_hide_the_batch():
+    async def run():
+        server = TestServer(create_graphql_app())
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await GraphQLEngine(session).scan(str(server.make_url('/graphql')))
+        finally:
+            await server.close()
+
+    graphql_engine._schema_cache.clear()
+    types = {finding['type'] for finding in asyncio.run(run())}
+    # Both are in the same alias batch as the failing adminConfig probe
+    assert 'graphql_authorization_bypass' in types
+    assert 'sql_injection' in types
+
+
+def test_caches_are_bounded():
+    async def run():
+        server = TestServer(create_graphql_app())
+        await server.start_server()
+        try:
+            endpoints = [str(server.make_url(path)) for path in ('/graphql', '/v1/graphql', '/v2/graphql')]
+            async with aiohttp.ClientSession() as session:
+                engine = GraphQLEngine(session)
+                for endpoint in endpoints:
+                    await engine.scan(endpoint)
+            return endpoints
+        finally:
+            await server.close()
+
+    cache_size = settings.GRAPHQL_CACHE_SIZE
+    settings.GRAPHQL_CACHE_SIZE = 2
+    try:
+        graphql_engine._schema_cache.clear()
+        graphql_engine._probe_cache.clear()
+        endpoints = asyncio.run(run())
+        # The least recently scanned endpoint was dropped
+        assert list(graphql_engine._schema_cache) == endpoints[1:]
+        # Every endpoint serves the same schema
+        assert len(graphql_engine._probe_cache) == 1
+    finally:
+        settings.GRAPHQL_CACHE_SIZE = cache_size
+
+
+def test_transient_failure_keeps_array_batching():
+    requests = {'arrays': 0, 'aliases': 0}
+
+    async def graphql(request: web.Request) -> web.Response:
+        body = await request.json()
+        if isinstance(body, list):
+            requests['arrays'] += 1
+            if requests['arrays'] == 1:
+                # An overloaded server, not a refusal of the array
+                return web.Response(status=503)
+            return web.json_response([{'data': {}} for _ in body])
+        if '__schema' in body['query']:
+            return web.json_response({'data': SCHEMA})
+        if 'p0:' in body['query']:
+            requests['aliases'] += 1
+        return web.json_response({'data': {}})
+
+    app = web.Application()
+    app.router.add_post('/graphql', graphql)
+
+    async def run():
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            engine = GraphQLEngine(session)
+            engine.batch_size = 4
+            findings = await engine.scan(str(server.make_url('/graphql')))
+            return engine, findings
+
+    graphql_engine._schema_cache.clear()
+    engine, findings = asyncio.run(run())
+    # Only the batch that failed went through the alias path
+    assert requests['aliases'] == 1 and requests['arrays'] >= 2
+    assert list(engine._array_batching.values()) == [True]
+    assert 'graphql_batching_enabled' in {finding['type'] for finding in findings}
+
+
+if __name__ == "__main__":
+    test_validation_error_does_not_hide_the_batch()
+    test_caches_are_bounded()
+    test_transient_failure_keeps_array_batching()
+    print("GraphQL engine verified successfully!")
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+
+from app.core.utils.http_cache import HTTPCache
+
+HEADERS = [('ETag', '"v1"'), ('Content-Type', 'text/html')]
+
+
+def test_disk_is_only_touched_by_the_disk_thread():
+    path = os.path.join(tempfile.mkdtemp(), 'http_cache.db')
+    cache = HTTPCache(path)
+    threads = set()
+
+    class RecordingCursor(sqlite3.Cursor):
+        def execute(self, *args):
+            threads.add(threading.current_thread())
+            return super().execute(*args)
+
+    def connect():
+        HTTPCache.connect(cache)
+        cache.cursor = cache.connection.cursor(RecordingCursor)
+
+    cache.connect = connect
+
+    async def run():
+        # Writes are queued without waiting, and reads see them in order
+        assert cache.store('https://example.com/', 200, HEADERS, 'digest-1', 10)
+        assert not cache.store('https://example.com/plain', 200, [('Content-Type', 'text/html')], 'digest-2', 10)
+        cache.set_result('https://example.com/', 'page', 'digest-1', {'links': []})
+        entry = await cache.lookup('https://example.com/')
+        missing = await cache.lookup('https://example.com/plain')
+        result = await cache.get_result('https://example.com/', 'page', 'digest-1')
+        stale = await cache.get_result('https://example.com/', 'page', 'digest-0')
+        return entry, missing, result, stale
+
+    entry, missing, result, stale = asyncio.run(run())
+    assert entry['etag'] == '"v1"' and entry['headers'] == HEADERS and missing is None
+    assert result == {'links': []} and stale is None
+    assert len(threads) == 1 and threading.main_thread() not in threads
+
+    # Every write was committed: another connection sees it without a flush
+    rows = sqlite3.connect(path).execute("SELECT url, results FROM http_cache").fetchall()
+    assert [url for url, _ in rows] == ['https://example.com/'] and '"page"' in rows[0][1]
+
+
+def test_store_keeps_results_of_an_unchanged_body():
+    cache = HTTPCache(os.path.join(tempfile.mkdtemp(), 'http_cache.db'), max_entries=1)
+
+    async def run():
+        cache.store('https://example.com/a', 200, HEADERS, 'digest-a', 10)
+        cache.set_result('https://example.com/a', 'page', 'digest-a', 1)
+        cache.store('https://example.com/a', 200, HEADERS, 'digest-a', 10)
+        kept = await cache.get_result('https://example.com/a', 'page', 'digest-a')
+        cache.store('https://example.com/a', 200, HEADERS, 'digest-b', 10)
+        dropped = await cache.get_result('https://example.com/a', 'page', 'digest-a')
+        cache.store('https://example.com/b', 200, HEADERS, 'digest-c', 10)
+        await asyncio.get_running_loop().run_in_executor(None, cache.flush)
+        return kept, dropped, await cache.lookup('https://example.com/a'), await cache.lookup('https://example.com/b')
+
+    kept, dropped, first, last = asyncio.run(run())
+    assert kept == 1 and dropped is None
+    # Pruned down to max_entries, least recently used first
+    assert first is None and last['digest'] == 'digest-c'
+
+
+def test_query_errors_are_logged_as_misses():
+    path = os.path.join(tempfile.mkdtemp(), 'http_cache.db')
+    cache = HTTPCache(path)
+
+    async def run():
+        cache.store('https://example.com/', 200, HEADERS, 'digest-1', 10)
+        assert await cache.lookup('https://example.com/') is not None
+        # Someone else's schema change breaks every query
+        other = sqlite3.connect(path)
+        other.execute("DROP TABLE http_cache")
+        other.commit()
+        other.close()
+        cache.store('https://example.com/', 200, HEADERS, 'digest-1', 10)
+        return await cache.lookup('https://example.com/')
+
+    assert asyncio.run(run()) is None
+    assert cache.get_stats()['errors'] == 2
+
+
+if __name__ == "__main__":
+    test_disk_is_only_touched_by_the_disk_thread()
+    test_store_keeps_results_of_an_unchanged_body()
+    test_query_errors_are_logged_as_misses()
+    print("HTTP cache verified successfully!")
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+
+import numpy as np
+import pytest
+
+from app.core.ai.inference_pool import _HEADER, InferencePool, InferencePoolClient
+from app.core.ai.model_store import ModelStore
+from app.core.ai.vulnerability_detector import VulnerabilityDetector
+
+MALFORMED_HEADERS = [{}, [1, 2], {'arrays': 5}, {'arrays': [['bogus', [1]]]}, {'arrays': [['<f4', 'x']]},
+                     {'arrays': [['<f4', [10 ** 12]]]}, {'arrays': [['<f4', [-4, -4]]]}]
+
+TEXTS = [
+    "GET /api/users/{i} returned {{\"password\": \"hunter{i}\"}}",
+    "POST /api/login with username admin' OR '1'='1 attempt {i}",
+]
+
+
+def test_pool_serves_in_process_predictions():
+    model_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(tempfile.mkdtemp(), 'inference.sock')
+    local = VulnerabilityDetector()
+    local.store = ModelStore(model_dir)
+    for scanner_type in local.vulnerability_types:
+        local.get_runtime(scanner_type)
+    batch = local.featurizer.transform(TEXTS[i % 2].format(i=i) for i in range(40))
+
+    model_dir_env = os.environ.get('AI_MODEL_DIR')
+    os.environ['AI_MODEL_DIR'] = model_dir
+    pool = InferencePool(socket_path, workers=2)
+    try:
+        pool.start()
+        client = InferencePoolClient(socket_path)
+        scores, version = client.predict('api', batch)
+        np.testing.assert_allclose(scores, local._predict_batch('api', batch), rtol=1e-5)
+        assert version == local.runtime_versions['api']
+        with pytest.raises(RuntimeError):
+            client.predict('unknown', batch)
+
+        # Scanners in pool mode never load a model themselves
+        remote = VulnerabilityDetector()
+        remote.store = local.store
+        remote.pool_client = client
+        response = {'status': 200, 'body': '{"ssn": "123-45-6789"}'}
+        assert asyncio.run(remote.analyze_api_vulnerabilities('/api/users', response)) == \
+            asyncio.run(local.analyze_api_vulnerabilities('/api/users', response))
+        assert not remote.runtimes and remote.runtime_versions['api'] == version
+
+        # A malformed request only costs its own connection, never a worker
+        workers = pool.worker_pids()
+        for header in MALFORMED_HEADERS:
+            meta = json.dumps(header).encode()
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(10)
+                sock.connect(socket_path)
+                sock.sendall(_HEADER.pack(len(meta)) + meta)
+                assert sock.recv(1) == b''
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            # A header length no request comes near
+            sock.settimeout(10)
+            sock.connect(socket_path)
+            sock.sendall(_HEADER.pack(2 ** 31))
+            assert sock.recv(1) == b''
+        assert pool.worker_pids() == workers
+        np.testing.assert_allclose(client.predict('api', batch)[0], scores)
+
+        # The workers share the server's pages rather than holding copies
+        memory = pool.memory_stats()
+        assert memory['processes'] == 3
+        assert memory['pss_mb'] < memory['server_rss_mb'] * 1.5
+        client.close()
+    finally:
+        pool.stop()
+        if model_dir_env is None:
+            os.environ.pop('AI_MODEL_DIR')
+        else:
+            os.environ['AI_MODEL_DIR'] = model_dir_env
+    assert not os.path.exists(socket_path)
+
+
+def test_failing_pool_falls_back_to_local_models():
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    batch = detector.featurizer.transform([TEXTS[0].format(i=1)])
+    expected = detector.get_runtime('api').predict(batch)
+
+    class FailingClient:
+        def __init__(self, error):
+            self.error = error
+
+        def predict(self, scanner_type, batch):
+            raise self.error
+
+    for error in (ConnectionRefusedError('no pool'), RuntimeError('worker failed'),
+                  json.JSONDecodeError('garbled reply', '', 0), ValueError('message too large')):
+        detector.pool_client = FailingClient(error)
+        np.testing.assert_allclose(detector._predict_batch('api', batch), expected)
+
+
+def test_api_starts_without_the_pool():
+    from app import main
+
+    inference_pool = main.inference_pool
+    # The server cannot create its lock file, so it exits at once
+    main.inference_pool = InferencePool(os.path.join(tempfile.mkdtemp(), 'missing', 'inference.sock'), workers=1)
+    try:
+        asyncio.run(main.start_inference_pool())
+    finally:
+        main.inference_pool = inference_pool
+
+
+if __name__ == "__main__":
+    test_pool_serves_in_process_predictions()
+    test_failing_pool_falls_back_to_local_models()
+    test_api_starts_without_the_pool()
+    print("Inference pool verified successfully!")
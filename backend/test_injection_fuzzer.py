@@ -0,0 +1,74 @@
+import asyncio
+import html
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.scanners.injection_fuzzer import InjectionFuzzer
+from app.core.utils.payload_generator import PayloadGenerator
+from benchmarks.mock_target import MockTarget
+
+CLASSES = ('sql', 'nosql', 'command', 'xml')
+
+
+def create_echo_app() -> web.Application:
+    async def echo(request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response({'you_sent': body.get('param'), 'status': 'ok'})
+
+    async def search(request: web.Request) -> web.Response:
+        query = request.query.get('q', '')
+        return web.Response(text=f'<p>Results for {html.escape(query)}</p><p>raw: {query}</p>',
+                            content_type='text/html')
+
+    app = web.Application()
+    app.router.add_post('/echo', echo)
+    app.router.add_get('/search', search)
+    return app
+
+
+async def fuzz(base_url, targets):
+    payloads = PayloadGenerator(encodings=['url']).corpora(CLASSES)
+    async with aiohttp.ClientSession() as session:
+        return await InjectionFuzzer(session).fuzz(
+            [dict(target, url=base_url + target['url']) for target in targets], payloads
+        )
+
+
+def test_reflected_payloads_are_not_findings():
+    async def run():
+        server = TestServer(create_echo_app())
+        await server.start_server()
+        try:
+            return await fuzz(str(server.make_url('')).rstrip('/'), [
+                {'method': 'POST', 'url': '/echo', 'json': {'param': ''}},
+                {'method': 'GET', 'url': '/search', 'params': {'q': ''}},
+            ])
+        finally:
+            await server.close()
+
+    findings = asyncio.run(run())
+    assert findings == [], findings
+
+
+def test_error_signatures_are_still_found():
+    async def run():
+        async with MockTarget() as target:
+            return await fuzz(target.url, [{'method': 'POST', 'url': '/api/items0/1', 'json': {'name': 'item'}}])
+
+    findings = asyncio.run(run())
+    assert findings and all(finding['type'] == 'sql_injection' for finding in findings
+                            if finding['severity'] == 'critical')
+    assert any(finding['severity'] == 'critical' for finding in findings)
+
+
+def test_explicit_zero_threshold():
+    assert InjectionFuzzer(None, simhash_threshold=0).simhash_threshold == 0
+
+
+if __name__ == "__main__":
+    test_reflected_payloads_are_not_findings()
+    test_error_signatures_are_still_found()
+    test_explicit_zero_threshold()
+    print("Injection fuzzer verified successfully!")
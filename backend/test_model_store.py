@@ -0,0 +1,90 @@
+import asyncio
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from app.core.ai.model_store import ModelStore
+from app.core.ai.numpy_runtime import NumpyModel
+from app.api.v1 import models
+from app.core.ai.vulnerability_detector import VulnerabilityDetector, get_vulnerability_detector
+from app.core.config import settings
+
+
+def random_model(seed, outputs):
+    rng = np.random.default_rng(seed)
+    return NumpyModel([(rng.normal(size=(1000, outputs)).astype(np.float32),
+                        rng.normal(size=outputs).astype(np.float32), 'sigmoid')])
+
+
+def test_model_store():
+    store = ModelStore(tempfile.mkdtemp())
+    detector = VulnerabilityDetector()
+    featurizer, labels = detector.featurizer.get_config(), detector.vulnerability_types['api']
+
+    first = store.save('api', random_model(1, len(labels)), featurizer, labels, {'samples': 10})
+    assert store.save('api', random_model(1, len(labels)), featurizer, labels) == first
+    second = store.save('api', random_model(2, len(labels)), featurizer, labels, activate=False)
+    assert store.list_versions('api') == sorted([first, second]) and store.active_version('api') == first
+
+    loaded = store.load('api')
+    assert loaded.version == first and loaded.labels == labels and loaded.metadata['samples'] == 10
+    assert isinstance(loaded.model.layers[0][0], np.memmap)
+    assert not any(name.startswith('.') for name in os.listdir(os.path.join(store.root, 'api')))
+
+    # A second process serving from the same store switches once the new version is activated
+    detector.store = store
+    serving = VulnerabilityDetector()
+    serving.store = ModelStore(store.root)
+    inputs = detector.featurizer.transform(['token leaked in response'])
+    before = serving._predict_batch('api', inputs)
+    assert serving.runtime_versions['api'] == first
+
+    detector.activate_model('api', second)
+    check_interval = settings.AI_MODEL_CHECK_INTERVAL
+    settings.AI_MODEL_CHECK_INTERVAL = 0
+    try:
+        after = serving._predict_batch('api', inputs)
+    finally:
+        settings.AI_MODEL_CHECK_INTERVAL = check_interval
+    assert serving.runtime_versions['api'] == second
+    np.testing.assert_allclose(after, random_model(2, len(labels)).predict(inputs), atol=1e-6)
+    assert not np.allclose(before, after)
+
+    try:
+        store.activate('api', 'missing')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('activating an unknown version must fail')
+
+
+def test_activation_does_not_block_the_api():
+    detector = get_vulnerability_detector()
+    activated_on = []
+
+    def activate_model(scanner_type, version):
+        activated_on.append(threading.current_thread())
+        if version == 'missing':
+            raise ValueError(f'Unknown version {version}')
+
+    detector.activate_model = activate_model
+    try:
+        response = asyncio.run(models.activate_model_version('api', models.ActivateModelRequest(version='v1')))
+        try:
+            asyncio.run(models.activate_model_version('api', models.ActivateModelRequest(version='missing')))
+        except models.HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError('activating an unknown version must fail')
+    finally:
+        del detector.activate_model
+    assert response == {'scanner_type': 'api', 'active': 'v1'}
+    assert len(activated_on) == 2 and threading.main_thread() not in activated_on
+
+
+if __name__ == "__main__":
+    test_model_store()
+    test_activation_does_not_block_the_api()
+    print("Model store verified successfully!")
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from app.core.ai.model_store import ModelStore
+from app.core.ai.numpy_runtime import NumpyModel, export_dense_model
+from app.core.ai.vulnerability_detector import VulnerabilityDetector
+
+
+def randomize_batch_norm(model, rng):
+    """Give every BatchNormalization layer non-trivial statistics, as training would"""
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.BatchNormalization):
+            gamma, beta, mean, variance = layer.get_weights()
+            layer.set_weights([
+                rng.uniform(0.5, 1.5, gamma.shape), rng.normal(0, 0.2, beta.shape),
+                rng.normal(0, 0.5, mean.shape), rng.uniform(0.5, 2.0, variance.shape),
+            ])
+
+
+def test_detector_model_parity():
+    rng = np.random.default_rng(7)
+    model = VulnerabilityDetector()._load_or_create_model('api')
+    randomize_batch_norm(model, rng)
+    inputs = rng.random((16, 1000)).astype(np.float32)
+
+    exported = export_dense_model(model)
+    # Dropout is gone and every BatchNormalization is folded into the next Dense layer
+    assert [activation for _, _, activation in exported.layers] == ['relu', 'relu', 'relu', 'sigmoid']
+    expected = model.predict(inputs, verbose=0)
+    np.testing.assert_allclose(exported.predict(inputs), expected, atol=1e-5)
+
+    directory = tempfile.mkdtemp()
+    exported.save(directory)
+    loaded = NumpyModel.load(directory, mmap=True)
+    assert isinstance(loaded.layers[0][0], np.memmap)
+    np.testing.assert_allclose(loaded.predict(inputs[:1]), expected[:1], atol=1e-5)
+
+
+SERVE_WITHOUT_TENSORFLOW = """
+import asyncio, sys
+from app.core.ai.vulnerability_detector import get_vulnerability_detector
+findings = asyncio.run(get_vulnerability_detector().analyze_api_vulnerabilities('/users', {'user': 'admin'}))
+assert isinstance(findings, list)
+assert 'tensorflow' not in sys.modules
+"""
+
+
+def test_exported_model_serves_without_tensorflow():
+    model_dir = tempfile.mkdtemp()
+    detector = VulnerabilityDetector()
+    ModelStore(model_dir).save('api', export_dense_model(detector._load_or_create_model('api')),
+                               detector.featurizer.get_config(), detector.vulnerability_types['api'])
+    env = dict(os.environ, AI_MODEL_DIR=model_dir, AI_RUNTIME='numpy')
+    subprocess.run([sys.executable, '-c', SERVE_WITHOUT_TENSORFLOW], check=True, env=env)
+
+
+def test_linear_dense_folding():
+    rng = np.random.default_rng(11)
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(20,)),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Dense(8),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Dense(4, activation='softmax'),
+        tf.keras.layers.BatchNormalization(),
+    ])
+    randomize_batch_norm(model, rng)
+    inputs = rng.normal(size=(5, 20)).astype(np.float32)
+
+    exported = export_dense_model(model)
+    assert len(exported.layers) == 3
+    np.testing.assert_allclose(exported.predict(inputs), model.predict(inputs, verbose=0), atol=1e-5)
+
+
+if __name__ == "__main__":
+    test_detector_model_parity()
+    test_exported_model_serves_without_tensorflow()
+    test_linear_dense_folding()
+    print("NumPy runtime verified successfully!")
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.scanners.openapi_ingest import OpenAPISpecLoader, RefResolver
+
+OPENAPI_SPEC = {
+    'openapi': '3.0.0',
+    'servers': [{'url': 'https://api.example.com/v1'}],
+    'components': {
+        'parameters': {
+            'UserId': {'name': 'id', 'in': 'path', 'required': True, 'schema': {'type': 'integer', 'minimum': 7}},
+        },
+        'schemas': {
+            # Self-referencing, through a list of children
+            'Node': {'type': 'object', 'properties': {
+                'name': {'type': 'string'},
+                'children': {'type': 'array', 'items': {'$ref': '#/components/schemas/Node'}},
+            }},
+        },
+    },
+    'paths': {
+        '/users/{id}': {
+            'parameters': [
+                {'$ref': '#/components/parameters/UserId'},
+                {'name': 'verbose', 'in': 'query', 'schema': {'type': 'boolean'}},
+                {'name': 'X-Tenant', 'in': 'header', 'example': 'shared'},
+            ],
+            'get': {'operationId': 'getUser'},
+            'put': {
+                'operationId': 'updateUser',
+                # Overrides the path-level header, the other shared parameters still apply
+                'parameters': [{'name': 'X-Tenant', 'in': 'header', 'example': 'specific'}],
+                'requestBody': {'content': {'application/json': {
+                    'schema': {'$ref': '#/components/schemas/Node'}}}},
+            },
+        },
+    },
+}
+
+SWAGGER_YAML = """
+swagger: '2.0'
+basePath: /api/
+paths:
+  /orders:
+    post:
+      operationId: createOrder
+      security:
+        - token: []
+      parameters:
+        - name: body
+          in: body
+          schema:
+            $ref: '#/definitions/Order'
+definitions:
+  Order:
+    type: object
+    properties:
+      quantity: {type: integer, minimum: 2}
+      note: {type: string, example: rush}
+"""
+
+
+def _write_spec(content: str) -> str:
+    fd, path = tempfile.mkstemp(suffix='.spec')
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_refs_are_resolved_once_and_cycles_cut():
+    resolver = RefResolver(OPENAPI_SPEC)
+    node = resolver.resolve({'$ref': '#/components/schemas/Node'})
+    # The recursive reference is left empty instead of expanding forever
+    assert node['properties']['children']['items'] == {}
+    assert resolver.resolve({'$ref': '#/components/schemas/Node'}) is node
+    assert resolver.resolve({'$ref': '#/components/schemas/Missing'}) == {}
+    assert resolver.resolve({'$ref': 'other.yaml#/Node'}) == {}
+
+
+def test_path_and_operation_parameters_are_merged():
+    probes = {probe['operation_id']: probe
+              for probe in OpenAPISpecLoader(tempfile.mkdtemp()).expand_file(_write_spec(json.dumps(OPENAPI_SPEC)))}
+
+    assert probes['getUser']['path'] == '/v1/users/7'
+    assert probes['getUser']['params'] == {'verbose': True}
+    assert probes['getUser']['headers'] == {'X-Tenant': 'shared'}
+    assert probes['getUser']['json'] is None
+
+    assert probes['updateUser']['method'] == 'PUT' and probes['updateUser']['path'] == '/v1/users/7'
+    assert probes['updateUser']['params'] == {'verbose': True}
+    assert probes['updateUser']['headers'] == {'X-Tenant': 'specific'}
+    assert probes['updateUser']['json'] == {'name': 'test', 'children': ['test']}
+
+
+def test_yaml_spec():
+    probes = list(OpenAPISpecLoader(tempfile.mkdtemp()).expand_file(_write_spec(SWAGGER_YAML)))
+    assert len(probes) == 1
+    assert probes[0]['method'] == 'POST' and probes[0]['path'] == '/api/orders'
+    assert probes[0]['json'] == {'quantity': 2, 'note': 'rush'}
+    assert probes[0]['requires_auth']
+
+
+def test_specs_are_expanded_off_the_event_loop():
+    app = web.Application()
+
+    async def spec(request: web.Request) -> web.Response:
+        return web.Response(text=SWAGGER_YAML, content_type='application/yaml')
+
+    app.router.add_get('/swagger.yaml', spec)
+    expanded_on = []
+
+    class RecordingLoader(OpenAPISpecLoader):
+        def expand_file(self, spec_path):
+            expanded_on.append(threading.current_thread())
+            return super().expand_file(spec_path)
+
+    async def run():
+        loader = RecordingLoader(tempfile.mkdtemp())
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            base_url = str(server.make_url('')).rstrip('/')
+            first = await loader.load_probes(session, f'{base_url}/swagger.yaml', base_url)
+            # An unchanged spec is served from the probe cache
+            second = await loader.load_probes(session, f'{base_url}/swagger.yaml', base_url)
+            return base_url, first, second, os.listdir(loader.cache_dir)
+
+    base_url, first, second, cached = asyncio.run(run())
+    assert [probe['url'] for probe in first] == [f'{base_url}/api/orders']
+    assert second == first
+    assert len(expanded_on) == 1 and expanded_on[0] is not threading.main_thread()
+    # Only the expanded probes are kept, not the downloaded spec
+    assert len(cached) == 1 and cached[0].endswith('.jsonl')
+
+
+if __name__ == "__main__":
+    test_refs_are_resolved_once_and_cycles_cut()
+    test_path_and_operation_parameters_are_merged()
+    test_yaml_spec()
+    test_specs_are_expanded_off_the_event_loop()
+    print("OpenAPI ingestion verified successfully!")
@@ -0,0 +1,47 @@
+import itertools
+import os
+import tempfile
+from urllib.parse import quote
+
+from app.core.utils.payload_generator import BASE_CORPORA, PayloadGenerator, normalize_payload
+
+
+def test_payload_generator():
+    generator = PayloadGenerator(encodings=['url', 'html'], max_payloads=0, corpus_dir='')
+    payloads = list(generator.generate('sql'))
+    assert payloads[:len(BASE_CORPORA['sql'])] == list(BASE_CORPORA['sql'])
+    assert "'/**/OR/**/'1'='1" in payloads and "%27%20OR%20%271%27%3D%271" in payloads
+    assert len(payloads) == len(set(payloads))
+    # A mutation that leaves the payload unchanged is not sent twice
+    assert payloads.count('1 AND 1=2') == 1
+
+    # Lazy: taking a few payloads does not expand the rest
+    corpus = PayloadGenerator(encodings=['url'], max_payloads=0, corpus_dir='').corpus('command')
+    assert len(list(itertools.islice(corpus, 3))) == 3 and len(corpus) == 3
+    assert list(corpus) == list(corpus) and len(corpus) > 3
+    assert PayloadGenerator(encodings=['url'], max_payloads=0, corpus_dir='').corpus('command') is corpus
+
+    corpus_dir = tempfile.mkdtemp()
+    with open(os.path.join(corpus_dir, 'ldap.txt'), 'w') as f:
+        f.write('# comment\n*)(uid=*\n*)(uid=*\n*)(uid=*  \n')
+    extended = PayloadGenerator(encodings=[], max_payloads=5, corpus_dir=corpus_dir)
+    assert 'ldap' in extended.classes
+    assert list(extended.generate('ldap')) == ['*)(uid=*']
+    assert len(list(PayloadGenerator(encodings=[], max_payloads=5, corpus_dir='').generate('sql'))) == 5
+
+    assert normalize_payload("'  OR\t'1'") == "' OR '1'"
+
+
+def test_encoded_variants_fit_under_the_cap():
+    # Mutations alone outnumber the cap, yet every base payload is also produced encoded
+    payloads = list(PayloadGenerator(encodings=['url'], max_payloads=40, corpus_dir='').generate('sql'))
+    base = len(BASE_CORPORA['sql'])
+    assert len(payloads) == 40
+    assert payloads[base:2 * base] == [quote(payload, safe='') for payload in BASE_CORPORA['sql']]
+    assert "'/**/OR/**/'1'='1" in payloads[2 * base:]
+
+
+if __name__ == "__main__":
+    test_payload_generator()
+    test_encoded_variants_fit_under_the_cap()
+    print("Payload generator verified successfully!")
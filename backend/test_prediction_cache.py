@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.ai.featurizer import HashingFeaturizer
+from app.core.ai.model_store import ModelStore
+from app.core.ai.prediction_cache import PredictionCache, content_hash
+from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.config import settings
+
+
+def test_prediction_cache():
+    path = os.path.join(tempfile.mkdtemp(), 'predictions.db')
+    cache = PredictionCache(max_entries=2, path=path)
+    featurizer = HashingFeaturizer()
+    texts = ['GET /api/users/1', 'POST /api/login', 'DELETE /api/users/2']
+    for text in texts:
+        cache.store('api', content_hash(text), featurizer.transform_one(text), 'v1', np.array([0.1, 0.9]))
+
+    hit = cache.lookup('api', content_hash(texts[2]), 'v1')
+    assert (hit.features != featurizer.transform_one(texts[2])).nnz == 0
+    np.testing.assert_allclose(hit.scores, [0.1, 0.9])
+    # Evicted from memory, still on disk
+    assert cache.lookup('api', content_hash(texts[0]), 'v1').scores is not None
+    assert cache.get_stats()['memory_hits'] == 1 and cache.get_stats()['disk_hits'] == 1
+
+    # Another model version only reuses the features
+    stale = cache.lookup('api', content_hash(texts[1]), 'v2')
+    assert stale.scores is None and stale.features.nnz > 0
+    assert cache.lookup('web', content_hash(texts[1]), 'v1') is None
+
+    # The disk tier outlives the process that filled it
+    cache.flush()
+    reopened = PredictionCache(path=path)
+    assert reopened.lookup('api', content_hash(texts[1]), 'v1').scores is not None
+    reopened.invalidate('api')
+    assert reopened.lookup('api', content_hash(texts[1]), 'v1') is None
+    assert reopened.get_stats()['hit_rate'] == 0.5
+
+
+def test_processes_share_the_disk_tier():
+    path = os.path.join(tempfile.mkdtemp(), 'predictions.db')
+    featurizer = HashingFeaturizer()
+    texts = ['GET /api/users/1', 'POST /api/login', 'DELETE /api/users/2']
+    first, second = PredictionCache(path=path), PredictionCache(path=path)
+
+    started = time.monotonic()
+    first.store('api', content_hash(texts[0]), featurizer.transform_one(texts[0]), 'v1', np.array([0.1, 0.9]))
+    # Disk work is done in order, so this read follows the write
+    assert first.lookup('web', content_hash(texts[0]), 'v1') is None
+    # Committed at once: the other cache can write, and read the row, without a flush
+    second.store('api', content_hash(texts[1]), featurizer.transform_one(texts[1]), 'v1', np.array([0.5, 0.5]))
+    hit = asyncio.run(second.lookup_async('api', content_hash(texts[0]), 'v1'))
+    assert hit.scores is not None and second.get_stats()['disk_hits'] == 1
+    assert time.monotonic() - started < 1
+
+    # Another writer holding the lock delays neither store() nor, for long, flush()
+    blocker = sqlite3.connect(path)
+    blocker.execute('BEGIN IMMEDIATE')
+    started = time.monotonic()
+    first.store('api', content_hash(texts[2]), featurizer.transform_one(texts[2]), 'v1', np.array([0.2, 0.8]))
+    assert time.monotonic() - started < 0.05
+    first.flush()
+    assert time.monotonic() - started < 2
+    blocker.rollback()
+    blocker.close()
+    assert first.lookup('api', content_hash(texts[2]), 'v1').scores is not None
+
+
+def test_repeated_analysis_is_served_from_cache():
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    detector.prediction_cache = PredictionCache(path='')
+
+    first = asyncio.run(detector.analyze_api_vulnerabilities('https://api.example.com/users', {'status': 200}))
+    second = asyncio.run(detector.analyze_api_vulnerabilities('https://api.example.com/users', {'status': 200}))
+    assert first == second
+    assert detector.get_batch_stats()['api']['requests'] == 1
+    assert detector.prediction_cache.get_stats()['memory_hits'] == 1
+
+    # Activating another version stops serving the old scores
+    runtime = detector.get_runtime('api')
+    doubled = runtime.__class__([(kernel * 2, bias, activation) for kernel, bias, activation in runtime.layers])
+    other = detector.store.save('api', doubled, detector.featurizer.get_config(),
+                                detector.vulnerability_types['api'], activate=False)
+    detector.activate_model('api', other)
+    asyncio.run(detector.analyze_api_vulnerabilities('https://api.example.com/users', {'status': 200}))
+    assert detector.get_batch_stats()['api']['requests'] == 2
+    assert detector.prediction_cache.get_stats()['feature_hits'] == 1
+
+
+class WorkerClient:
+    """Answers like an inference pool client, from a detector standing in for a pool worker"""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def predict(self, scanner_type, batch):
+        return self.worker._predict_batch(scanner_type, batch), self.worker.runtime_versions[scanner_type]
+
+
+def activate_doubled(owner, scanner_type):
+    runtime = owner.get_runtime(scanner_type)
+    doubled = runtime.__class__([(kernel * 2, bias, activation) for kernel, bias, activation in runtime.layers])
+    version = owner.store.save(scanner_type, doubled, owner.featurizer.get_config(),
+                               owner.vulnerability_types[scanner_type], activate=False)
+    owner.activate_model(scanner_type, version)
+    return version
+
+
+def test_cache_hits_follow_activation_elsewhere():
+    owner = VulnerabilityDetector()
+    owner.store = ModelStore(tempfile.mkdtemp())
+    serving, pooled, worker = VulnerabilityDetector(), VulnerabilityDetector(), VulnerabilityDetector()
+    for detector in (serving, pooled, worker):
+        detector.store = ModelStore(owner.store.root)
+        detector.prediction_cache = PredictionCache(path='')
+    pooled.pool_client = WorkerClient(worker)
+    code = '\n'.join(f'value_{i} = load(path_{i % 7})' for i in range(120))
+    response = {'status': 200, 'body': '{"token": "abc"}'}
+
+    async def analyze():
+        await serving.analyze_api_vulnerabilities('/api/users', response)
+        await pooled.analyze_source_code_vulnerabilities(code, 'python', windowed=True)
+
+    check_interval = settings.AI_MODEL_CHECK_INTERVAL
+    settings.AI_MODEL_CHECK_INTERVAL = 0
+    try:
+        asyncio.run(analyze())
+        asyncio.run(analyze())
+        assert serving.get_batch_stats()['api']['requests'] == 1
+        windows = pooled.prediction_cache.get_stats()['entries']
+        api_version = activate_doubled(owner, 'api')
+        code_version = activate_doubled(owner, 'source_code')
+        asyncio.run(analyze())
+    finally:
+        settings.AI_MODEL_CHECK_INTERVAL = check_interval
+
+    # Another process activated new versions: cached scores of the old ones are not served
+    assert serving.get_batch_stats()['api']['requests'] == 2
+    assert serving.runtime_versions['api'] == api_version
+    assert windows > 1 and pooled.prediction_cache.get_stats()['feature_hits'] == windows
+    assert not pooled.runtimes and pooled.runtime_versions['source_code'] == code_version
+
+
+if __name__ == "__main__":
+    test_prediction_cache()
+    test_processes_share_the_disk_tier()
+    test_repeated_analysis_is_served_from_cache()
+    test_cache_hits_follow_activation_elsewhere()
+    print("Prediction cache verified successfully!")
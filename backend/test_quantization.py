@@ -0,0 +1,79 @@
+import tempfile
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.core.ai.model_store import ModelStore
+from app.core.ai.quantization import TFLiteModel
+from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.config import Settings, settings
+
+SAMPLES = [
+    ("SELECT * FROM users WHERE id = '{i}' OR 1=1 --", ['sql_injection']),
+    ("GET /api/users/{i} with a valid bearer token", []),
+    ("{{\"password\": \"hunter{i}\", \"ssn\": \"123-45-6789\"}} returned in the response", ['data_exposure']),
+]
+
+
+def test_quantized_export():
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    holdout = [{'text': text.format(i=i), 'labels': labels} for i in range(60) for text, labels in SAMPLES]
+    float_model = detector.get_runtime('api')
+    version = detector.runtime_versions['api']
+
+    report = detector.export_quantized('api', 'int8', holdout=holdout)
+    assert report['samples'] == 180 and report['size_bytes'] < report['float_size_bytes'] / 3
+    assert abs(report['accuracy_delta']) < 0.05 and report['decision_agreement'] > 0.95
+    assert detector.store.load('api').metadata['quantized']['int8'] == report
+
+    runtime = settings.AI_RUNTIME
+    settings.AI_RUNTIME = 'tflite'
+    try:
+        serving = VulnerabilityDetector()
+        serving.store = detector.store
+        batch = serving.featurizer.transform([sample['text'] for sample in holdout[:32]])
+        quantized = serving._predict_batch('api', batch)
+        assert isinstance(serving.runtimes['api'], TFLiteModel)
+        assert serving._cache_version('api') == f'{version}:int8'
+    finally:
+        settings.AI_RUNTIME = runtime
+    np.testing.assert_allclose(quantized, float_model.predict(batch), atol=0.02)
+
+
+def test_float16_is_not_a_serving_precision():
+    with pytest.raises(ValidationError, match='export_quantized'):
+        Settings(AI_QUANTIZATION='float16')
+    assert Settings(AI_QUANTIZATION='int8').AI_QUANTIZATION == 'int8'
+
+
+def test_batches_are_padded_to_a_few_shapes():
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    float_model = detector.get_runtime('api')
+    detector.export_quantized('api', 'int8')
+    stored = detector.store.load('api')
+    model = TFLiteModel(detector.store.quantized_path('api', stored.version, 'int8'), max_batch_size=8)
+
+    resized = []
+    resize = model._interpreter.resize_tensor_input
+    model._interpreter.resize_tensor_input = lambda index, shape, *args: (
+        resized.append(shape[0]), resize(index, shape, *args))
+
+    texts = [text.format(i=i) for i in range(10) for text, _ in SAMPLES]
+    for rows in (1, 3, 4, 3, 5, 8, 7, 20):
+        batch = detector.featurizer.transform(texts[:rows])
+        outputs = model.predict(batch)
+        assert outputs.shape == (rows, model.output_dim)
+        np.testing.assert_allclose(outputs, float_model.predict(batch), atol=0.02)
+    assert model.predict(np.zeros((0, model.input_dim), np.float32)).shape == (0, model.output_dim)
+    # Sizes 3, 5 and 7 run padded, and 20 rows as batches of 8, 8 and 4
+    assert set(resized) <= {1, 2, 4, 8} and len(resized) <= 6
+
+
+if __name__ == "__main__":
+    test_quantized_export()
+    test_float16_is_not_a_serving_precision()
+    test_batches_are_padded_to_a_few_shapes()
+    print("Quantized export verified successfully!")
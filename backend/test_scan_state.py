@@ -0,0 +1,83 @@
+import asyncio
+import importlib.util
+import os
+import tempfile
+
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.databases.scan_state import ScanStateStore
+from app.models import Scan  # noqa: F401 - registers every model the scans table relates to
+
+# The scans table as created before scan_uid was added
+LEGACY_SCANS = '''
+CREATE TABLE scans (
+    id INTEGER PRIMARY KEY, scan_type VARCHAR NOT NULL, target VARCHAR NOT NULL, status VARCHAR NOT NULL,
+    start_time DATETIME, end_time DATETIME, result JSON, created_at DATETIME, updated_at DATETIME
+)
+'''
+
+
+def legacy_engine():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'scans.db')}")
+    with engine.begin() as connection:
+        connection.execute(text(LEGACY_SCANS))
+        connection.execute(text("INSERT INTO scans (scan_type, target, status) VALUES ('web', 'https://old', 'completed')"))
+    return engine
+
+
+def migrate(engine, direction='upgrade'):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic', 'versions', '3c8e1f6a9b2d_add_scans_scan_uid.py')
+    spec = importlib.util.spec_from_file_location('add_scans_scan_uid', path)
+    revision = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(revision)
+    with engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+        getattr(revision, direction)()
+
+
+def test_scan_uid_revision():
+    engine = legacy_engine()
+    migrate(engine)
+    inspector = inspect(engine)
+    assert 'scan_uid' in {column['name'] for column in inspector.get_columns('scans')}
+    assert any(index['column_names'] == ['scan_uid'] and index['unique'] for index in inspector.get_indexes('scans'))
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT target, scan_uid FROM scans')).fetchall() == [('https://old', None)]
+
+    # Databases created by create_all already have the column
+    migrate(engine)
+    migrate(engine, 'downgrade')
+    assert 'scan_uid' not in {column['name'] for column in inspect(engine).get_columns('scans')}
+
+
+def test_spilled_scans_reload():
+    engine = legacy_engine()
+    migrate(engine)
+    store = ScanStateStore('web', max_entries=1, ttl=3600, session_factory=sessionmaker(bind=engine))
+    records = [{
+        'id': f'scan-{i}', 'target_url': f'https://example{i}.com', 'status': 'completed',
+        'start_time': '2024-01-01T00:00:00', 'end_time': '2024-01-01T00:05:00',
+        'findings': [{'type': 'missing_header', 'detail': f'finding {i}'}],
+    } for i in range(2)]
+
+    async def run():
+        for record in records:
+            store.add(record)
+            await store.complete(record['id'])
+        # The first scan was pushed out of memory by the second
+        assert 'scan-0' not in store and 'scan-1' in store
+        return await store.get('scan-0'), await ScanStateStore('mobile', session_factory=store._session_factory).get('scan-0')
+
+    reloaded, other_type = asyncio.run(run())
+    assert reloaded == records[0]
+    assert other_type is None
+    stats = store.get_stats()
+    assert stats['spills'] == 2 and stats['lru_evictions'] >= 1 and stats['db_loads'] == 1
+
+
+if __name__ == "__main__":
+    test_scan_uid_revision()
+    test_spilled_scans_reload()
+    print("Scan state store verified successfully!")
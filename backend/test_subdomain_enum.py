@@ -0,0 +1,121 @@
+import asyncio
+import struct
+
+from app.core.config import settings
+from app.core.scanners.subdomain_enum import SubdomainEnumerator
+from app.core.utils import dns_resolver
+from app.core.utils.dns_resolver import DNSResolver
+from app.core.utils.tls_probe import TLSProbe
+from test_tls_probe import make_context
+
+ZONE = {
+    'example.test': '127.0.0.1',
+    'www.example.test': '127.0.0.1',
+    'api.example.test': '127.0.0.2',
+    'hidden.example.test': '127.0.0.3',
+}
+
+
+class StubDNSServer(asyncio.DatagramProtocol):
+    """Answers A queries from ZONE, NXDOMAIN with a 60 second SOA minimum otherwise"""
+
+    def __init__(self):
+        self.queries = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query_id, = struct.unpack('!H', data[:2])
+        offset, labels = 12, []
+        while data[offset]:
+            labels.append(data[offset + 1:offset + 1 + data[offset]].decode())
+            offset += data[offset] + 1
+        question = data[12:offset + 5]
+        name = '.'.join(labels)
+        self.queries.append(name)
+
+        if name in ZONE:
+            answer = b'\xc0\x0c' + struct.pack('!HHIH', 1, 1, 300, 4) + bytes(map(int, ZONE[name].split('.')))
+            header = struct.pack('!HHHHHH', query_id, 0x8180, 1, 1, 0, 0)
+            self.transport.sendto(header + question + answer, addr)
+        else:
+            soa = b'\x00\x00\x00\x00' + struct.pack('!IIIII', 1, 3600, 600, 86400, 60)
+            authority = b'\xc0\x0c' + struct.pack('!HHIH', 6, 1, 3600, len(soa)) + soa
+            header = struct.pack('!HHHHHH', query_id, 0x8183, 1, 0, 1, 0)
+            self.transport.sendto(header + question + authority, addr)
+
+
+async def enumerate_stub_zone():
+    loop = asyncio.get_running_loop()
+    transport, dns = await loop.create_datagram_endpoint(StubDNSServer, local_addr=('127.0.0.1', 0))
+    dns_port = transport.get_extra_info('sockname')[1]
+
+    async def handle(reader, writer):
+        writer.close()
+
+    tls = await asyncio.start_server(handle, '127.0.0.1', 0,
+                                     ssl=make_context('example.test', 365, ['*.example.test', 'hidden.example.test']))
+    tls_port = tls.sockets[0].getsockname()[1]
+
+    async with tls:
+        resolver = DNSResolver('127.0.0.1', port=dns_port, timeout=1, rate=1000)
+        assert await resolver.resolve('api.example.test') == ['127.0.0.2']
+        assert await resolver.resolve('missing.example.test') == []
+        assert await resolver.resolve('API.example.test.') == ['127.0.0.2']
+        assert await resolver.resolve('missing.example.test') == []
+        assert resolver.stats['queries'] == 2
+        assert resolver.stats['cache_hits'] == 2 and resolver.stats['negative_hits'] == 1
+
+        found = []
+        probe = TLSProbe(timeout=2)
+        enumerator = SubdomainEnumerator(resolver, probe, wordlist=['www', 'api', 'nope'], tls_port=tls_port)
+        hosts = await enumerator.run('example.test', lambda name, addresses: found.append(name))
+        resolver.close()
+    transport.close()
+    return hosts, found, {**enumerator.get_stats(), 'tls': probe.get_stats()}, dns.queries
+
+
+def test_subdomain_enumeration():
+    hosts, found, stats, queries = asyncio.run(enumerate_stub_zone())
+
+    assert set(hosts) == {'example.test', 'www.example.test', 'api.example.test', 'hidden.example.test'}
+    assert hosts['hidden.example.test'] == {'addresses': ['127.0.0.3'], 'source': 'certificate'}
+    assert hosts['www.example.test']['source'] == 'wordlist'
+    assert sorted(found) == sorted(hosts)
+    assert stats['certificates_read'] >= 1 and stats['san_names'] == 1
+    # Reading certificate names takes one handshake per host, never a full probe
+    assert stats['tls']['probes'] == 0 and stats['certificates_read'] <= stats['tls']['handshakes'] <= len(hosts)
+    # Every name reaches the nameserver once; repeats are answered from the cache
+    assert len(queries) == len(set(queries))
+
+
+def test_answer_cache_is_bounded():
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, dns = await loop.create_datagram_endpoint(StubDNSServer, local_addr=('127.0.0.1', 0))
+        resolver = DNSResolver('127.0.0.1', port=transport.get_extra_info('sockname')[1], timeout=1, rate=1000)
+        try:
+            for name in ('example.test', 'www.example.test', 'example.test', 'api.example.test', 'www.example.test'):
+                await resolver.resolve(name)
+        finally:
+            resolver.close()
+            transport.close()
+        return dns.queries, list(dns_resolver._answer_cache)
+
+    cache_size = settings.DNS_CACHE_SIZE
+    settings.DNS_CACHE_SIZE = 2
+    try:
+        dns_resolver._answer_cache.clear()
+        queries, cached = asyncio.run(run())
+    finally:
+        settings.DNS_CACHE_SIZE = cache_size
+    # www was the least recently used answer when api was cached, so it is asked for again
+    assert queries == ['example.test', 'www.example.test', 'api.example.test', 'www.example.test']
+    assert [name for _, name, _ in cached] == ['api.example.test', 'www.example.test']
+
+
+if __name__ == "__main__":
+    test_subdomain_enumeration()
+    test_answer_cache_is_bounded()
+    print("Subdomain enumeration verified successfully!")
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import os
+import ssl
+import tempfile
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.core.config import settings
+from app.core.utils import tls_probe
+from app.core.utils.tls_probe import TLSProbe, hostname_matches, tls_findings
+
+
+def make_context(hostname: str, days_valid: int, extra_names=()) -> ssl.SSLContext:
+    """A TLS 1.2+ server context with a self-signed certificate for hostname and extra_names"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=400))
+            .not_valid_after(now + datetime.timedelta(days=days_valid))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(n) for n in (hostname, *extra_names)]),
+                           critical=False)
+            .sign(key, hashes.SHA256()))
+
+    directory = tempfile.mkdtemp()
+    cert_path, key_path = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+async def probe_servers():
+    async def handle(reader, writer):
+        writer.close()
+
+    valid = await asyncio.start_server(handle, '127.0.0.1', 0, ssl=make_context('localhost', 365))
+    expired = await asyncio.start_server(handle, '127.0.0.1', 0, ssl=make_context('localhost', -1))
+    valid_port = valid.sockets[0].getsockname()[1]
+    expired_port = expired.sockets[0].getsockname()[1]
+
+    async with valid, expired:
+        probe = TLSProbe(concurrency=4, timeout=5)
+        matching = await probe.probe('127.0.0.1', valid_port, server_name='localhost')
+        mismatched = await probe.probe('127.0.0.1', valid_port, server_name='api.example.com')
+        stale, = await probe.probe_many([('127.0.0.1', expired_port)])
+        handshakes = probe.stats['handshakes']
+        again = await probe.probe('127.0.0.1', valid_port, server_name='localhost')
+        assert again is matching
+        assert probe.stats['cache_hits'] == 1 and probe.stats['handshakes'] == handshakes
+    return matching, mismatched, stale
+
+
+def test_tls_probe():
+    matching, mismatched, stale = asyncio.run(probe_servers())
+
+    assert matching['reachable'] and not matching['verified']
+    assert 'self-signed' in matching['verify_error']
+    assert matching['protocol'] == 'TLSv1.3'
+    assert set(matching['supported_protocols']) == {'TLSv1.2', 'TLSv1.3'}
+    assert matching['weak_ciphers'] == []
+    assert matching['certificate']['hostname_match'] and matching['certificate']['self_signed']
+    assert {f['type'] for f in tls_findings(matching)} == {'tls_untrusted_certificate'}
+
+    mismatch_types = {f['type'] for f in tls_findings(mismatched)}
+    assert 'tls_hostname_mismatch' in mismatch_types
+
+    assert stale['certificate']['days_left'] < 0
+    assert 'tls_certificate_expired' in {f['type'] for f in tls_findings(stale)}
+
+    assert hostname_matches('api.example.com', '*.example.com')
+    assert not hostname_matches('a.api.example.com', '*.example.com')
+    assert not hostname_matches('example.com', '*.example.com')
+
+
+def test_unreachable_host():
+    async def probe_closed_port():
+        return await TLSProbe(timeout=2).probe('127.0.0.1', 1)
+
+    result = asyncio.run(probe_closed_port())
+    assert not result['reachable'] and result['error']
+    assert tls_findings(result) == []
+
+
+def test_probe_cache_is_bounded():
+    async def run():
+        probe = TLSProbe(timeout=2)
+        # Closed ports answer at once, and their results are cached like any other
+        for port in (1, 2, 1, 3, 2):
+            await probe.probe('127.0.0.1', port)
+        bounded = probe.stats['probes'], [port for _, port, _ in tls_probe._probe_cache]
+
+        # Port 3's result runs out
+        key = ('127.0.0.1', 3, '127.0.0.1')
+        tls_probe._probe_cache[key] = (0.0, tls_probe._probe_cache[key][1])
+        await probe.probe('127.0.0.1', 3)
+        return bounded, probe.stats['probes'], [port for _, port, _ in tls_probe._probe_cache]
+
+    cache_size = settings.TLS_CACHE_SIZE
+    settings.TLS_CACHE_SIZE = 2
+    try:
+        tls_probe._probe_cache.clear()
+        (probes, cached), expired_probes, after_expiry = asyncio.run(run())
+    finally:
+        settings.TLS_CACHE_SIZE = cache_size
+        tls_probe._probe_cache.clear()
+    # Port 2 was the least recently used result when port 3 was cached, so it is probed again
+    assert probes == 4 and cached == [3, 2]
+    # An expired result is dropped when looked up, and the host probed again
+    assert expired_probes == 5 and after_expiry == [2, 3]
+
+
+if __name__ == "__main__":
+    test_tls_probe()
+    test_unreachable_host()
+    test_probe_cache_is_bounded()
+    print("TLS probe verified successfully!")
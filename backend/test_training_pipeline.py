@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+
+from app.core.ai.model_store import ModelStore
+from app.core.ai.training import ShardSource, TrainingPipeline
+from app.core.ai.vulnerability_detector import VulnerabilityDetector
+from app.core.config import settings
+
+SAMPLES = [
+    ("SELECT * FROM users WHERE id = '1' OR 1=1 --", ['sql_injection']),
+    ("<script>alert(document.cookie)</script> rendered into innerHTML", ['xss']),
+    ("GET /api/users/1 with a valid bearer token", []),
+]
+
+
+def write_shards(directory, rows):
+    with open(os.path.join(directory, 'part-0.jsonl'), 'w') as f:
+        for i in range(rows):
+            text, labels = SAMPLES[i % 3]
+            f.write(json.dumps({'text': f'{text} {i}', 'labels': labels}) + '\n')
+    connection = sqlite3.connect(os.path.join(directory, 'part-1.db'))
+    connection.execute('CREATE TABLE samples (text TEXT, labels TEXT)')
+    connection.executemany('INSERT INTO samples VALUES (?, ?)', [
+        (f'{SAMPLES[i % 3][0]} row {i}', ','.join(SAMPLES[i % 3][1])) for i in range(rows)
+    ])
+    connection.commit()
+    connection.close()
+
+
+def test_training_pipeline():
+    directory = tempfile.mkdtemp()
+    write_shards(directory, 300)
+    source = ShardSource(os.path.join(directory, 'part-*'))
+    assert len(source.paths) == 2
+    samples = list(source)
+    assert len(samples) == 600 and samples[301]['labels'] == ['xss'] and samples[302]['labels'] == []
+
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(os.path.join(directory, 'models'))
+    labels = detector.vulnerability_types['api']
+    reports = []
+    pipeline = TrainingPipeline(detector.get_model('api'), labels, detector.featurizer, batch_size=64,
+                                prefetch=2, checkpoint_dir=os.path.join(directory, 'checkpoints'),
+                                checkpoint_every=3, on_progress=reports.append)
+    stats = pipeline.run(source, epochs=2)
+
+    # The held-out share is the same on every pass and never trained on
+    assert stats['epochs'] == 2 and len(reports) == 2
+    assert stats['samples'] + stats['validation_samples'] == 2 * 600
+    assert 0 < stats['validation_samples'] / 2 < 600 * 0.4
+    assert all(report['samples'] == stats['samples'] // 2 and report['samples_per_sec'] > 0 for report in reports)
+    assert stats['checkpoints'] >= 2 and stats['samples_per_sec'] > 0
+    # A finished run leaves no checkpoint behind
+    assert os.listdir(os.path.join(directory, 'checkpoints')) == []
+
+    # A run interrupted after its second epoch resumes from there
+    pipeline.checkpoint(2)
+    resumed = TrainingPipeline(detector.get_model('api'), labels, detector.featurizer,
+                               checkpoint_dir=os.path.join(directory, 'checkpoints'))
+    assert resumed.run(source, epochs=2)['resumed_from_epoch'] == 2
+
+    try:
+        pipeline.run(iter(samples))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a one-shot iterator cannot be trained on for several epochs')
+
+    # train_model streams the shards and stores the result as the active version
+    stats = asyncio.run(detector.train_model('api', source, epochs=1))
+    stored = detector.store.load('api')
+    assert stored.metadata['source'] == 'train_model' and stored.metadata['samples'] == stats['samples']
+    assert detector.runtime_versions['api'] == stored.version
+
+
+def test_trained_weights_survive_a_restart():
+    samples = [{'text': f'{text} {i}', 'labels': labels} for i in range(60) for text, labels in SAMPLES]
+    root = tempfile.mkdtemp()
+    runtime = settings.AI_RUNTIME
+    settings.AI_RUNTIME = 'keras'
+    try:
+        trainer = VulnerabilityDetector()
+        trainer.store = ModelStore(root)
+        asyncio.run(trainer.train_model('api', samples, epochs=1))
+        trained = trainer.get_model('api').get_weights()
+
+        # A restarted process serving Keras gets the trained model back, not a fresh one
+        restarted = VulnerabilityDetector()
+        restarted.store = ModelStore(root)
+        for loaded, expected in zip(restarted.get_runtime('api').get_weights(), trained):
+            np.testing.assert_array_equal(loaded, expected)
+    finally:
+        settings.AI_RUNTIME = runtime
+
+    # One serving the NumPy export trains on from the same weights
+    serving = VulnerabilityDetector()
+    serving.store = ModelStore(root)
+    assert serving.runtime_versions.get('api') is None and serving.get_runtime('api') is not None
+    assert serving.runtime_versions['api'] == trainer.store.active_version('api')
+    for loaded, expected in zip(serving.get_model('api').get_weights(), trained):
+        np.testing.assert_array_equal(loaded, expected)
+
+
+if __name__ == "__main__":
+    test_training_pipeline()
+    test_trained_weights_survive_a_restart()
+    print("Streaming training pipeline verified successfully!")
@@ -0,0 +1,146 @@
+import asyncio
+import subprocess
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from app.core.ai.batching import MicroBatcher
+from app.core.ai.featurizer import HashingFeaturizer
+from app.core.ai.model_store import ModelStore
+from app.core.ai.numpy_runtime import NumpyModel
+from app.core.ai.vulnerability_detector import VulnerabilityDetector, get_vulnerability_detector
+from app.core.ai.windowing import iter_windows
+
+IMPORT_CHECK = """
+import sys
+from app.core.scanners.api_scanner import APIScanner
+from app.core.scanners.mobile_scanner import MobileScanner
+from app.core.scanners.source_code_scanner import SourceCodeScanner
+assert APIScanner().ai_detector is MobileScanner().ai_detector is SourceCodeScanner().ai_detector
+assert 'tensorflow' not in sys.modules and 'sklearn' not in sys.modules
+"""
+
+
+def test_scanners_do_not_load_tensorflow():
+    subprocess.run([sys.executable, '-c', IMPORT_CHECK], check=True)
+
+
+def test_models_are_built_on_first_use():
+    assert get_vulnerability_detector() is get_vulnerability_detector()
+
+    # A fresh detector, so neither other tests nor models left in AI_MODEL_DIR count
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    assert not detector.runtimes and not detector.models
+    findings = asyncio.run(detector.analyze_api_vulnerabilities('https://api.example.com/users', {'status': 200}))
+    assert isinstance(findings, list)
+    assert set(detector.runtimes) == {'api'}
+    assert set(detector.models) <= {'api'}
+
+    assert detector.get_batch_stats()['api']['requests'] >= 1
+
+
+def test_micro_batching():
+    batch_sizes = []
+
+    def predict(batch):
+        batch_sizes.append(len(batch))
+        if (batch < 0).any():
+            raise ValueError('negative input')
+        return batch * 2
+
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait=0.05)
+        outputs = await asyncio.gather(*(batcher.predict(np.array([[float(i), 1.0]])) for i in range(20)))
+        failed = await asyncio.gather(batcher.predict(np.array([-1.0, 0.0])), return_exceptions=True)
+        return outputs, failed, batcher.get_stats()
+
+    outputs, failed, stats = asyncio.run(run())
+    assert [list(row) for row in outputs] == [[2.0 * i, 2.0] for i in range(20)]
+    assert batch_sizes[:3] == [8, 8, 4]
+    assert isinstance(failed[0], ValueError)
+    assert stats['batches'] == 4 and stats['largest_batch'] == 8 and stats['errors'] == 1
+
+
+def test_hashing_featurizer():
+    texts = ["SELECT * FROM users WHERE id = '1' OR '1'='1'", 'eval(request.args["code"])', '']
+    batch = HashingFeaturizer().transform(texts)
+    assert batch.shape == (3, 1000) and batch.format == 'csr' and batch.dtype == np.float32
+    # Stateless: a fresh featurizer, one text at a time, gives the same rows
+    single = HashingFeaturizer().transform_one(texts[1])
+    assert (single != batch[1]).nnz == 0
+    assert np.isclose(np.linalg.norm(batch[0].toarray()), 1.0) and batch[2].nnz == 0
+
+    rng = np.random.default_rng(3)
+    model = NumpyModel([(rng.normal(size=(1000, 4)).astype(np.float32), np.zeros(4, np.float32), 'sigmoid')])
+    np.testing.assert_allclose(model.predict(batch), model.predict(batch.toarray()), atol=1e-6)
+
+
+def test_windowed_analysis():
+    lines = [f'value_{i % 7} = compute(value_{i % 5})' for i in range(200)]
+    lines[124] = 'record = pickle.loads(untrusted_payload)'
+    windows = list(iter_windows('\n'.join(lines), window_lines=50, overlap=10))
+    assert [(w.start_line, w.end_line) for w in windows] == [(1, 50), (41, 90), (81, 130), (121, 170), (161, 200)]
+
+    # A model that only fires its first label, and only on windows mentioning pickle
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    labels = detector.vulnerability_types['source_code']
+    kernel = np.zeros((1000, len(labels)), np.float32)
+    kernel[detector.featurizer.transform_one('pickle').indices, 0] = 1000.0
+    bias = np.full(len(labels), -5.0, np.float32)
+    predicted_rows = []
+
+    class CountingModel(NumpyModel):
+        def predict(self, inputs):
+            predicted_rows.append(inputs.shape[0])
+            return super().predict(inputs)
+        predict_on_batch = predict
+
+    detector.runtimes['source_code'] = CountingModel([(kernel, bias, 'sigmoid')])
+    detector.runtime_versions['source_code'] = 'v1'
+    code = '\n'.join(lines)
+    findings = asyncio.run(detector.analyze_source_code_vulnerabilities(code, 'python', windowed=True))
+    assert [(f['type'], f['start_line'], f['end_line']) for f in findings] == [(labels[0], 81, 170)]
+    assert predicted_rows == [5]
+
+    # Scoring the same file again reuses every window score
+    asyncio.run(detector.analyze_source_code_vulnerabilities(code, 'python', windowed=True))
+    assert predicted_rows == [5] and detector.prediction_cache.get_stats()['memory_hits'] == 5
+
+
+def test_texts_are_prepared_off_the_event_loop():
+    detector = VulnerabilityDetector()
+    detector.store = ModelStore(tempfile.mkdtemp())
+    prepared_on = []
+    normalize, vectorize = detector._normalize_source_code, detector._vectorize_text
+
+    def record(function):
+        def recorded(*args):
+            prepared_on.append((function.__name__, threading.current_thread()))
+            return function(*args)
+        return recorded
+
+    detector._normalize_source_code = record(normalize)
+    detector._vectorize_text = record(vectorize)
+    code = '\n'.join(f'value_{i} = load(path_{i})  // line {i}' for i in range(120))
+
+    async def run():
+        await detector.analyze_source_code_vulnerabilities(code, 'java')
+        await detector.analyze_source_code_vulnerabilities(code, 'java', windowed=True)
+
+    asyncio.run(run())
+    assert {name for name, _ in prepared_on} == {'_normalize_source_code', '_vectorize_text'}
+    assert threading.main_thread() not in {thread for _, thread in prepared_on}
+
+
+if __name__ == "__main__":
+    test_scanners_do_not_load_tensorflow()
+    test_models_are_built_on_first_use()
+    test_micro_batching()
+    test_hashing_featurizer()
+    test_windowed_analysis()
+    test_texts_are_prepared_off_the_event_loop()
+    print("Vulnerability detector verified successfully!")
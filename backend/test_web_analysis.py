@@ -0,0 +1,53 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.scanners.web_analysis import AnalysisPipeline
+from app.core.utils.http_cache import HTTPCache
+
+URL = 'http://example.com/login'
+BODY = b'<html><form method="post"><input name="user"></form></html>'
+FORMS = ({'action': '', 'method': 'post', 'line': 1, 'inputs': [{'name': 'user', 'type': 'text'}]},)
+
+
+def _headers(date: str, session: str, **extra: str):
+    return {
+        'Content-Type': 'text/html', 'ETag': '"v1"', 'Date': date, 'Age': '0',
+        'Expires': date, 'Set-Cookie': f'session={session}; Expires={date}; HttpOnly', **extra,
+    }
+
+
+def test_findings_are_reused_across_volatile_headers():
+    cache = HTTPCache(os.path.join(tempfile.mkdtemp(), 'http_cache.db'))
+    findings = []
+
+    async def submit(headers):
+        pipeline = AnalysisPipeline(findings.extend, executor=ThreadPoolExecutor(1), workers=1, http_cache=cache)
+        pipeline.start()
+        cache.store(URL, 200, headers.items(), 'digest-1', len(BODY))
+        await pipeline.submit(URL, 200, headers, BODY, {'forms': FORMS, 'digest': 'digest-1'})
+        await pipeline.close()
+        return pipeline.get_stats()
+
+    async def run():
+        first = await submit(_headers('Mon, 01 Jan 2024 00:00:00 GMT', 'a1'))
+        # Same page later: new date, age, expiry and session id
+        again = await submit(_headers('Tue, 02 Jan 2024 00:00:00 GMT', 'b2', Age='30'))
+        # A header the checks read did change
+        hardened = await submit(_headers('Tue, 02 Jan 2024 00:00:00 GMT', 'c3', **{'X-Frame-Options': 'DENY'}))
+        # So did a cookie flag
+        secure = await submit({**_headers('Tue, 02 Jan 2024 00:00:00 GMT', 'd4'),
+                               'Set-Cookie': 'session=d4; HttpOnly; SameSite=Lax'})
+        return first, again, hardened, secure
+
+    first, again, hardened, secure = asyncio.run(run())
+    assert first['analyzed'] == 1 and first['reused'] == 0
+    assert again['analyzed'] == 0 and again['reused'] == 1
+    assert hardened['analyzed'] == 1 and secure['analyzed'] == 1
+    assert {'missing_csrf_token', 'insecure_cookie', 'missing_security_header'} <= {f['type'] for f in findings}
+
+
+if __name__ == "__main__":
+    test_findings_are_reused_across_volatile_headers()
+    print("Web analysis verified successfully!")
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import tempfile
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.databases.crawl_checkpoint import CrawlCheckpointStore
+from app.core.scanners.html_extractor import StreamingHTMLExtractor
+from app.core.scanners.web_crawler import BloomFilter, CrawlFrontier, CrawlScope, WebCrawler, normalize_url
+from app.core.utils.http_cache import HTTPCache
+
+PAGE = (
+    '<html><head><base href="/root/"><script src="/app.js"></script><style>p > a {}</style>'
+    '<script>var s = "<a href=\\"/fake\\">"; if (a > b) { go(); }\n' + 'x' * 5000 + '</script>'
+    '<!-- <a href="/commented"> > -->\n'
+    '<body><a HREF="/one">1</a> text &amp; more <a href=/two>2</a>'
+    '<form action="/login" method=POST><input name=user><input type=password name=pw></form>'
+    '<img src="/logo.png"><a href="/three">3</a>' + 'z' * 3000 + '<a href="/four"></body></html>'
+)
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80/a/./b/../c?z=1&a=2#top') == 'http://example.com/a/c?a=2&z=1'
+    assert normalize_url('https://example.com:8443') == 'https://example.com:8443/'
+    assert normalize_url('../img/../next?page=', 'https://example.com/docs/guide/') == \
+        'https://example.com/docs/next?page='
+    assert normalize_url('https://example.com/?q=') != normalize_url('https://example.com/')
+    assert normalize_url('https://example.com./') == 'https://example.com/'
+    for url in ('mailto:admin@example.com', 'javascript:void(0)', 'ftp://example.com/', 'http://[::1'):
+        assert normalize_url(url) is None
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    # An add colliding with earlier ones counts as seen, as rarely as any false positive
+    added = sum(bloom.add(f'https://example.com/page/{i}') for i in range(10000))
+    assert added > 9900 and len(bloom) == added
+    assert not bloom.add('https://example.com/page/0')
+    false_positives = sum(f'https://example.com/other/{i}' in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+    # Sized as documented: a million URLs at 0.1% in under 2 MB
+    assert len(BloomFilter(1_000_000, error_rate=0.001).bits) < 2 * 1024 * 1024
+
+
+def test_frontier_orders_by_depth():
+    async def drain(frontier):
+        urls = []
+        while True:
+            entry = await frontier.get()
+            if entry is None:
+                return urls
+            urls.append(entry)
+            frontier.task_done()
+
+    frontier = CrawlFrontier(BloomFilter(100), max_size=5)
+    assert frontier.push('https://example.com/deep', 2)
+    assert frontier.push('https://example.com/list?page=2', 1)
+    assert frontier.push('https://example.com/about', 1)
+    assert frontier.push('https://example.com/', 0)
+    assert not frontier.push('https://example.com/about', 1)
+    assert frontier.push('https://example.com/contact', 1)
+    assert not frontier.push('https://example.com/full', 1) and frontier.dropped == 1
+
+    assert asyncio.run(drain(frontier)) == [
+        ('https://example.com/', 0),
+        ('https://example.com/about', 1),
+        ('https://example.com/contact', 1),
+        # Query strings wait behind new paths of the same depth
+        ('https://example.com/list?page=2', 1),
+        ('https://example.com/deep', 2),
+    ]
+
+
+def extract(page, chunk_size):
+    extractor = StreamingHTMLExtractor(max_pending=256)
+    data, links = page.encode(), []
+    for start in range(0, len(data), chunk_size):
+        extractor.feed_bytes(data[start:start + chunk_size])
+        links.extend(extractor.pop_links())
+    extractor.close()
+    links.extend(extractor.pop_links())
+    return links, extractor.forms, [(script['src'], script['length']) for script in extractor.scripts]
+
+
+def test_extractor_handles_pages_split_mid_tag():
+    links, forms, scripts = extract(PAGE, len(PAGE))
+    assert links == ['/app.js', '/one', '/two', '/login', '/logo.png', '/three', '/four']
+    assert forms[0]['line'] == 3 and [field['name'] for field in forms[0]['inputs']] == ['user', 'pw']
+    assert scripts[0] == ('/app.js', 0) and scripts[1][1] > 5000
+    for chunk_size in list(range(1, 40)) + [97, 1000, 4096]:
+        assert extract(PAGE, chunk_size) == (links, forms, scripts), chunk_size
+
+
+def create_site() -> web.Application:
+    """The root links to six sections, each linking to one leaf page"""
+    async def page(request: web.Request) -> web.Response:
+        path = request.path
+        if path == '/':
+            links = [f'/s{i}' for i in range(6)]
+        elif path.count('/') == 1:
+            links = [f'{path}/leaf']
+        else:
+            links = []
+        body = ''.join(f'<a href="{link}">{link}</a>' for link in links)
+        return web.Response(text=f'<html><body>{body}</body></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{path:.*}', page)
+    return app
+
+
+def test_checkpoint_restore_and_resume():
+    checkpoint_path = os.path.join(tempfile.mkdtemp(), 'checkpoints.db')
+    record = {'id': 'scan-1', 'status': 'running', 'findings': [{'type': 'missing_header'}]}
+
+    async def run():
+        server = TestServer(create_site())
+        await server.start_server()
+        base = str(server.make_url('')).rstrip('/')
+        scope = CrawlScope([server.host])
+        fetched = [], []
+        try:
+            async with aiohttp.ClientSession() as session:
+                stop = asyncio.Event()
+
+                async def on_first_page(url, status, headers, body, page):
+                    fetched[0].append(url)
+                    if len(fetched[0]) == 3:
+                        stop.set()
+                        await asyncio.sleep(3600)
+
+                crawler = WebCrawler(session, scope, max_depth=2, on_page=on_first_page, concurrency=1)
+                crawler.add_seed(base + '/')
+                task = asyncio.create_task(crawler.run())
+                await stop.wait()
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                CrawlCheckpointStore(checkpoint_path).save(record, crawler.export_state(), 0)
+
+                # A new process: a fresh store whose first call is load()
+                checkpoint = CrawlCheckpointStore(checkpoint_path).load('scan-1')
+
+                async def on_page(url, status, headers, body, page):
+                    fetched[1].append(url)
+
+                resumed = WebCrawler(session, scope, max_depth=2, on_page=on_page, concurrency=1)
+                resumed.restore_state(checkpoint['state'])
+                await resumed.run()
+                return base, fetched, checkpoint, resumed.get_stats()
+        finally:
+            await server.close()
+
+    base, (before, after), checkpoint, stats = asyncio.run(run())
+    assert checkpoint['record'] == record
+    everything = {f'{base}/'} | {f'{base}/s{i}' for i in range(6)} | {f'{base}/s{i}/leaf' for i in range(6)}
+    assert set(before) | set(after) == everything
+    # Only the page being handled when the crawl stopped is fetched twice
+    assert set(before) & set(after) == {before[-1]}
+    # Counters carry over from the checkpoint
+    assert stats['pages_fetched'] == len(before) + len(after)
+
+
+def create_cached_site(port_holder) -> web.Application:
+    """A revalidatable home page linking to a page on another host name of the same server"""
+    async def home(request: web.Request) -> web.Response:
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        port = port_holder[0]
+        body = f'<a href="/inside">in</a><a href="http://localhost:{port}/outside">out</a>'
+        return web.Response(text=body, content_type='text/html', headers={'ETag': '"v1"'})
+
+    async def page(request: web.Request) -> web.Response:
+        return web.Response(text='<p>leaf</p>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/{path:.+}', page)
+    return app
+
+
+def test_replayed_links_respect_scope():
+    cache = HTTPCache(os.path.join(tempfile.mkdtemp(), 'http_cache.db'))
+
+    async def run():
+        port_holder = []
+        server = TestServer(create_cached_site(port_holder), host='127.0.0.1')
+        await server.start_server()
+        port_holder.append(server.port)
+        crawls = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                # The first scan includes both host names, the second only one of them
+                for hosts in (['127.0.0.1', 'localhost'], ['127.0.0.1']):
+                    fetched = []
+
+                    async def on_page(url, status, headers, body, page):
+                        fetched.append((urlsplit(url).hostname, urlsplit(url).path, page.get('not_modified', False)))
+
+                    crawler = WebCrawler(session, CrawlScope(hosts), max_depth=2, on_page=on_page,
+                                         concurrency=1, http_cache=cache)
+                    crawler.add_seed(str(server.make_url('/')))
+                    await crawler.run()
+                    crawls.append(sorted(fetched))
+            return crawls
+        finally:
+            await server.close()
+
+    first, second = asyncio.run(run())
+    assert first == [('127.0.0.1', '/', False), ('127.0.0.1', '/inside', False), ('localhost', '/outside', False)]
+    assert second == [('127.0.0.1', '/', True), ('127.0.0.1', '/inside', False)]
+
+
+if __name__ == "__main__":
+    test_normalize_url()
+    test_bloom_filter_false_positive_rate()
+    test_frontier_orders_by_depth()
+    test_extractor_handles_pages_split_mid_tag()
+    test_checkpoint_restore_and_resume()
+    test_replayed_links_respect_scope()
+    print("Web crawler verified successfully!")